@@ -1,18 +1,30 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from flask_cors import CORS
-import torch
 import numpy as np
-import joblib
+import hmac
 import json
 import logging
+import os
+import random
+import threading
+import time
+import urllib.request
 from datetime import datetime
 
-import hashlib
-from model import DefectClassifier
-from database import log_prediction, get_metrics, get_recent_predictions, update_actual_label, get_recent_features
-from drift import detect_drift
+import registry
+import timing
+import wire
+from database import (log_prediction, log_predictions, get_metrics, get_predictions, iter_predictions, update_actual_label,
+                      get_recent_features, get_latest_drift, get_drift_history, writer_stats)
+from drift import detect_drift, StreamingDriftMonitor
+from drift_scheduler import DriftScheduler
+from events import EventBus
+from batcher import MicroBatcher
+from cache import PredictionCache, feature_key
+from inference import set_threads
 
 app = Flask(__name__)
+app.json = wire.FastJSONProvider(app)
 CORS(app)
 logging.basicConfig(
     level=logging.INFO,
@@ -21,127 +33,711 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# share of requests that get a log line. 5xx responses and anything slower than
+# SLOW_REQUEST_MS are always logged
+LOG_SAMPLE_RATE = float(os.environ.get('SEMIGUARD_LOG_SAMPLE_RATE', 0.01))
+SLOW_REQUEST_MS = float(os.environ.get('SEMIGUARD_SLOW_REQUEST_MS', 250))
+
+
+@app.before_request
+def start_timer():
+    g.stopwatch = timing.Stopwatch()
+
 
 @app.after_request
 def log_request(response):
-    logger.info(f"{request.method} {request.path} -> {response.status_code}")
+    stopwatch = g.get('stopwatch')
+    if stopwatch is None:
+        return response
+    elapsed = stopwatch.elapsed()
+    timing.observe(request.endpoint or 'unmatched', elapsed, 'semiguard_request_seconds')
+    if response.status_code >= 500 or elapsed * 1000 >= SLOW_REQUEST_MS or random.random() < LOG_SAMPLE_RATE:
+        line = f"{request.method} {request.path} -> {response.status_code} in {elapsed * 1000:.1f}ms"
+        if stopwatch.laps:
+            line += ' (' + ', '.join(f"{stage} {seconds * 1000:.2f}" for stage, seconds in stopwatch.laps) + ')'
+        logger.info(line)
     return response
 
 
-# global model state
-model = None
-scaler = None
-metadata = None
-train_features = None
+# the model being served. a registry.ModelBundle with the engine (TorchClassifier or
+# NumpyClassifier), its metadata and its drift state. reloading replaces it whole,
+# so read it into a local once per request
+bundle = None
+
+# 'numpy' runs the exported scaler-folded network without importing torch,
+# 'torch' runs defect_model.pt + scaler.npz. numpy is used when its file exists.
+ENGINE = os.environ.get('SEMIGUARD_ENGINE', 'numpy')
+# how the torch engine runs the network: 'eager', 'script' or 'int8' (see
+# inference.TORCH_MODES). a version only gets the optimized modes train.py checked
+TORCH_MODE = os.environ.get('SEMIGUARD_TORCH_MODE', 'eager')
+# torch intra-op threads per worker, 0 keeps torch's default. gunicorn.conf.py
+# splits the cores between the workers
+TORCH_THREADS = int(os.environ.get('SEMIGUARD_TORCH_THREADS', 0))
+MODELS_DIR = registry.MODELS_DIR
+
+# how often (seconds) each worker checks models/ACTIVE for a new version, 0 turns it off
+RELOAD_INTERVAL = float(os.environ.get('SEMIGUARD_RELOAD_INTERVAL', 2))
+# required in the X-Admin-Token header by POST /models/active, unset disables it
+ADMIN_TOKEN = os.environ.get('SEMIGUARD_ADMIN_TOKEN')
+_reload_lock = threading.Lock()
+_last_reload_check = 0.0
+_failed_version = None
+
+# cleaned dataset rows served by /sample
+SAMPLE_POOL_PATH = os.path.join(MODELS_DIR, registry.SAMPLE_POOL_FILE)
+DATA_PATH = '../data/uci-secom.csv'
+MAX_SAMPLE_ROWS = 1000
+_sample_pool = None
+_sample_lock = threading.Lock()
+_rng = None
+_rng_pid = None
+
+# upper bound on rows per /predict/batch call
+MAX_BATCH_ROWS = 1000
+
+# most rows one /predictions page returns, /predictions/export has no cap
+MAX_HISTORY_ROWS = 1000
+
+# longest /metrics?window= in minutes (30 days)
+MAX_METRICS_WINDOW = 30 * 24 * 60
+
+# results for recently seen inputs, keyed on the raw float buffer (size 0 turns it off)
+CACHE_SIZE = int(os.environ.get('SEMIGUARD_CACHE_SIZE', 4096))
+CACHE_TTL = float(os.environ.get('SEMIGUARD_CACHE_TTL', 3600))
+prediction_cache = PredictionCache(CACHE_SIZE, CACHE_TTL)
+
+# micro-batching for concurrent single-row /predict calls (batch size 1 turns it off)
+BATCH_MAX_SIZE = int(os.environ.get('SEMIGUARD_BATCH_MAX_SIZE', 16))
+BATCH_MAX_WAIT_MS = float(os.environ.get('SEMIGUARD_BATCH_MAX_WAIT_MS', 2.0))
+
+# rolling drift window that predict() keeps up to date, and where to POST drift alerts
+DRIFT_WINDOW = int(os.environ.get('SEMIGUARD_DRIFT_WINDOW', 10000))
+DRIFT_BINS = int(os.environ.get('SEMIGUARD_DRIFT_BINS', 32))
+DRIFT_ALERT_URL = os.environ.get('SEMIGUARD_DRIFT_ALERT_URL')
+# background KS checks behind GET /drift: seconds between them (0 turns them
+# off), the window sizes tested and how many days of results are kept
+DRIFT_CHECK_INTERVAL = float(os.environ.get('SEMIGUARD_DRIFT_CHECK_INTERVAL', 60))
+DRIFT_CHECK_WINDOWS = [int(n) for n in os.environ.get('SEMIGUARD_DRIFT_CHECK_WINDOWS', '100,1000,10000').split(',')]
+DRIFT_HISTORY_DAYS = float(os.environ.get('SEMIGUARD_DRIFT_HISTORY_DAYS', 7))
+MAX_DRIFT_HISTORY_POINTS = 5000
+
+# live event stream (GET /events). every open stream holds a server thread, so
+# gunicorn.conf.py caps the clients per worker at half its threads
+EVENTS_POLL_MS = float(os.environ.get('SEMIGUARD_EVENTS_POLL_MS', 250))
+EVENTS_MAX_CLIENTS = int(os.environ.get('SEMIGUARD_EVENTS_MAX_CLIENTS', 16))
+# a comment line this often keeps proxies from closing an idle stream
+EVENTS_HEARTBEAT_SECONDS = 15
+# streams are closed after this long and the browser reconnects, so a client
+# doesn't stay pinned to one worker forever
+EVENTS_MAX_SECONDS = 600
+
+
+def load_model(version=None):
+    """Load a model version (the ACTIVE one by default) and swap it in.
+
+    Requests already in flight finish on the bundle they started with. If the
+    load fails the current model stays in place. Returns True on success.
+    """
+    global bundle, _sample_pool
+    try:
+        new_bundle = registry.load_bundle(MODELS_DIR, version, ENGINE, TORCH_MODE)
+    except Exception as e:
+        logger.warning(f"Could not load model: {e}")
+        return False
+    set_threads(TORCH_THREADS)
+    engine = new_bundle.engine
+    if engine.name == 'torch' and engine.mode != TORCH_MODE:
+        logger.warning(f"Version {new_bundle.version} hasn't passed train.py's parity check for {TORCH_MODE} mode, "
+                       f"serving it in eager mode")
+
+    bundle = new_bundle
+    # cache entries are keyed per version, this just frees the old ones
+    prediction_cache.clear()
+    # the pool is a training artifact too, let the next /sample pick up the new one
+    _sample_pool = None
+    mode = f", {engine.mode} mode" if engine.mode else ''
+    logger.info(
+        f"Model loaded (version {new_bundle.version or 'unversioned'}, "
+        f"{new_bundle.n_features} features, {engine.name} engine{mode})"
+    )
+    return True
+
+
+def check_for_new_model():
+    """Reload if models/ACTIVE names a different version than the one being served.
+
+    Runs before each request but only reads the file every RELOAD_INTERVAL
+    seconds. One thread does the loading while the others keep serving the
+    current model, so a train.py run or another worker's POST /models/active
+    reaches every gunicorn worker within a couple of seconds, no restart needed.
+    """
+    global _last_reload_check, _failed_version
+    now = time.monotonic()
+    if RELOAD_INTERVAL <= 0 or now - _last_reload_check < RELOAD_INTERVAL:
+        return
+    if not _reload_lock.acquire(blocking=False):
+        return
+    try:
+        _last_reload_check = now
+        version = registry.active_version(MODELS_DIR)
+        current = bundle.version if bundle else None
+        # don't retry a broken version every few seconds, wait for ACTIVE to change
+        if version is None or version == current or version == _failed_version:
+            return
+        if load_model(version):
+            _failed_version = None
+        else:
+            _failed_version = version
+    finally:
+        _reload_lock.release()
+
+
+def get_ks_baseline(b=None):
+    """The bundle's training baseline, opened on first use. None if it can't be loaded.
+
+    The baseline is memory-mapped, so workers share it through the page cache
+    and pages are only read when a drift computation touches them.
+    """
+    b = b or bundle
+    if b is None:
+        return None
+    if not b.drift_loaded:
+        with b.drift_lock:
+            if not b.drift_loaded:
+                try:
+                    b.ks_baseline = b.load_baseline()
+                except Exception as e:
+                    logger.warning(f"Could not load training baseline: {e}")
+                b.drift_loaded = True
+    return b.ks_baseline
+
+
+def get_drift_monitor(b=None):
+    """The bundle's streaming monitor, or None until it has been seeded.
+
+    The first call starts a thread that opens the baseline and seeds the
+    monitor with up to DRIFT_WINDOW logged rows, so predict() never waits on
+    that. Each worker has its own monitor, fed the predictions that worker
+    serves on top of what was logged when it was seeded.
+    """
+    b = b or bundle
+    if b is None or DRIFT_WINDOW <= 0:
+        return None
+    if not b.monitor_started:
+        with b.drift_lock:
+            if not b.monitor_started:
+                b.monitor_started = True
+                threading.Thread(target=_load_drift_monitor, args=(b,), name='drift-monitor-seed',
+                                 daemon=True).start()
+    return b.drift_monitor
+
+
+def _load_drift_monitor(b):
+    baseline = get_ks_baseline(b)
+    if baseline is None:
+        return
+    monitor = StreamingDriftMonitor(baseline, window=DRIFT_WINDOW, n_bins=DRIFT_BINS)
+    monitor.on_alert(_drift_alert)
+    try:
+        _seed_drift_monitor(monitor, b.version)
+    except Exception as e:
+        logger.warning(f"Could not seed the drift monitor, it starts empty: {e}")
+    b.drift_monitor = monitor
 
 
-def load_model():
-    global model, scaler, metadata, train_features
-    try:
-        with open('../models/metadata.json') as f:
-            metadata = json.load(f)
+def _drift_target():
+    # the scheduler thread runs in idle workers too, they follow ACTIVE here
+    check_for_new_model()
+    b = bundle
+    baseline = get_ks_baseline(b)
+    return (b.version, baseline) if baseline is not None else None
+
 
-        model = DefectClassifier(metadata['n_features'])
-        model.load_state_dict(torch.load('../models/defect_model.pt', weights_only=True))
-        model.eval()
+event_bus = EventBus(EVENTS_POLL_MS / 1000, max_clients=EVENTS_MAX_CLIENTS)
 
-        scaler = joblib.load('../models/scaler.pkl')
+# started per worker by gunicorn.conf.py (or python app.py), never under tests.
+# the other workers hear about its runs through the events table
+drift_scheduler = DriftScheduler(_drift_target, DRIFT_CHECK_INTERVAL, DRIFT_CHECK_WINDOWS, DRIFT_HISTORY_DAYS,
+                                 on_results=lambda results: event_bus.publish('drift', {}))
 
-        train_features = np.load('../models/train_features.npy')
 
-        logger.info(f"Model loaded ({metadata['n_features']} features)")
+def _seed_drift_monitor(monitor, version=None):
+    """Fill the streaming window from what's already logged, so it doesn't start empty."""
+    recent = get_recent_features(monitor.window, version)
+    if len(recent) and recent.shape[1] == monitor.n_features:
+        # stored newest first, the monitor wants oldest first
+        monitor.update(recent[::-1])
+
+
+def _drift_alert(info):
+    logger.warning(
+        f"Drift alert: {info['features_drifted']} features drifted (score {info['drift_score']}) "
+        f"over the last {info['samples_compared']} predictions"
+    )
+    if DRIFT_ALERT_URL:
+        # don't hold up the request that tipped it over
+        threading.Thread(target=_post_alert, args=(info,), daemon=True).start()
+
+
+def _post_alert(info):
+    try:
+        req = urllib.request.Request(
+            DRIFT_ALERT_URL,
+            data=json.dumps(info).encode(),
+            headers={'Content-Type': 'application/json'}
+        )
+        urllib.request.urlopen(req, timeout=5).close()
     except Exception as e:
-        logger.warning(f"Could not load model: {e}")
-        model = None
-        scaler = None
-        metadata = None
-        train_features = None
+        logger.error(f"Could not send drift alert: {e}")
+
+
+def warm_up():
+    """Do the lazy loading up front: drift baseline and monitor, scipy, sample pool.
+
+    gunicorn.conf.py calls this in the master before forking, so every worker
+    starts with it already in (shared) memory instead of paying on first request.
+    """
+    baseline = get_ks_baseline()
+    b = bundle
+    if b is not None and DRIFT_WINDOW > 0 and not b.monitor_started:
+        # seeded here, before the fork, every worker starts with a full window
+        b.monitor_started = True
+        _load_drift_monitor(b)
+    if baseline is not None:
+        # the exact critical values take a bisection each, do /drift's default
+        # window and the scheduled ones here where the workers inherit them
+        from drift import critical_value
+        for n in sorted({100, *DRIFT_CHECK_WINDOWS}):
+            critical_value(0.05, baseline.n_samples, n)
+    try:
+        get_sample_pool()
+    except Exception as e:
+        logger.warning(f"Could not load sample pool: {e}")
 
 
 # load on startup
 load_model()
 
 
+@app.before_request
+def watch_model():
+    check_for_new_model()
+
+
 @app.route('/health', methods=['GET'])
 def health():
+    b = bundle
     return jsonify({
         'status': 'ok',
-        'model_loaded': model is not None,
-        'n_features': metadata['n_features'] if metadata else None
+        'model_loaded': b is not None,
+        'model_version': b.version if b else None,
+        'engine': b.engine.name if b else None,
+        'engine_mode': b.engine.mode if b else None,
+        'n_features': b.n_features if b else None,
+        'batching': batcher.stats(),
+        'cache': prediction_cache.stats(),
+        'logging': writer_stats(),
+        'drift_checks': drift_scheduler.stats(),
+        'events': event_bus.stats()
     })
 
 
-@app.route('/predict', methods=['POST'])
-def predict():
-    if model is None:
-        return jsonify({'error': 'model not loaded'}), 503
+NON_FINITE_ERROR = 'features cannot contain null, NaN or inf values'
 
-    data = request.get_json()
-    if not data or 'features' not in data:
-        return jsonify({'error': 'request must include "features" array'}), 400
 
-    features = data['features']
-    expected = metadata['n_features']
+def _feature_row(features, expected):
+    """A JSON feature row as a float64 array, or None and the error message for a bad one.
 
+    null converts to NaN here, the caller's finite check rejects it with the rest.
+    """
+    if not isinstance(features, list):
+        return None, 'features must be an array'
     if len(features) != expected:
-        return jsonify({'error': f'expected {expected} features, got {len(features)}'}), 400
+        return None, f'expected {expected} features, got {len(features)}'
+    try:
+        row = np.array(features, dtype=np.float64)
+    except (TypeError, ValueError):
+        return None, 'features must be numeric'
+    if row.ndim != 1:
+        return None, 'features must be numeric'
+    return row, None
 
-    if any(f is None for f in features):
-        return jsonify({'error': 'features cannot contain null values'}), 400
 
+def _rows_array(rows, expected):
+    """JSON rows as one (n, expected) float64 array, plus {index: error} for the bad rows.
+
+    A well-formed batch converts in one call. Otherwise each row is checked on
+    its own and the bad ones are left as NaN.
+    """
+    try:
+        X = np.array(rows, dtype=np.float64)
+        if X.ndim == 2 and X.shape[1] == expected:
+            return X, {}
+    except (TypeError, ValueError):
+        pass
+    X = np.full((len(rows), expected), np.nan)
+    errors = {}
+    for i, features in enumerate(rows):
+        row, error = _feature_row(features, expected)
+        if error:
+            errors[i] = error
+        else:
+            X[i] = row
+    return X, errors
+
+
+def _binary_rows():
+    """The request's binary body as a float64 array, or None and an error response."""
     try:
-        features_array = np.array(features, dtype=np.float64).reshape(1, -1)
-        scaled = scaler.transform(features_array)
-        tensor = torch.FloatTensor(scaled)
+        return wire.decode(request.get_data(cache=False)), None
+    except wire.WireError as e:
+        return None, (jsonify({'error': str(e)}), 400)
+
+
+def _score(features_array, b):
+    """Scale an (n, n_features) array and run the whole thing through b's model at once.
+
+    Returns the scaled array and the fail probability for each row.
+    """
+    return b.engine.score(features_array)
 
-        with torch.no_grad():
-            output = model(tensor).squeeze()
-            confidence = torch.sigmoid(output).item()
 
-        prediction = 'fail' if confidence >= 0.5 else 'pass'
-        conf = round(confidence if prediction == 'fail' else 1 - confidence, 4)
+# single-row requests from concurrent threads get scored together through this
+batcher = MicroBatcher(_score, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS)
 
-        # hash the input for deduplication tracking
-        input_hash = hashlib.md5(str(features).encode()).hexdigest()[:12]
-        log_prediction(input_hash, prediction, conf, scaled[0].tolist())
 
-        return jsonify({
+def _label(confidence):
+    """Turn a fail probability into a pass/fail label and its confidence."""
+    prediction = 'fail' if confidence >= 0.5 else 'pass'
+    conf = round(float(confidence if prediction == 'fail' else 1 - confidence), 4)
+    return prediction, conf
+
+
+def _input_hash(key):
+    # short form of the cache key, logged for deduplication tracking
+    return key.hex()[:12]
+
+
+@app.route('/predict', methods=['POST'])
+def predict():
+    b = bundle
+    if b is None:
+        return jsonify({'error': 'model not loaded'}), 503
+    stopwatch = g.stopwatch
+
+    if request.mimetype == wire.CONTENT_TYPE:
+        features_array, error_response = _binary_rows()
+        stopwatch.lap('predict.parse')
+        if error_response:
+            return error_response
+        if features_array.shape[0] != 1:
+            return jsonify({'error': f'send one row to /predict, got {features_array.shape[0]}'}), 400
+        if features_array.shape[1] != b.n_features:
+            return jsonify({'error': f'expected {b.n_features} features, got {features_array.shape[1]}'}), 400
+    else:
+        data = request.get_json()
+        stopwatch.lap('predict.parse')
+        if not data or 'features' not in data:
+            return jsonify({'error': 'request must include "features" array'}), 400
+        row, error = _feature_row(data['features'], b.n_features)
+        if error:
+            return jsonify({'error': error}), 400
+        features_array = row.reshape(1, -1)
+    if not wire.finite_rows(features_array)[0]:
+        return jsonify({'error': NON_FINITE_ERROR}), 400
+    stopwatch.lap('predict.validate')
+
+    try:
+        key = feature_key(features_array)
+        stopwatch.lap('predict.hash')
+        cached = prediction_cache.get((b.version, key))
+        if cached is None:
+            scaled_row, confidence = batcher.submit(features_array, b)
+            # float32 is what gets logged anyway, and it halves the cache's footprint
+            scaled_row = scaled_row.astype(np.float32)
+            prediction_cache.put((b.version, key), (scaled_row, confidence))
+        else:
+            scaled_row, confidence = cached
+        prediction, conf = _label(confidence)
+        # the batcher's wait, scaling and forward pass (or a cache hit)
+        stopwatch.lap('predict.score')
+
+        # None while it's still being seeded in the background
+        monitor = get_drift_monitor(b)
+        # queued for the background writer, the id is reserved already. None if it was dropped
+        prediction_id = log_prediction(_input_hash(key), prediction, conf, scaled_row, b.version)
+        stopwatch.lap('predict.log')
+        if monitor is not None:
+            monitor.update(scaled_row)
+            stopwatch.lap('predict.drift')
+
+        timestamp = datetime.now().isoformat()
+        result = {
             'prediction': prediction,
             'confidence': conf,
-            'timestamp': datetime.now().isoformat()
-        })
+            'model_version': b.version,
+            'timestamp': timestamp
+        }
+        if prediction_id is None:
+            # the log queue was full, there's no row to give feedback on
+            result['logged'] = False
+        else:
+            result['id'] = prediction_id
+            event_bus.publish('prediction', {
+                'id': prediction_id, 'timestamp': timestamp, 'input_hash': _input_hash(key),
+                'prediction': prediction, 'confidence': conf, 'actual_label': None, 'model_version': b.version
+            })
+        response = jsonify(result)
+        stopwatch.lap('predict.respond')
+        return response
     except Exception as e:
         logger.error(f"Prediction failed: {e}")
         return jsonify({'error': 'prediction failed'}), 500
 
 
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """Score a batch of wafers with one scaler pass and one forward pass.
+
+    Bad rows get an error entry in their slot instead of failing the whole batch.
+    """
+    b = bundle
+    if b is None:
+        return jsonify({'error': 'model not loaded'}), 503
+    stopwatch = g.stopwatch
+
+    expected = b.n_features
+    binary = request.mimetype == wire.CONTENT_TYPE
+    if binary:
+        X, error_response = _binary_rows()
+        stopwatch.lap('batch.parse')
+        if error_response:
+            return error_response
+        if not len(X):
+            return jsonify({'error': 'body has no rows'}), 400
+        if X.shape[1] != expected:
+            return jsonify({'error': f'expected {expected} features per row, got {X.shape[1]}'}), 400
+        n_rows = len(X)
+    else:
+        data = request.get_json()
+        stopwatch.lap('batch.parse')
+        if not data or not isinstance(data.get('rows'), list) or not data['rows']:
+            return jsonify({'error': 'request must include a non-empty "rows" array'}), 400
+        n_rows = len(data['rows'])
+    if n_rows > MAX_BATCH_ROWS:
+        return jsonify({'error': f'at most {MAX_BATCH_ROWS} rows per batch, got {n_rows}'}), 400
+
+    errors = {}
+    if not binary:
+        X, errors = _rows_array(data['rows'], expected)
+    finite = wire.finite_rows(X)
+    for i in np.flatnonzero(~finite).tolist():
+        errors.setdefault(i, NON_FINITE_ERROR)
+    results = [None] * n_rows
+    for i, error in errors.items():
+        results[i] = {'index': i, 'error': error}
+    valid_idx = np.flatnonzero(finite).tolist()
+    stopwatch.lap('batch.validate')
+
+    try:
+        if valid_idx:
+            features_array = X if len(valid_idx) == n_rows else X[finite]
+            keys = [(b.version, feature_key(row)) for row in features_array]
+            stopwatch.lap('batch.hash')
+            scaled = np.empty(features_array.shape, dtype=np.float32)
+            confidences = np.empty(len(keys))
+
+            # only rows the cache hasn't seen go through the model, still as one batch
+            misses = []
+            for j, key in enumerate(keys):
+                cached = prediction_cache.get(key)
+                if cached is None:
+                    misses.append(j)
+                else:
+                    scaled[j], confidences[j] = cached
+            if misses:
+                scaled[misses], confidences[misses] = _score(features_array[misses], b)
+                for j in misses:
+                    prediction_cache.put(keys[j], (scaled[j].copy(), confidences[j]))
+            stopwatch.lap('batch.score')
+
+            entries = []
+            for i, key, row_scaled, confidence in zip(valid_idx, keys, scaled, confidences):
+                prediction, conf = _label(confidence)
+                results[i] = {'index': i, 'prediction': prediction, 'confidence': conf}
+                entries.append((_input_hash(key[1]), prediction, conf, row_scaled, b.version))
+            monitor = get_drift_monitor(b)
+            timestamp = datetime.now().isoformat()
+            for i, entry, prediction_id in zip(valid_idx, entries, log_predictions(entries)):
+                if prediction_id is None:
+                    results[i]['logged'] = False
+                    continue
+                results[i]['id'] = prediction_id
+                event_bus.publish('prediction', {
+                    'id': prediction_id, 'timestamp': timestamp, 'input_hash': entry[0],
+                    'prediction': entry[1], 'confidence': entry[2], 'actual_label': None, 'model_version': b.version
+                })
+            stopwatch.lap('batch.log')
+            if monitor is not None:
+                monitor.update(scaled)
+                stopwatch.lap('batch.drift')
+    except Exception as e:
+        logger.error(f"Batch prediction failed: {e}")
+        return jsonify({'error': 'prediction failed'}), 500
+
+    response = jsonify({
+        'results': results,
+        'scored': len(valid_idx),
+        'rejected': n_rows - len(valid_idx),
+        'model_version': b.version,
+        'timestamp': datetime.now().isoformat()
+    })
+    stopwatch.lap('batch.respond')
+    return response
+
+
+def get_sample_pool():
+    """Cleaned dataset rows for /sample, loaded once per worker.
+
+    Uses the sample_pool.npy that train.py writes next to the model. Without it
+    the CSV gets cleaned once here and kept in memory.
+    """
+    global _sample_pool
+    if _sample_pool is None:
+        with _sample_lock:
+            if _sample_pool is None:
+                b = bundle
+                path = b.path(registry.SAMPLE_POOL_FILE) if b else SAMPLE_POOL_PATH
+                if not os.path.exists(path):
+                    path = SAMPLE_POOL_PATH
+                if os.path.exists(path):
+                    _sample_pool = np.load(path, mmap_mode='r')
+                else:
+                    from preprocessing import load_and_clean, build_sample_pool
+                    _sample_pool = build_sample_pool(load_and_clean(DATA_PATH))
+    return _sample_pool
+
+
+def _sample_rng():
+    # seeded per process: with preload_app every worker would otherwise inherit
+    # the master's numpy RNG state and draw the same "random" rows
+    global _rng, _rng_pid
+    if _rng_pid != os.getpid():
+        _rng = np.random.default_rng()
+        _rng_pid = os.getpid()
+    return _rng
+
+
 @app.route('/sample', methods=['GET'])
 def sample():
-    """Return a random row from the dataset for testing."""
+    """Return a random row from the dataset for testing, or ?n= rows for load tests."""
+    n = request.args.get('n', 1, type=int)
+    if n < 1 or n > MAX_SAMPLE_ROWS:
+        return jsonify({'error': f'n must be between 1 and {MAX_SAMPLE_ROWS}'}), 400
+
     try:
-        from preprocessing import load_and_clean
-        df = load_and_clean('../data/uci-secom.csv')
-        row = df.sample(1).drop(columns=['Pass/Fail']).iloc[0]
-        # replace any remaining NaN with 0
-        features = row.fillna(0).tolist()
-        return jsonify({'features': features, 'n_features': len(features)})
+        pool = get_sample_pool()
+        rows = pool[np.sort(_sample_rng().integers(0, len(pool), size=n))].tolist()
+        if n == 1:
+            return jsonify({'features': rows[0], 'n_features': len(rows[0])})
+        return jsonify({'samples': rows, 'count': n, 'n_features': pool.shape[1]})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def _local_timestamp(value):
+    """Parse an ISO 8601 string into the naive local time timestamps are stored in.
+
+    Stored timestamps are datetime.now() isoformat strings, so an offset-aware
+    value is converted to local time first. Raises ValueError if it doesn't parse.
+    """
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def _history_filters(args):
+    """The filters /predictions and /predictions/export share. Returns (filters, error)."""
+    filters = {}
+    before_id = args.get('before_id')
+    if before_id is not None:
+        try:
+            filters['before_id'] = int(before_id)
+        except ValueError:
+            return None, 'before_id must be an integer'
+    for name in ('prediction', 'actual_label'):
+        value = args.get(name)
+        allowed = ('pass', 'fail', 'none') if name == 'actual_label' else ('pass', 'fail')
+        if value is not None:
+            if value not in allowed:
+                return None, f"{name} must be one of {', '.join(allowed)}"
+            filters[name] = value
+    for name in ('since', 'until'):
+        value = args.get(name)
+        if value is not None:
+            try:
+                filters[name] = _local_timestamp(value)
+            except ValueError:
+                return None, f'{name} must be an ISO 8601 timestamp'
+    return filters, None
+
+
 @app.route('/predictions', methods=['GET'])
 def predictions():
+    """One page of prediction history, newest first.
+
+    For the next page pass the last row's id as ?before_id=. Filters:
+    prediction, actual_label (pass, fail or none) and since/until timestamps.
+    """
     n = request.args.get('n', 50, type=int)
-    rows = get_recent_predictions(n)
-    # strip out the scaled_features blob, frontend doesn't need it
-    for row in rows:
-        row.pop('scaled_features', None)
-    return jsonify(rows)
+    if n < 1 or n > MAX_HISTORY_ROWS:
+        return jsonify({'error': f'n must be between 1 and {MAX_HISTORY_ROWS}'}), 400
+    filters, error = _history_filters(request.args)
+    if error:
+        return jsonify({'error': error}), 400
+    return jsonify(get_predictions(n, **filters))
+
+
+@app.route('/predictions/export', methods=['GET'])
+def export_predictions():
+    """Every matching prediction as one JSON array, streamed a page at a time.
+
+    Same filters as /predictions, plus an optional ?limit=.
+    """
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+    filters, error = _history_filters(request.args)
+    if error:
+        return jsonify({'error': error}), 400
+
+    def generate():
+        # one write per ~1000 rows rather than per row
+        chunk = ['[']
+        separator = '\n'
+        for row in iter_predictions(limit=limit, **filters):
+            chunk.append(separator + json.dumps(row))
+            separator = ',\n'
+            if len(chunk) >= 1000:
+                yield ''.join(chunk)
+                chunk = []
+        chunk.append('\n]\n')
+        yield ''.join(chunk)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/json',
+        headers={'Content-Disposition': 'attachment; filename=predictions.json'}
+    )
 
 
 @app.route('/metrics', methods=['GET'])
 def metrics():
-    return jsonify(get_metrics())
+    window = request.args.get('window', 60, type=int)
+    if window < 1 or window > MAX_METRICS_WINDOW:
+        return jsonify({'error': f'window must be between 1 and {MAX_METRICS_WINDOW} minutes'}), 400
+    return jsonify(get_metrics(window))
 
 
 @app.route('/feedback', methods=['POST'])
@@ -153,33 +749,230 @@ def feedback():
     label = data['actual_label']
     if label not in ('pass', 'fail'):
         return jsonify({'error': 'actual_label must be "pass" or "fail"'}), 400
+    # bool is an int subclass, but true isn't a prediction id
+    if not isinstance(data['id'], int) or isinstance(data['id'], bool):
+        return jsonify({'error': 'id must be an integer'}), 400
 
     updated = update_actual_label(data['id'], label)
     if not updated:
         return jsonify({'error': 'prediction not found'}), 404
+    event_bus.publish('feedback', {'id': data['id'], 'actual_label': label})
 
     return jsonify({'status': 'updated'})
 
 
+def _sse(kind, data):
+    return f'event: {kind}\ndata: {app.json.dumps(data)}\n\n'
+
+
+@app.route('/events', methods=['GET'])
+def events():
+    """Server-sent events: each prediction, feedback label and scheduled drift check as it happens.
+
+    Every batch of predictions is followed by a 'metrics' event with the
+    counts to add to /metrics' totals. 'resync' means events were skipped
+    (a slow client, or a bulk import) and the client should reload.
+    """
+    subscription = event_bus.subscribe()
+    if subscription is None:
+        return jsonify({'error': 'too many event streams open, try again later'}), 503
+
+    def generate():
+        yield 'retry: 3000\n\n'
+        deadline = time.monotonic() + EVENTS_MAX_SECONDS
+        while time.monotonic() < deadline:
+            events = subscription.get(EVENTS_HEARTBEAT_SECONDS)
+            if not events:
+                # also how a client that went away is noticed, the write fails
+                yield ': keep-alive\n\n'
+                continue
+            chunk = []
+            delta = {'total': 0, 'pass_count': 0, 'fail_count': 0, 'confidence_sum': 0.0}
+            for kind, data in events:
+                chunk.append(_sse(kind, data))
+                if kind == 'prediction':
+                    delta['total'] += 1
+                    delta[f"{data['prediction']}_count"] += 1
+                    delta['confidence_sum'] += data['confidence']
+            if delta['total']:
+                delta['confidence_sum'] = round(delta['confidence_sum'], 4)
+                chunk.append(_sse('metrics', delta))
+            yield ''.join(chunk)
+
+    response = Response(
+        generate(),
+        mimetype='text/event-stream',
+        # no-transform and X-Accel-Buffering keep proxies from holding events back
+        headers={'Cache-Control': 'no-cache, no-transform', 'X-Accel-Buffering': 'no'}
+    )
+    # runs however the stream ends, even if the generator never started
+    response.call_on_close(lambda: event_bus.unsubscribe(subscription))
+    return response
+
+
 @app.route('/drift', methods=['GET'])
 def drift():
-    if train_features is None:
+    """KS drift of the last n predictions against the training baseline.
+
+    For the window sizes the scheduler checks, this is its latest stored result
+    (cached: true, with its timestamp). Other sizes, ?fresh=1 and a missing or
+    stale result run the test on this request.
+    """
+    b = bundle
+    baseline = get_ks_baseline(b)
+    if baseline is None:
         return jsonify({'error': 'training baseline not loaded'}), 503
 
+    stopwatch = g.stopwatch
     n = request.args.get('n', 100, type=int)
-    recent = get_recent_features(n)
+    if n in drift_scheduler.windows and not request.args.get('fresh', type=int):
+        stored = get_latest_drift(n, b.version)
+        stopwatch.lap('drift.cached')
+        if drift_scheduler.fresh(stored):
+            stored['cached'] = True
+            return jsonify(stored)
+
+    # only rows the serving model scaled are comparable with its baseline.
+    # split further into features.query and features.decode spans
+    recent = get_recent_features(n, b.version)
+    stopwatch.lap('drift.fetch')
 
     if len(recent) < 10:
         return jsonify({'error': 'need at least 10 predictions to check drift'}), 400
 
-    recent_array = np.array(recent)
-    result = detect_drift(recent_array, train_features)
+    result = detect_drift(recent, baseline)
+    stopwatch.lap('drift.ks_test')
     result['samples_compared'] = len(recent)
+    result['model_version'] = b.version
     result['timestamp'] = datetime.now().isoformat()
+    result['cached'] = False
 
     return jsonify(result)
 
 
+@app.route('/drift/history', methods=['GET'])
+def drift_history():
+    """Stored drift checks of one window size over time, oldest first.
+
+    ?window= picks the size (default the smallest checked), ?since= an ISO
+    start time, ?limit= the most recent points to return and ?feature= adds
+    that feature's KS statistic to every point.
+    """
+    b = bundle
+    window = request.args.get('window', drift_scheduler.windows[0], type=int)
+    if window not in drift_scheduler.windows:
+        return jsonify({'error': f"window must be one of {', '.join(map(str, drift_scheduler.windows))}"}), 400
+    limit = request.args.get('limit', 1000, type=int)
+    if limit < 1 or limit > MAX_DRIFT_HISTORY_POINTS:
+        return jsonify({'error': f'limit must be between 1 and {MAX_DRIFT_HISTORY_POINTS}'}), 400
+    feature = request.args.get('feature', type=int)
+    if feature is not None and feature < 0:
+        return jsonify({'error': 'feature must be a feature index'}), 400
+    since = request.args.get('since')
+    if since:
+        try:
+            since = _local_timestamp(since).isoformat()
+        except ValueError:
+            return jsonify({'error': 'since must be an ISO timestamp'}), 400
+    version = request.args.get('model_version', b.version if b else None)
+
+    return jsonify({
+        'window': window,
+        'model_version': version,
+        'interval': drift_scheduler.interval,
+        'points': get_drift_history(window, version, since, limit, feature),
+    })
+
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """This worker's stage and request latency histograms, in Prometheus text format."""
+    cache = prediction_cache.stats()
+    batching = batcher.stats()
+    extra = [
+        ('semiguard_cache_hits_total', 'counter', 'Prediction cache hits', cache['hits']),
+        ('semiguard_cache_misses_total', 'counter', 'Prediction cache misses', cache['misses']),
+        ('semiguard_batches_total', 'counter', 'Forward passes run by the micro-batcher', batching['batches']),
+        ('semiguard_batched_rows_total', 'counter', 'Rows scored through the micro-batcher', batching['rows']),
+    ]
+    logging_stats = writer_stats()
+    if logging_stats is not None:
+        extra += [
+            ('semiguard_log_queued', 'gauge', 'Predictions waiting to be written', logging_stats['queued']),
+            ('semiguard_log_written_total', 'counter', 'Predictions committed by the writer', logging_stats['written']),
+            ('semiguard_log_dropped_total', 'counter', 'Predictions dropped on a full queue', logging_stats['dropped']),
+        ]
+    return Response(timing.render_prometheus(extra), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/drift/live', methods=['GET'])
+def drift_live():
+    """Drift over the rolling window predict() maintains, without touching the database."""
+    monitor = get_drift_monitor()
+    if monitor is None:
+        return jsonify({'error': 'streaming drift monitor not available'}), 503
+
+    result = monitor.result()
+    if result is None:
+        return jsonify({'error': 'need at least 10 predictions to check drift'}), 400
+
+    result['timestamp'] = datetime.now().isoformat()
+    return jsonify(result)
+
+
+def _model_summary(version):
+    try:
+        with open(os.path.join(registry.version_dir(version, MODELS_DIR), registry.METADATA_FILE)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = {}
+    return {
+        'version': version,
+        'n_features': meta.get('n_features'),
+        'trained_at': meta.get('trained_at'),
+        'train_samples': meta.get('train_samples')
+    }
+
+
+@app.route('/models', methods=['GET'])
+def models():
+    """Versions on disk, which one ACTIVE points at and which one this worker serves."""
+    b = bundle
+    return jsonify({
+        'active': registry.active_version(MODELS_DIR),
+        'loaded': b.version if b else None,
+        'versions': [_model_summary(v) for v in registry.list_versions(MODELS_DIR)]
+    })
+
+
+@app.route('/models/active', methods=['POST'])
+def activate_model():
+    """Switch to another model version without restarting.
+
+    The version is loaded in this worker first, so a broken one is rejected
+    before ACTIVE changes. The other workers pick the new ACTIVE up on their
+    next check. Without a "version" this reloads whatever ACTIVE names.
+    """
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'admin endpoints are disabled, set SEMIGUARD_ADMIN_TOKEN'}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({'error': 'invalid admin token'}), 401
+
+    data = request.get_json(silent=True) or {}
+    version = data.get('version') or registry.active_version(MODELS_DIR)
+    if version is not None and version not in registry.list_versions(MODELS_DIR):
+        return jsonify({'error': f'model version {version} not found'}), 404
+
+    with _reload_lock:
+        if not load_model(version):
+            return jsonify({'error': f'could not load model version {version}'}), 500
+        if version is not None:
+            registry.set_active(version, MODELS_DIR)
+
+    b = bundle
+    return jsonify({'status': 'loaded', 'model_version': b.version, 'n_features': b.n_features})
+
+
 @app.errorhandler(404)
 def not_found(e):
     return jsonify({'error': 'not found'}), 404
@@ -191,4 +984,5 @@ def server_error(e):
 
 
 if __name__ == '__main__':
+    drift_scheduler.start()
     app.run(debug=True, port=5050)
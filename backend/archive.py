@@ -0,0 +1,254 @@
+"""Move old days of feature vectors out of predictions.db into archive files.
+
+database.py stores feature vectors in one table per day (features_YYYYMMDD).
+This copies every day older than the retention window into columnar blocks on
+disk and drops its table. The prediction rows stay in predictions, so history,
+feedback and the metric rollups are unaffected. Each archived day is a
+directory with one block per model version and width:
+
+    archive/2026-10-01/manifest.json
+    archive/2026-10-01/000-<version>.ids.npy       int64 prediction ids
+    archive/2026-10-01/000-<version>.features.npy  float32 (rows, n_features)
+
+The blocks can be memory-mapped straight back with np.load(mmap_mode='r').
+Meant to run daily, from cron or similar:
+
+    python archive.py                # archive days past SEMIGUARD_FEATURE_RETENTION_DAYS
+    python archive.py --vacuum       # also rebuild the db file once, see below
+
+Dropping a day's table frees its pages, and incremental vacuum hands them back
+to the filesystem. Databases created before that was switched on only have it
+after one full VACUUM, which --vacuum runs (it locks the db while it does).
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+import database
+
+# days of feature vectors kept in predictions.db, the drift window reads these
+FEATURE_RETENTION_DAYS = int(os.environ.get('SEMIGUARD_FEATURE_RETENTION_DAYS', 7))
+# days of archive directories kept, 0 keeps them forever
+ARCHIVE_RETENTION_DAYS = int(os.environ.get('SEMIGUARD_ARCHIVE_RETENTION_DAYS', 0))
+# next to the database unless set
+ARCHIVE_DIR = os.environ.get('SEMIGUARD_ARCHIVE_DIR')
+
+MANIFEST_FILE = 'manifest.json'
+# rows read and cleared per statement
+CHUNK_ROWS = 10_000
+
+
+def archive_dir():
+    return ARCHIVE_DIR or os.path.join(os.path.dirname(os.path.abspath(database.DB_PATH)), 'archive')
+
+
+def _read_manifest(day_dir):
+    try:
+        with open(os.path.join(day_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'blocks': []}
+
+
+def _write_manifest(day_dir, manifest):
+    path = os.path.join(day_dir, MANIFEST_FILE)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _write_block(conn, day_dir, name, table, version, width, n_rows):
+    ids = np.lib.format.open_memmap(os.path.join(day_dir, f'{name}.ids.npy'), mode='w+',
+                                    dtype=np.int64, shape=(n_rows,))
+    features = np.lib.format.open_memmap(os.path.join(day_dir, f'{name}.features.npy'), mode='w+',
+                                         dtype=np.float32, shape=(n_rows, width))
+    cursor = conn.execute(f'''
+        SELECT id, scaled_features FROM {table}
+        WHERE model_version IS ? AND length(scaled_features) = ?
+        ORDER BY id
+    ''', (version, width * 4))
+    start = 0
+    while start < n_rows:
+        rows = cursor.fetchmany(CHUNK_ROWS)
+        if not rows:
+            break
+        stop = start + len(rows)
+        ids[start:stop] = [row[0] for row in rows]
+        features[start:stop] = np.frombuffer(b''.join(row[1] for row in rows), dtype=np.float32).reshape(-1, width)
+        start = stop
+    ids.flush()
+    features.flush()
+    return np.array(ids)
+
+
+def archive_day(day, out_dir=None):
+    """Write one day's partition to the archive and drop it from the database.
+
+    The blocks and the manifest listing them are on disk before anything is
+    removed, so a crash in between leaves the day in both places rather than in
+    neither (readers skip the repeated ids). Predictions for the day that arrive
+    while it's being written stay in the table, and the next run adds a block
+    for them. Returns the number of rows archived.
+    """
+    conn = database.get_connection()
+    table = database.features_table(day)
+    day_dir = os.path.join(out_dir or archive_dir(), day.isoformat())
+
+    # a read snapshot, so the counts match the rows read and the API keeps writing
+    conn.execute('BEGIN')
+    try:
+        try:
+            groups = conn.execute(f'''
+                SELECT model_version, length(scaled_features) / 4 AS width, COUNT(*)
+                FROM {table} GROUP BY model_version, width
+            ''').fetchall()
+        except sqlite3.OperationalError:
+            # no partition for this day
+            return 0
+        archived = []
+        if groups:
+            os.makedirs(day_dir, exist_ok=True)
+            manifest = _read_manifest(day_dir)
+            for version, width, n_rows in groups:
+                name = f"{len(manifest['blocks']):03d}-{version or 'unversioned'}"
+                ids = _write_block(conn, day_dir, name, table, version, width, n_rows)
+                manifest['blocks'].append({
+                    'name': name, 'model_version': version, 'n_features': width, 'rows': len(ids)
+                })
+                archived.append(ids)
+            _write_manifest(day_dir, manifest)
+    finally:
+        conn.commit()
+    ids = np.concatenate(archived) if archived else np.empty(0, dtype=np.int64)
+
+    # rows only ever get added to a partition, so an unchanged count means
+    # nothing arrived since the snapshot and the whole table can go
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] == len(ids):
+            conn.execute(f'DROP TABLE {table}')
+        else:
+            conn.executemany(f'DELETE FROM {table} WHERE id = ?', ((int(i),) for i in ids))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(ids)
+
+
+def partition_day(table):
+    """The day a features_YYYYMMDD partition holds."""
+    return datetime.strptime(table[len(database.FEATURES_TABLE_PREFIX):], '%Y%m%d').date()
+
+
+def archive_old_features(retention_days=FEATURE_RETENTION_DAYS, out_dir=None, today=None):
+    """Archive every partition more than retention_days old.
+
+    Returns {day: rows archived} for each day archived, oldest first.
+    """
+    cutoff = (today or date.today()) - timedelta(days=retention_days)
+    done = {}
+    for table in reversed(database.feature_partitions()):
+        day = partition_day(table)
+        if day >= cutoff:
+            break
+        done[day] = archive_day(day, out_dir)
+
+    if done:
+        # no-op unless the db was created with (or vacuumed into) auto_vacuum=INCREMENTAL.
+        # it frees a page per step, and execute() would stop after the first one
+        database.get_connection().executescript('PRAGMA incremental_vacuum;')
+    return done
+
+
+def prune_archive(retention_days=ARCHIVE_RETENTION_DAYS, out_dir=None, today=None):
+    """Delete archived days older than retention_days. Returns the days removed."""
+    if retention_days <= 0:
+        return []
+    cutoff = (today or date.today()) - timedelta(days=retention_days)
+    removed = []
+    for day in list_days(out_dir):
+        if day < cutoff:
+            shutil.rmtree(os.path.join(out_dir or archive_dir(), day.isoformat()))
+            removed.append(day)
+    return removed
+
+
+def list_days(out_dir=None):
+    """Archived days, oldest first."""
+    root = out_dir or archive_dir()
+    if not os.path.isdir(root):
+        return []
+    days = []
+    for name in os.listdir(root):
+        try:
+            days.append(date.fromisoformat(name))
+        except ValueError:
+            continue
+    return sorted(days)
+
+
+def load_features(day, model_version=None, out_dir=None):
+    """One archived day's features: (ids, float32 features), ordered by id.
+
+    With model_version only that version's blocks are read. Without it all
+    blocks of the day's most common width are, since rows of different widths
+    can't share a matrix.
+    """
+    day_dir = os.path.join(out_dir or archive_dir(), day.isoformat())
+    blocks = _read_manifest(day_dir)['blocks']
+    if model_version is not None:
+        blocks = [b for b in blocks if b['model_version'] == model_version]
+    if not blocks:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+    widths = {}
+    for b in blocks:
+        widths[b['n_features']] = widths.get(b['n_features'], 0) + b['rows']
+    width = max(widths, key=widths.get)
+    blocks = [b for b in blocks if b['n_features'] == width]
+
+    ids = np.concatenate([np.load(os.path.join(day_dir, f"{b['name']}.ids.npy")) for b in blocks])
+    features = np.concatenate([
+        np.load(os.path.join(day_dir, f"{b['name']}.features.npy"), mmap_mode='r') for b in blocks
+    ])
+    # a block written twice (crash before its blobs were cleared) shows up as repeated ids
+    ids, first = np.unique(ids, return_index=True)
+    return ids, features[first]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Archive old feature vectors out of predictions.db')
+    parser.add_argument('--retention-days', type=int, default=FEATURE_RETENTION_DAYS,
+                        help='days of feature vectors to keep in the database')
+    parser.add_argument('--archive-retention-days', type=int, default=ARCHIVE_RETENTION_DAYS,
+                        help='days of archives to keep, 0 keeps them all')
+    parser.add_argument('--archive-dir', default=None, help='where the day directories go')
+    parser.add_argument('--vacuum', action='store_true',
+                        help='rebuild the database with incremental vacuum turned on (locks it meanwhile)')
+    args = parser.parse_args()
+
+    done = archive_old_features(args.retention_days, args.archive_dir)
+    for day, rows in done.items():
+        print(f"{day}: archived {rows} feature vectors")
+    if not done:
+        print("Nothing to archive")
+    for day in prune_archive(args.archive_retention_days, args.archive_dir):
+        print(f"{day}: archive removed")
+
+    if args.vacuum:
+        conn = database.get_connection()
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+        print("Database vacuumed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+class _Pending:
+    """One row waiting to be scored, plus a slot for its result."""
+
+    __slots__ = ('features', 'args', 'event', 'result', 'error')
+
+    def __init__(self, features, args):
+        self.features = features
+        self.args = args
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Collect single-row requests from concurrent threads and score them together.
+
+    A background thread takes the first waiting row, keeps pulling rows until it
+    has max_batch_size of them or max_wait_ms has passed since the first one, then
+    hands the stacked array to score_fn in a single call. score_fn takes an
+    (n, n_features) array and returns (scaled, confidences) for all n rows.
+
+    Extra arguments to submit() are passed on to score_fn. Rows submitted with
+    different arguments (e.g. two model versions during a reload) are never
+    stacked together: each group gets its own score_fn call.
+
+    max_batch_size <= 1 turns batching off and scores every row inline.
+    """
+
+    def __init__(self, score_fn, max_batch_size=16, max_wait_ms=2.0):
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.batches = 0
+        self.rows = 0
+        self.full_batches = 0
+        # size_counts[k] = number of batches that had k rows
+        self.size_counts = [0] * (max(self.max_batch_size, 1) + 1)
+
+    def submit(self, features, *args):
+        """Score one (1, n_features) row, blocking until its batch has run.
+
+        Returns (scaled_row, confidence) for that row.
+        """
+        if self.max_batch_size <= 1:
+            scaled, confidences = self.score_fn(features, *args)
+            self._record(1)
+            return scaled[0], confidences[0]
+
+        self._ensure_worker()
+        pending = _Pending(features, args)
+        self._queue.put(pending)
+        pending.event.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _ensure_worker(self):
+        # threads don't survive a fork, so each gunicorn worker starts its own lazily
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._process(batch)
+
+    def _process(self, batch):
+        groups = {}
+        for p in batch:
+            groups.setdefault(tuple(id(a) for a in p.args), []).append(p)
+        try:
+            for group in groups.values():
+                self._score_group(group)
+        finally:
+            self._record(len(batch))
+            for p in batch:
+                p.event.set()
+
+    def _score_group(self, group):
+        try:
+            features = np.vstack([p.features for p in group])
+            scaled, confidences = self.score_fn(features, *group[0].args)
+            for i, p in enumerate(group):
+                p.result = (scaled[i], confidences[i])
+        except Exception as e:
+            for p in group:
+                p.error = e
+
+    def _record(self, size):
+        with self._stats_lock:
+            self.batches += 1
+            self.rows += size
+            if size >= self.max_batch_size:
+                self.full_batches += 1
+            self.size_counts[min(size, len(self.size_counts) - 1)] += 1
+
+    def stats(self):
+        """Counters for how full the batches have been."""
+        with self._stats_lock:
+            avg = self.rows / self.batches if self.batches else 0
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': round(self.max_wait * 1000, 3),
+                'batches': self.batches,
+                'rows': self.rows,
+                'avg_batch_size': round(avg, 2),
+                'avg_fill': round(avg / max(self.max_batch_size, 1), 4),
+                'full_batches': self.full_batches,
+                'batch_size_counts': {
+                    str(size): count for size, count in enumerate(self.size_counts) if count
+                },
+            }
@@ -0,0 +1,78 @@
+"""Measure what a worker pays to boot: importing app (which loads the model).
+
+Each run is a fresh interpreter, started from backend/ so the ../models paths
+resolve the same way they do under gunicorn.
+
+    python benchmarks/startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = '''
+import json, resource, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter() - start
+heavy = [m for m in ('torch', 'scipy.stats', 'sklearn', 'pandas') if m in sys.modules]
+app.warm_up()
+warmed = time.perf_counter() - start
+print(json.dumps({
+    'import_s': imported,
+    'warm_up_s': warmed,
+    'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'engine': app.bundle.engine.name if app.bundle else None,
+    'heavy_modules': heavy,
+}))
+'''
+
+MODES = {
+    'numpy': {'SEMIGUARD_ENGINE': 'numpy'},
+    'torch': {'SEMIGUARD_ENGINE': 'torch'},
+}
+
+
+def run_once(env_overrides):
+    env = dict(os.environ, **env_overrides)
+    out = subprocess.run(
+        [sys.executable, '-c', CHILD],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure(env_overrides, runs):
+    results = [run_once(env_overrides) for _ in range(runs)]
+    return {
+        'engine': results[-1]['engine'],
+        'import_s': statistics.median(r['import_s'] for r in results),
+        'warm_up_s': statistics.median(r['warm_up_s'] for r in results),
+        'peak_rss_mb': max(r['peak_rss_mb'] for r in results),
+        'heavy_modules_after_import': results[-1]['heavy_modules'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='print raw results as JSON')
+    args = parser.parse_args()
+
+    report = {mode: measure(env, args.runs) for mode, env in MODES.items()}
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'mode':<8}{'engine':<8}{'import':>10}{'+warm_up':>10}{'peak RSS':>11}  heavy modules loaded by import")
+    for mode, r in report.items():
+        print(f"{mode:<8}{str(r['engine']):<8}{r['import_s']:>9.3f}s{r['warm_up_s']:>9.3f}s"
+              f"{r['peak_rss_mb']:>9.0f}MB  {', '.join(r['heavy_modules_after_import']) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,335 @@
+"""Throughput, latency and memory of the API hot paths, on synthetic SECOM-shaped data.
+
+Each case runs in a fresh interpreter so its peak RSS is its own. Results can
+be saved as a baseline and later runs compared against it, failing (exit 1)
+when ops/sec drops or peak RSS grows by more than --tolerance.
+
+    python benchmarks/suite.py                     # run, compare with baseline.json (recorded by the first full run)
+    python benchmarks/suite.py --quick --only drift
+    python benchmarks/suite.py --save-baseline     # record this machine's numbers
+
+Baselines are only comparable on the same hardware and library versions, so
+none is checked in: the first full run on a machine records its own.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+DEFAULT_WORKDIR = os.path.join(tempfile.gettempdir(), 'semiguard-bench')
+
+DRIFT_WINDOWS = [100, 1000, 10_000, 100_000]
+METRICS_ROWS = 1_000_000
+FEATURE_ROWS = 10_000
+BATCH_ROWS = 100
+# predictions made before timing starts. a fresh log means the streaming drift
+# window starts empty, and while it fills its alert checks are slower than
+# in steady state (a restarted worker seeds it from the log instead)
+PREDICT_WARMUP = 1500
+
+
+def time_op(fn, min_time=1.0, min_iters=5, max_iters=100_000, warmup=2):
+    """Call fn repeatedly for about min_time seconds. Returns per-call seconds."""
+    for _ in range(warmup):
+        fn()
+    times = []
+    start = time.perf_counter()
+    while len(times) < min_iters or (time.perf_counter() - start < min_time and len(times) < max_iters):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return times
+
+
+def summarize(times, items_per_call=1):
+    ms = np.array(times) * 1000
+    return {
+        'ops_per_sec': round(items_per_call * len(times) / sum(times), 2),
+        'p50_ms': round(float(np.percentile(ms, 50)), 4),
+        'p99_ms': round(float(np.percentile(ms, 99)), 4),
+        'calls': len(times),
+    }
+
+
+# --- cases, each run inside its own child process ---
+
+def _app_client():
+    import app
+    app.app.config['TESTING'] = True
+    # what gunicorn does before forking, keeps scipy's import out of the timings
+    app.warm_up()
+    return app, app.app.test_client()
+
+
+def _case_predict_single(binary):
+    def case(workdir, quick):
+        from synthetic import sensor_matrix, N_SPARSE
+        import wire
+        app, client = _app_client()
+        rows = np.nan_to_num(sensor_matrix(5000, seed=7)[:, N_SPARSE:])
+        if binary:
+            bodies, content_type = [wire.encode(row) for row in rows], wire.CONTENT_TYPE
+        else:
+            bodies, content_type = [json.dumps({'features': row.tolist()}) for row in rows], 'application/json'
+        i = iter(range(10 ** 9))
+
+        def call():
+            resp = client.post('/predict', data=bodies[next(i) % len(bodies)], content_type=content_type)
+            assert resp.status_code == 200, resp.get_data()
+
+        result = summarize(time_op(call, min_time=0.5 if quick else 2.0, warmup=PREDICT_WARMUP))
+        import database
+        database.flush_writes()
+        return result
+    return case
+
+
+def _case_predict_batch(binary):
+    def case(workdir, quick):
+        from synthetic import sensor_matrix, N_SPARSE
+        import wire
+        app, client = _app_client()
+        rows = np.nan_to_num(sensor_matrix(BATCH_ROWS * 20, seed=8)[:, N_SPARSE:])
+        chunks = [rows[k:k + BATCH_ROWS] for k in range(0, len(rows), BATCH_ROWS)]
+        if binary:
+            bodies, content_type = [wire.encode(chunk) for chunk in chunks], wire.CONTENT_TYPE
+        else:
+            bodies, content_type = [json.dumps({'rows': chunk.tolist()}) for chunk in chunks], 'application/json'
+        i = iter(range(10 ** 9))
+
+        def call():
+            resp = client.post('/predict/batch', data=bodies[next(i) % len(bodies)], content_type=content_type)
+            assert resp.status_code == 200, resp.get_data()
+
+        result = summarize(time_op(call, min_time=0.5 if quick else 2.0, warmup=PREDICT_WARMUP // BATCH_ROWS),
+                           BATCH_ROWS)
+        import database
+        database.flush_writes()
+        return result
+    return case
+
+
+def _case_drift(n):
+    def case(workdir, quick):
+        from drift import KSBaseline, detect_drift
+        baseline = KSBaseline.load(os.path.join(workdir, 'models', 'versions', 'bench', 'train_baseline.npy'))
+        recent = np.random.default_rng(n).normal(size=(n, baseline.n_features)).astype(np.float32)
+        return summarize(time_op(lambda: detect_drift(recent, baseline), min_time=0.5 if quick else 2.0,
+                                 min_iters=3, warmup=1))
+    return case
+
+
+def _case_recent_features(n):
+    def case(workdir, quick):
+        import database
+        return summarize(time_op(lambda: database.get_recent_features(n), min_time=0.5 if quick else 2.0))
+    return case
+
+
+def _case_drift_endpoint(fresh):
+    def case(workdir, quick):
+        app, client = _app_client()
+        # what the scheduler in one worker does every SEMIGUARD_DRIFT_CHECK_INTERVAL
+        app.drift_scheduler.run_once()
+        url = f"/drift?n=1000{'&fresh=1' if fresh else ''}"
+
+        def call():
+            resp = client.get(url)
+            assert resp.status_code == 200, resp.get_data()
+            assert resp.get_json()['cached'] is not fresh
+
+        return summarize(time_op(call, min_time=0.5 if quick else 2.0))
+    return case
+
+
+def case_metrics(workdir, quick):
+    import database
+    return summarize(time_op(lambda: database.get_metrics(1440), min_time=0.5 if quick else 2.0))
+
+
+def case_load_and_clean(workdir, quick):
+    from preprocessing import load_and_clean
+    import contextlib
+    import io
+    path = os.path.join(workdir, 'secom.csv')
+
+    def call():
+        with contextlib.redirect_stdout(io.StringIO()):
+            load_and_clean(path)
+
+    return summarize(time_op(call, min_time=0.5 if quick else 2.0, min_iters=3, warmup=1))
+
+
+# name -> (function, which database the child should open)
+CASES = {
+    'predict_single': (_case_predict_single(binary=False), 'scratch'),
+    'predict_single_binary': (_case_predict_single(binary=True), 'scratch'),
+    'predict_batch': (_case_predict_batch(binary=False), 'scratch'),
+    'predict_batch_binary': (_case_predict_batch(binary=True), 'scratch'),
+    **{f'drift_{n}': (_case_drift(n), 'scratch') for n in DRIFT_WINDOWS},
+    'recent_features_1000': (_case_recent_features(1000), 'features'),
+    f'recent_features_{FEATURE_ROWS}': (_case_recent_features(FEATURE_ROWS), 'features'),
+    'drift_endpoint_live': (_case_drift_endpoint(fresh=True), 'features'),
+    'drift_endpoint_cached': (_case_drift_endpoint(fresh=False), 'features'),
+    'metrics': (case_metrics, 'metrics'),
+    'load_and_clean': (case_load_and_clean, 'scratch'),
+}
+# skipped by --quick
+SLOW_CASES = {'drift_100000'}
+
+
+def child_env(workdir, db):
+    return dict(
+        os.environ,
+        SEMIGUARD_MODELS_DIR=os.path.join(workdir, 'models'),
+        SEMIGUARD_DB_PATH=os.path.join(workdir, f'{db}.db'),
+        SEMIGUARD_ENGINE='numpy',
+        # measure the handler itself: no cache hits, no waiting for batch peers
+        SEMIGUARD_CACHE_SIZE='0',
+        SEMIGUARD_BATCH_MAX_SIZE='1',
+        SEMIGUARD_RELOAD_INTERVAL='0',
+        PYTHONPATH=os.pathsep.join([BACKEND_DIR, BENCH_DIR]),
+    )
+
+
+def run_child(name, workdir, quick):
+    fn, db = CASES[name]
+    if db == 'scratch':
+        # each predict run starts from an empty log
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(os.path.join(workdir, f'scratch.db{suffix}')):
+                os.remove(os.path.join(workdir, f'scratch.db{suffix}'))
+    cmd = [sys.executable, os.path.abspath(__file__), '--child', name, '--workdir', workdir]
+    if quick:
+        cmd.append('--quick')
+    out = subprocess.run(cmd, cwd=BACKEND_DIR, env=child_env(workdir, db), capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f'{name} failed:\n{out.stderr[-2000:]}')
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def child_main(name, workdir, quick):
+    fn, _ = CASES[name]
+    result = fn(workdir, quick)
+    result['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    print(json.dumps(result))
+
+
+def prepare(workdir):
+    """Build the synthetic inputs once, they're reused by later runs."""
+    os.makedirs(workdir, exist_ok=True)
+    # database.py opens DB_PATH on import, keep that out of backend/
+    os.environ['SEMIGUARD_DB_PATH'] = os.path.join(workdir, 'scratch.db')
+    sys.path[:0] = [BACKEND_DIR, BENCH_DIR]
+    import synthetic
+
+    def missing(path):
+        return not os.path.exists(os.path.join(workdir, path))
+
+    if missing('models/ACTIVE'):
+        print('generating model...', file=sys.stderr)
+        synthetic.write_model(os.path.join(workdir, 'models'))
+    if missing('secom.csv'):
+        print('generating secom.csv...', file=sys.stderr)
+        synthetic.write_csv(os.path.join(workdir, 'secom.csv'))
+    if missing('features.db'):
+        print(f'generating features.db ({FEATURE_ROWS} rows)...', file=sys.stderr)
+        synthetic.write_predictions_db(os.path.join(workdir, 'features.db'), FEATURE_ROWS, with_features=True)
+    if missing('metrics.db'):
+        print(f'generating metrics.db ({METRICS_ROWS} rows)...', file=sys.stderr)
+        synthetic.write_predictions_db(os.path.join(workdir, 'metrics.db'), METRICS_ROWS)
+
+
+def compare(results, baseline, tolerance):
+    """Print results next to the baseline. Returns the names that regressed."""
+    regressed = []
+    print(f"{'case':<24}{'ops/sec':>12}{'vs base':>9}{'p50 ms':>10}{'p99 ms':>10}{'vs base':>9}{'RSS MB':>9}{'vs base':>9}")
+    for name, r in results.items():
+        base = baseline.get(name)
+
+        def delta(key):
+            if not base or not base.get(key):
+                return ''
+            return f'{(r[key] / base[key] - 1) * 100:+.0f}%'
+
+        flag = ''
+        if base and (r['ops_per_sec'] < base['ops_per_sec'] * (1 - tolerance)
+                     or r['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance)):
+            regressed.append(name)
+            flag = '  REGRESSED'
+        print(f"{name:<24}{r['ops_per_sec']:>12,.1f}{delta('ops_per_sec'):>9}{r['p50_ms']:>10.3f}"
+              f"{r['p99_ms']:>10.3f}{delta('p99_ms'):>9}{r['peak_rss_mb']:>9.0f}{delta('peak_rss_mb'):>9}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--only', help='run cases whose name contains this')
+    parser.add_argument('--quick', action='store_true', help='shorter timing loops, skip the slowest cases')
+    parser.add_argument('--workdir', default=DEFAULT_WORKDIR, help='where synthetic data is generated and kept')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='write these results to --baseline')
+    parser.add_argument('--tolerance', type=float, default=0.3,
+                        help='allowed fractional drop in ops/sec or growth in peak RSS (default 0.3)')
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child_main(args.child, args.workdir, args.quick)
+        return
+
+    prepare(args.workdir)
+    names = [n for n in CASES if (not args.only or args.only in n) and not (args.quick and n in SLOW_CASES)]
+    results = {}
+    for name in names:
+        print(f'running {name}...', file=sys.stderr)
+        results[name] = run_child(name, args.workdir, args.quick)
+
+    machine = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            saved = json.load(f)
+        baseline = saved['results']
+        differs = [k for k in ('numpy', 'cpus') if saved['machine'].get(k) != machine[k]]
+        if differs:
+            print(f"warning: the baseline was recorded with a different {' and '.join(differs)} "
+                  f"({', '.join(str(saved['machine'].get(k)) for k in differs)}), re-record it with --save-baseline",
+                  file=sys.stderr)
+    elif not os.path.exists(args.baseline) and not (args.only or args.quick):
+        # baselines are per machine, so none is checked in. the first full run records one
+        print(f'no baseline at {args.baseline} yet, saving this run as it', file=sys.stderr)
+        args.save_baseline = True
+    regressed = compare(results, baseline, args.tolerance)
+
+    report = {'machine': machine, 'results': results}
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'baseline saved to {args.baseline}')
+    if regressed:
+        print(f"\n{len(regressed)} case(s) regressed by more than {args.tolerance:.0%}: {', '.join(regressed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""SECOM-shaped synthetic data for the benchmarks, so no dataset download is needed.
+
+Same layout as uci-secom.csv: a Time column, 590 sensor columns with a few
+mostly-empty ones and scattered NaNs, and a -1/1 Pass/Fail label with ~7% fails.
+"""
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+N_SENSORS = 590
+# columns more than half empty, load_and_clean drops these
+N_SPARSE = 28
+N_FEATURES = N_SENSORS - N_SPARSE
+
+
+def sensor_matrix(n_rows, seed=0):
+    """Raw sensor readings with SECOM-like scales, offsets and missing values."""
+    rng = np.random.default_rng(seed)
+    scale = np.random.default_rng(1).uniform(0.1, 50, N_SENSORS)
+    offset = np.random.default_rng(2).uniform(-100, 100, N_SENSORS)
+    X = rng.normal(size=(n_rows, N_SENSORS)) * scale + offset
+    X[rng.random(X.shape) < 0.05] = np.nan
+    X[:, :N_SPARSE][rng.random((n_rows, N_SPARSE)) < 0.7] = np.nan
+    return X
+
+
+def write_csv(path, n_rows=1567, seed=0):
+    import pandas as pd
+
+    rng = np.random.default_rng(seed + 1)
+    df = pd.DataFrame(sensor_matrix(n_rows, seed), columns=[str(i) for i in range(N_SENSORS)])
+    df.insert(0, 'Time', '2008-07-19 11:55:00')
+    df['Pass/Fail'] = np.where(rng.random(n_rows) < 0.07, 1, -1)
+    df.to_csv(path, index=False)
+
+
+def write_model(models_dir, version='bench', n_train=1253, seed=0):
+    """A numpy-engine model version with random weights, laid out like train.py's."""
+    from inference import export_numpy
+    from drift import KSBaseline
+    from registry import version_dir, set_active
+
+    rng = np.random.default_rng(seed)
+    X = np.nan_to_num(sensor_matrix(n_train, seed)[:, N_SPARSE:])
+    mean, scale = X.mean(axis=0), X.std(axis=0)
+    scale[scale == 0] = 1.0
+
+    out = version_dir(version, models_dir)
+    os.makedirs(out, exist_ok=True)
+    sizes = [N_FEATURES, 128, 64, 1]
+    layers = [(rng.normal(size=(o, i)) / np.sqrt(i), np.zeros(o)) for i, o in zip(sizes, sizes[1:])]
+    export_numpy(layers, mean, scale, os.path.join(out, 'model_numpy.npz'))
+    KSBaseline.from_features((X - mean) / scale).save(os.path.join(out, 'train_baseline.npy'))
+    np.save(os.path.join(out, 'sample_pool.npy'), X)
+    with open(os.path.join(out, 'metadata.json'), 'w') as f:
+        json.dump({'version': version, 'n_features': N_FEATURES}, f)
+    set_active(version, models_dir)
+    return X, mean, scale
+
+
+def write_predictions_db(path, n_rows, with_features=False, days=30, seed=0):
+    """A predictions.db with n_rows logged over the last `days` days.
+
+    Goes through database.init_db so the schema, triggers and rollups are the
+    real ones. Rows get explicit ids, then the id counter is moved past them.
+    """
+    import database
+
+    rng = np.random.default_rng(seed)
+    database.DB_PATH = path
+    database.init_db()
+    conn = sqlite3.connect(path)
+    now = datetime.now()
+    step = timedelta(days=days) / n_rows
+    chunk = 50_000
+    for start in range(0, n_rows, chunk):
+        stop = min(start + chunk, n_rows)
+        rows = []
+        for i in range(start, stop):
+            timestamp = (now - (n_rows - i) * step).isoformat()
+            fail = rng.random() < 0.07
+            features = rng.normal(size=N_FEATURES).astype(np.float32).tobytes() if with_features else None
+            rows.append((i + 1, timestamp, f'{i:012x}', 'fail' if fail else 'pass',
+                         float(rng.uniform(0.5, 1.0)), features, 'bench'))
+        database.insert_rows(conn, rows)
+        conn.commit()
+    conn.execute('UPDATE id_blocks SET next_id = ? WHERE id = 1', (n_rows + 1,))
+    conn.commit()
+    conn.close()
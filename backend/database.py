@@ -1,14 +1,64 @@
 import sqlite3
+import itertools
 import json
 import os
-from datetime import datetime
+import re
+import queue
+import threading
+import time
+import atexit
+import logging
+from datetime import datetime, timedelta
 
-DB_PATH = os.path.join(os.path.dirname(__file__), 'predictions.db')
+import numpy as np
+
+import timing
+
+DB_PATH = os.environ.get('SEMIGUARD_DB_PATH', os.path.join(os.path.dirname(__file__), 'predictions.db'))
+
+# >0 logs predictions through the background writer, value is the flush window in ms.
+# 0 commits every prediction on the request thread
+WRITE_BEHIND_MS = float(os.environ.get('SEMIGUARD_DB_WRITE_BEHIND_MS', 5))
+# rows the writer may have waiting, and how long log_prediction waits for room
+# before dropping a row once it's full (0 drops straight away)
+QUEUE_SIZE = int(os.environ.get('SEMIGUARD_DB_QUEUE_SIZE', 10000))
+QUEUE_TIMEOUT_MS = float(os.environ.get('SEMIGUARD_DB_QUEUE_TIMEOUT_MS', 50))
+# prediction ids each process reserves at a time
+ID_BLOCK_SIZE = int(os.environ.get('SEMIGUARD_DB_ID_BLOCK', 100))
+# rows per transaction in import_predictions, the api's writer gets the lock in between
+IMPORT_COMMIT_ROWS = 10_000
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
 
 
 def get_connection():
-    conn = sqlite3.connect(DB_PATH)
+    """Return this thread's connection, opening it on first use.
+
+    Connections stay open for the life of the thread instead of being opened
+    per query. They're keyed on the process too, since sqlite handles can't be
+    shared across a fork. WAL mode lets /drift readers run while a write is in
+    progress.
+    """
+    key = (os.getpid(), DB_PATH)
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.key == key:
+        return conn
+    if conn is not None and _local.key[0] == key[0]:
+        # same process, DB_PATH changed underneath us
+        conn.close()
+
+    conn = sqlite3.connect(DB_PATH, timeout=30)
     conn.row_factory = sqlite3.Row
+    # only takes effect on a new file (before WAL writes its header), lets
+    # archive.py hand the pages it frees back to the filesystem
+    conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    conn.execute('PRAGMA journal_mode=WAL')
+    # with WAL, NORMAL only fsyncs at checkpoints and is still safe against corruption
+    conn.execute('PRAGMA synchronous=NORMAL')
+    _local.conn = conn
+    _local.key = key
     return conn
 
 
@@ -22,87 +72,1020 @@ def init_db():
             prediction TEXT NOT NULL,
             confidence REAL NOT NULL,
             actual_label TEXT,
-            scaled_features TEXT
+            scaled_features BLOB
         )
     ''')
     conn.commit()
-    conn.close()
+    migrate(conn)
+
+
+# bump this and add a step to migrate() whenever the stored format changes
+SCHEMA_VERSION = 8
+
+
+def migrate(conn):
+    """Bring an existing predictions.db up to SCHEMA_VERSION.
+
+    Tracked with PRAGMA user_version, so each step only ever runs once per file.
+    Version 1 rewrites JSON-encoded scaled_features rows as float32 blobs. The
+    old TEXT column declaration is left alone, sqlite stores blobs in it as is.
+    Run VACUUM afterwards to hand the freed space back to the filesystem.
+    Version 2 adds the trigger-maintained metric totals and per-minute rollups.
+    Version 3 adds the model_version column. Rows logged before it stay NULL.
+    Version 4 adds the id_blocks counter that prediction ids are reserved from.
+    Version 5 adds the indexes behind the /predictions history filters.
+    Version 6 moves the feature blobs into per-day partition tables.
+    Version 7 adds drift_history and the leases background jobs coordinate through.
+    Version 8 adds the events feed that GET /events relays between workers.
+    """
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+
+    # take the write lock up front so concurrent workers don't migrate twice
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version < 1:
+            converted = _migrate_features_to_blobs(conn)
+            if converted:
+                logger.info(f"Converted {converted} JSON feature rows to float32 blobs")
+        if version < 2:
+            _add_metric_rollups(conn)
+        if version < 3:
+            _add_model_version(conn)
+        if version < 4:
+            _add_id_blocks(conn)
+        if version < 5:
+            _add_history_indexes(conn)
+        if version < 6:
+            moved = _partition_features(conn)
+            if moved:
+                logger.info(f"Moved {moved} feature vectors into daily partitions")
+        if version < 7:
+            _add_drift_history(conn)
+        if version < 8:
+            _add_events(conn)
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _migrate_features_to_blobs(conn, chunk_size=1000):
+    converted = 0
+    last_id = 0
+    while True:
+        rows = conn.execute('''
+            SELECT id, scaled_features FROM predictions
+            WHERE id > ? AND typeof(scaled_features) = 'text'
+            ORDER BY id LIMIT ?
+        ''', (last_id, chunk_size)).fetchall()
+        if not rows:
+            return converted
+        conn.executemany(
+            'UPDATE predictions SET scaled_features = ? WHERE id = ?',
+            [(encode_features(json.loads(row['scaled_features'])), row['id']) for row in rows]
+        )
+        converted += len(rows)
+        last_id = rows[-1]['id']
+
+
+def _add_metric_rollups(conn):
+    """Running totals and per-minute buckets, kept current by triggers on insert/delete.
+
+    get_metrics reads these instead of scanning predictions. Buckets are keyed
+    on the first 16 characters of the ISO timestamp ('YYYY-MM-DDTHH:MM').
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS prediction_totals (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total INTEGER NOT NULL DEFAULT 0,
+            pass_count INTEGER NOT NULL DEFAULT 0,
+            fail_count INTEGER NOT NULL DEFAULT 0,
+            confidence_sum REAL NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS prediction_rollups (
+            minute TEXT PRIMARY KEY,
+            total INTEGER NOT NULL DEFAULT 0,
+            pass_count INTEGER NOT NULL DEFAULT 0,
+            fail_count INTEGER NOT NULL DEFAULT 0,
+            confidence_sum REAL NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_predictions_timestamp ON predictions (timestamp)')
+
+    # backfill from whatever is already logged
+    conn.execute('''
+        INSERT OR REPLACE INTO prediction_totals (id, total, pass_count, fail_count, confidence_sum)
+        SELECT 1, COUNT(*),
+            COALESCE(SUM(prediction = 'pass'), 0),
+            COALESCE(SUM(prediction = 'fail'), 0),
+            COALESCE(SUM(confidence), 0)
+        FROM predictions
+    ''')
+    conn.execute('''
+        INSERT OR REPLACE INTO prediction_rollups (minute, total, pass_count, fail_count, confidence_sum)
+        SELECT substr(timestamp, 1, 16), COUNT(*),
+            SUM(prediction = 'pass'), SUM(prediction = 'fail'), SUM(confidence)
+        FROM predictions
+        GROUP BY substr(timestamp, 1, 16)
+    ''')
+
+    for event, row, sign in (('INSERT', 'NEW', '+'), ('DELETE', 'OLD', '-')):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS predictions_rollup_{event.lower()}
+            AFTER {event} ON predictions
+            BEGIN
+                UPDATE prediction_totals SET
+                    total = total {sign} 1,
+                    pass_count = pass_count {sign} ({row}.prediction = 'pass'),
+                    fail_count = fail_count {sign} ({row}.prediction = 'fail'),
+                    confidence_sum = confidence_sum {sign} {row}.confidence
+                WHERE id = 1;
+                INSERT OR IGNORE INTO prediction_rollups (minute) VALUES (substr({row}.timestamp, 1, 16));
+                UPDATE prediction_rollups SET
+                    total = total {sign} 1,
+                    pass_count = pass_count {sign} ({row}.prediction = 'pass'),
+                    fail_count = fail_count {sign} ({row}.prediction = 'fail'),
+                    confidence_sum = confidence_sum {sign} {row}.confidence
+                WHERE minute = substr({row}.timestamp, 1, 16);
+            END
+        ''')
+
+
+def _add_model_version(conn):
+    columns = [row['name'] for row in conn.execute('PRAGMA table_info(predictions)')]
+    if 'model_version' not in columns:
+        conn.execute('ALTER TABLE predictions ADD COLUMN model_version TEXT')
+    # lets get_recent_features walk one version's newest rows without a scan
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_predictions_model_version ON predictions (model_version, id)')
+
+
+def _add_id_blocks(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS id_blocks (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            next_id INTEGER NOT NULL
+        )
+    ''')
+    # continue after the highest id ever handed out, deleted rows included
+    conn.execute('''
+        INSERT OR IGNORE INTO id_blocks (id, next_id)
+        SELECT 1, MAX(
+            COALESCE((SELECT MAX(id) FROM predictions), 0),
+            COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'predictions'), 0)
+        ) + 1
+    ''')
+
+
+class IdAllocator:
+    """Prediction ids handed out before the row is written.
+
+    Each process reserves block_size ids at a time from the id_blocks row, so
+    predict() can return the id straight away while the insert happens later on
+    the writer thread. A block is given up after max_age seconds even if it
+    isn't used up: ids from different workers then stay in roughly the order the
+    predictions were made, which is what ORDER BY id DESC relies on. The cost is
+    gaps in the id sequence.
+
+    Reserving is a write transaction, so a background thread does it: it keeps a
+    spare block ready, fetched once the current one is half used or stale.
+    next_id() only waits for it when there's no block at all, on the first
+    prediction in a process (see prefetch) or when refills fall behind.
+    """
+
+    def __init__(self, block_size=100, max_age=1.0):
+        self.block_size = block_size
+        self.max_age = max_age
+        self._next = 0
+        self._end = 0
+        self._reserved_at = 0.0
+        # (start, end, reserved_at) of the block fetched ahead
+        self._spare = None
+        self._wanted = False
+        self._error = None
+        self._key = None
+        self._thread = None
+        self._pid = None
+        self._cond = threading.Condition()
 
+    def next_id(self):
+        with self._cond:
+            self._check_key()
+            now = time.monotonic()
+            if self._spare is not None and now - self._spare[2] > self.max_age:
+                self._spare = None
+            if self._spare is not None and (self._next >= self._end or now - self._reserved_at > self.max_age):
+                self._take_spare()
+            while self._next >= self._end:
+                if self._spare is not None:
+                    self._take_spare()
+                    break
+                if self._error is not None:
+                    error, self._error = self._error, None
+                    raise error
+                if not self._wanted:
+                    self._request_refill()
+                self._cond.wait(1.0)
+            prediction_id = self._next
+            self._next += 1
+            # a stale block keeps being used until its replacement arrives
+            if self._spare is None and not self._wanted and (
+                    self._end - self._next <= self.block_size // 2
+                    or time.monotonic() - self._reserved_at > self.max_age):
+                self._request_refill()
+            return prediction_id
 
-def log_prediction(input_hash, prediction, confidence, scaled_features=None):
+    def prefetch(self):
+        """Start reserving a block now, so the first next_id() doesn't wait for it."""
+        with self._cond:
+            self._check_key()
+            if self._spare is None and not self._wanted:
+                self._request_refill()
+
+    def _check_key(self):
+        # blocks don't carry over a fork or onto another database file
+        key = (os.getpid(), DB_PATH)
+        if self._key != key:
+            self._key = key
+            self._next = self._end = 0
+            self._spare = None
+            self._wanted = False
+            self._error = None
+
+    def _take_spare(self):
+        self._next, self._end, self._reserved_at = self._spare
+        self._spare = None
+
+    def _request_refill(self):
+        # called with the lock held. threads don't survive a fork, so each process starts its own
+        self._wanted = True
+        self._error = None
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='id-allocator', daemon=True)
+            self._thread.start()
+        self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._wanted:
+                    self._cond.wait()
+                key = self._key
+            block = error = None
+            try:
+                block = reserve_ids(self.block_size)
+            except Exception as e:
+                logger.error(f"Could not reserve prediction ids: {e}")
+                error = e
+            with self._cond:
+                self._wanted = False
+                # a block from before a switch to another database file is dropped
+                if key == self._key:
+                    if block is not None:
+                        self._spare = block + (time.monotonic(),)
+                    else:
+                        self._error = error
+                self._cond.notify_all()
+
+
+def reserve_ids(n):
+    """Claim n consecutive prediction ids. Returns the (start, end) range."""
     conn = get_connection()
-    features_json = json.dumps(scaled_features) if scaled_features is not None else None
-    conn.execute(
-        'INSERT INTO predictions (timestamp, input_hash, prediction, confidence, scaled_features) VALUES (?, ?, ?, ?, ?)',
-        (datetime.now().isoformat(), input_hash, prediction, confidence, features_json)
-    )
-    conn.commit()
-    conn.close()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        start = conn.execute('SELECT next_id FROM id_blocks WHERE id = 1').fetchone()[0]
+        conn.execute('UPDATE id_blocks SET next_id = ? WHERE id = 1', (start + n,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return start, start + n
 
 
-def get_recent_predictions(n=50):
+def _add_history_indexes(conn):
+    # newest-first walks over one label without a scan, and time range lookups
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_predictions_prediction ON predictions (prediction, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_predictions_actual_label ON predictions (actual_label, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_predictions_timestamp ON predictions (timestamp)')
+
+
+def _add_drift_history(conn):
+    # one row per scheduled drift check and window size. ks_statistics is the
+    # float32 KS statistic of every feature, result the JSON /drift serves
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS drift_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            model_version TEXT,
+            window_size INTEGER NOT NULL,
+            samples_compared INTEGER NOT NULL,
+            drift_detected INTEGER NOT NULL,
+            drift_score REAL NOT NULL,
+            features_drifted INTEGER NOT NULL,
+            result TEXT NOT NULL,
+            ks_statistics BLOB NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_drift_history_window
+        ON drift_history (window_size, model_version, timestamp)
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_drift_history_timestamp ON drift_history (timestamp)')
+    # which process runs a job that only one of the workers should
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires REAL NOT NULL
+        )
+    ''')
+
+
+# events kept in the feed, older ones are trimmed every 1000 inserts. a worker
+# only ever reads the last few seconds of it
+EVENTS_KEPT = 10_000
+
+
+def _add_events(conn):
+    # one row per logged prediction, feedback, drift check or bulk import, written in
+    # the same transaction. origin is the writing process's pid, so each worker can
+    # skip its own events (it already published those in-process, see events.py)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            origin INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            prediction_id INTEGER
+        )
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS events_trim AFTER INSERT ON events
+        WHEN NEW.id % 1000 = 0
+        BEGIN
+            DELETE FROM events WHERE id <= NEW.id - {EVENTS_KEPT};
+        END
+    ''')
+
+
+# feature vectors are stored one table per day (features_YYYYMMDD) rather than in
+# predictions, so archive.py can move a whole day out by dropping its table, which
+# frees its pages outright. the prediction rows themselves all stay in predictions
+FEATURES_TABLE_PREFIX = 'features_'
+_DAY_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+def features_table(timestamp):
+    """The partition for a prediction logged at timestamp (an isoformat string or a date)."""
+    return FEATURES_TABLE_PREFIX + str(timestamp)[:10].replace('-', '')
+
+
+def _create_features_table(conn, table):
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY,
+            model_version TEXT,
+            scaled_features BLOB NOT NULL
+        )
+    ''')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_version ON {table} (model_version, id)')
+
+
+def feature_partitions(conn=None):
+    """Names of the feature partition tables, newest day first."""
+    conn = conn or get_connection()
+    return [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ? ORDER BY name DESC",
+        (FEATURES_TABLE_PREFIX + '[0-9]*',)
+    )]
+
+
+def _partition_features(conn):
+    days = [row[0] for row in conn.execute(
+        'SELECT DISTINCT substr(timestamp, 1, 10) FROM predictions WHERE scaled_features IS NOT NULL'
+    )]
+    moved = 0
+    for day in days:
+        # anything without a date-shaped timestamp goes in the oldest possible partition
+        table = features_table(day if _DAY_RE.match(day) else '0001-01-01')
+        _create_features_table(conn, table)
+        moved += conn.execute(f'''
+            INSERT OR IGNORE INTO {table} (id, model_version, scaled_features)
+            SELECT id, model_version, scaled_features FROM predictions
+            WHERE substr(timestamp, 1, 10) = ? AND scaled_features IS NOT NULL
+        ''', (day,)).rowcount
+    conn.execute('UPDATE predictions SET scaled_features = NULL WHERE scaled_features IS NOT NULL')
+    # get_recent_features reads the partitions now
+    conn.execute('DROP INDEX IF EXISTS idx_predictions_model_version')
+    return moved
+
+
+_ids = IdAllocator(ID_BLOCK_SIZE)
+
+
+def prefetch_ids():
+    """Have this process's first block of prediction ids reserved in the background."""
+    _ids.prefetch()
+
+
+def encode_features(features):
+    """Pack a feature vector into the float32 blob stored in scaled_features."""
+    return np.asarray(features, dtype=np.float32).tobytes()
+
+
+INSERT_SQL = '''
+    INSERT INTO predictions (id, timestamp, input_hash, prediction, confidence, model_version)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+EVENT_SQL = 'INSERT INTO events (origin, kind, prediction_id) VALUES (?, ?, ?)'
+
+
+def insert_rows(conn, rows):
+    """Insert _prediction_row tuples, each feature blob into its day's partition. Doesn't commit."""
+    conn.executemany(INSERT_SQL, [row[:5] + row[6:] for row in rows])
+    origin = os.getpid()
+    conn.executemany(EVENT_SQL, [(origin, 'prediction', row[0]) for row in rows])
+    by_table = {}
+    for row in rows:
+        if row[5] is not None:
+            by_table.setdefault(features_table(row[1]), []).append((row[0], row[6], row[5]))
+    for table, features in by_table.items():
+        # a no-op unless this is the day's first prediction, or a day archive.py
+        # has already dropped. once per batch, so other errors aren't mistaken for it
+        _create_features_table(conn, table)
+        conn.executemany(f'INSERT INTO {table} (id, model_version, scaled_features) VALUES (?, ?, ?)', features)
+
+
+def write_rows(rows):
+    """insert_rows and commit in one transaction, rolled back if any insert fails.
+
+    The connection outlives the call, so a half-done transaction left open
+    would pin the WAL and get committed along with the next batch.
+    """
     conn = get_connection()
-    rows = conn.execute(
-        'SELECT * FROM predictions ORDER BY id DESC LIMIT ?', (n,)
-    ).fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+    with timing.span('db.write'):
+        try:
+            insert_rows(conn, rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def _prediction_row(timestamp, input_hash, prediction, confidence, scaled_features, model_version=None):
+    features_blob = encode_features(scaled_features) if scaled_features is not None else None
+    return (_ids.next_id(), timestamp, input_hash, prediction, confidence, features_blob, model_version)
+
 
+def log_prediction(input_hash, prediction, confidence, scaled_features=None, model_version=None):
+    """Log one prediction and return its id.
 
-def get_metrics():
+    With the write-behind queue on, the row is committed shortly after this
+    returns. If the queue stays full the row is dropped (see PredictionWriter)
+    and None is returned instead, its id will never exist.
+    """
+    row = _prediction_row(
+        datetime.now().isoformat(), input_hash, prediction, confidence, scaled_features, model_version
+    )
+    if _writer is not None:
+        return row[0] if _writer.put(row) else None
+    write_rows([row])
+    return row[0]
+
+
+def log_predictions(entries):
+    """Log several predictions in one transaction and return their ids.
+
+    entries is a list of (input_hash, prediction, confidence, scaled_features) tuples,
+    optionally with the model_version as a fifth item. Rows the write-behind
+    queue had to drop get None in place of an id.
+    """
+    timestamp = datetime.now().isoformat()
+    rows = [_prediction_row(timestamp, *entry) for entry in entries]
+    if _writer is not None:
+        return [row[0] if _writer.put(row) else None for row in rows]
+    write_rows(rows)
+    return [row[0] for row in rows]
+
+
+def import_predictions(chunks, n_rows, model_version=None):
+    """Log n_rows predictions made outside the API.
+
+    chunks yields lists of (input_hash, prediction, confidence) tuples, so a
+    big import can be streamed in. The ids are reserved up front, after any
+    block a worker has reserved, so they're consecutive. The rows then go in
+    IMPORT_COMMIT_ROWS per transaction, which lets the API keep logging during
+    a long import; if one fails, the ones committed before it stay. Rows are
+    timestamped now and carry no feature vectors. Returns the (start, end) id
+    range of the rows imported.
+    """
+    start, end = reserve_ids(n_rows)
     conn = get_connection()
-    row = conn.execute('''
-        SELECT
-            COUNT(*) as total,
-            SUM(CASE WHEN prediction = 'pass' THEN 1 ELSE 0 END) as pass_count,
-            SUM(CASE WHEN prediction = 'fail' THEN 1 ELSE 0 END) as fail_count,
-            AVG(confidence) as avg_confidence
-        FROM predictions
-    ''').fetchone()
+    timestamp = datetime.now().isoformat()
+    rows = itertools.chain.from_iterable(chunks)
+    next_id = start
+    while True:
+        batch = list(itertools.islice(rows, IMPORT_COMMIT_ROWS))
+        if len(batch) > end - next_id:
+            raise ValueError(f"more than the {n_rows} rows reserved to import")
+        last = len(batch) < IMPORT_COMMIT_ROWS
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(INSERT_SQL, [
+                (next_id + i, timestamp, input_hash, prediction, confidence, model_version)
+                for i, (input_hash, prediction, confidence) in enumerate(batch)
+            ])
+            if last:
+                # too many rows to stream one by one, live clients reload instead
+                conn.execute(EVENT_SQL, (os.getpid(), 'resync', None))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        next_id += len(batch)
+        if last:
+            return start, next_id
+
+
+# what the history view needs, everything but the scaled_features blob
+HISTORY_COLUMNS = ('id', 'timestamp', 'input_hash', 'prediction', 'confidence', 'actual_label', 'model_version')
 
-    # predictions in the last hour
-    per_hour = conn.execute('''
-        SELECT COUNT(*) FROM predictions
-        WHERE timestamp > datetime('now', '-1 hour')
-    ''').fetchone()[0]
 
-    conn.close()
+def _history_query(limit, before_id=None, prediction=None, actual_label=None, since=None, until=None):
+    where = []
+    params = []
+    if before_id is not None:
+        where.append('id < ?')
+        params.append(before_id)
+    if prediction is not None:
+        where.append('prediction = ?')
+        params.append(prediction)
+    # 'none' means not labelled yet
+    if actual_label == 'none':
+        where.append('actual_label IS NULL')
+    elif actual_label is not None:
+        where.append('actual_label = ?')
+        params.append(actual_label)
+    # timestamps are local-time isoformat strings, which compare in time order
+    if since is not None:
+        where.append('timestamp >= ?')
+        params.append(since.isoformat())
+    if until is not None:
+        where.append('timestamp < ?')
+        params.append(until.isoformat())
 
-    total = row['total']
+    sql = f"SELECT {', '.join(HISTORY_COLUMNS)} FROM predictions"
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    return sql + ' ORDER BY id DESC LIMIT ?', params + [limit]
+
+
+def get_predictions(limit=50, before_id=None, prediction=None, actual_label=None, since=None, until=None):
+    """Prediction history, newest first, without the feature blobs.
+
+    Paged by id: pass the last id of one page as before_id to get the next, which
+    stays a cheap index walk however deep it goes (unlike OFFSET). prediction and
+    actual_label filter on the label ('none' for unlabelled rows), since and
+    until on the timestamp.
+    """
+    sql, params = _history_query(limit, before_id, prediction, actual_label, since, until)
+    return [dict(row) for row in get_connection().execute(sql, params)]
+
+
+def iter_predictions(page_size=1000, limit=None, before_id=None, **filters):
+    """Yield history rows newest first, one page of page_size at a time.
+
+    Each page is its own keyset query, so an export of the whole table only
+    ever holds one page in memory and no read transaction stays open between
+    pages. Takes the same filters as get_predictions, and stops after limit rows.
+    """
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = page_size if remaining is None else min(page_size, remaining)
+        rows = get_predictions(size, before_id, **filters)
+        yield from rows
+        if len(rows) < size:
+            return
+        before_id = rows[-1]['id']
+        if remaining is not None:
+            remaining -= len(rows)
+
+
+def get_recent_predictions(n=50):
+    return get_predictions(n)
+
+
+def get_metrics(window_minutes=60):
+    """Overall prediction stats plus counts for the last window_minutes.
+
+    Both come from the trigger-maintained totals and per-minute rollups, so this
+    doesn't scan the predictions table. The window is rounded out to whole
+    minutes.
+    """
+    conn = get_connection()
+    row = conn.execute(
+        'SELECT total, pass_count, fail_count, confidence_sum FROM prediction_totals WHERE id = 1'
+    ).fetchone()
+
+    # timestamps are stored as local-time isoformat strings, so compare against the same
+    now = datetime.now()
+    last_hour = _rollup_counts(conn, now - timedelta(hours=1))
+    window = last_hour if window_minutes == 60 else _rollup_counts(conn, now - timedelta(minutes=window_minutes))
+
+    total = row['total'] if row else 0
+    pass_count = row['pass_count'] if row else 0
+    fail_count = row['fail_count'] if row else 0
     return {
         'total_predictions': total,
-        'pass_count': row['pass_count'] or 0,
-        'fail_count': row['fail_count'] or 0,
-        'pass_rate': round((row['pass_count'] or 0) / total, 4) if total > 0 else 0,
-        'fail_rate': round((row['fail_count'] or 0) / total, 4) if total > 0 else 0,
-        'avg_confidence': round(row['avg_confidence'] or 0, 4),
-        'predictions_last_hour': per_hour
+        'pass_count': pass_count,
+        'fail_count': fail_count,
+        'pass_rate': round(pass_count / total, 4) if total > 0 else 0,
+        'fail_rate': round(fail_count / total, 4) if total > 0 else 0,
+        'avg_confidence': round(row['confidence_sum'] / total, 4) if total > 0 else 0,
+        'predictions_last_hour': last_hour['total'],
+        'window': dict(window, minutes=window_minutes)
     }
 
 
-def update_actual_label(prediction_id, actual_label):
-    """Set the ground truth label for a prediction. Returns True if the row existed."""
+def _rollup_counts(conn, since):
+    row = conn.execute('''
+        SELECT COALESCE(SUM(total), 0) AS total,
+            COALESCE(SUM(pass_count), 0) AS pass_count,
+            COALESCE(SUM(fail_count), 0) AS fail_count
+        FROM prediction_rollups WHERE minute >= ?
+    ''', (since.isoformat()[:16],)).fetchone()
+    return dict(row)
+
+
+def update_actual_label(prediction_id, actual_label, wait=1.0):
+    """Set the ground truth label for a prediction. Returns True if the row existed.
+
+    The prediction may still be waiting in a write-behind queue: this process's
+    queue is flushed first, and an id that has been handed out but isn't in the
+    table yet (another worker's queue) is retried for up to wait seconds.
+    """
+    deadline = time.monotonic() + wait
+    if _writer is not None:
+        # a full queue can make this give up early, the retries below still apply
+        _writer.flush(timeout=wait)
     conn = get_connection()
-    cursor = conn.execute(
-        'UPDATE predictions SET actual_label = ? WHERE id = ?',
-        (actual_label, prediction_id)
-    )
-    conn.commit()
-    updated = cursor.rowcount > 0
-    conn.close()
-    return updated
+    while True:
+        try:
+            cursor = conn.execute(
+                'UPDATE predictions SET actual_label = ? WHERE id = ?',
+                (actual_label, prediction_id)
+            )
+            if cursor.rowcount > 0:
+                conn.execute(EVENT_SQL, (os.getpid(), 'feedback', prediction_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if cursor.rowcount > 0:
+            return True
+        if time.monotonic() >= deadline or not _id_reserved(conn, prediction_id):
+            return False
+        time.sleep(0.02)
+
+
+def _id_reserved(conn, prediction_id):
+    row = conn.execute('SELECT next_id FROM id_blocks WHERE id = 1').fetchone()
+    return row is not None and 0 < prediction_id < row[0]
 
 
-def get_recent_features(n=100):
-    """Get scaled feature vectors from the last n predictions for drift detection."""
+def get_recent_features(n=100, model_version=None):
+    """Get scaled feature vectors from the last n predictions for drift detection.
+
+    Returns a float32 array of shape (rows, n_features), newest first. Only the
+    newest daily partitions are read, as many as it takes to find n rows. With
+    model_version only that version's rows are used, since each version scales
+    its inputs differently. Rows with a different width than the newest one (an
+    older model) are left out.
+    """
+    conn = get_connection()
+    if model_version is None:
+        where, params = '', ()
+    else:
+        where, params = 'WHERE model_version = ?', (model_version,)
+    blobs = []
+    with timing.span('features.query'):
+        for table in feature_partitions(conn):
+            try:
+                rows = conn.execute(
+                    f'SELECT scaled_features FROM {table} {where} ORDER BY id DESC LIMIT ?',
+                    params + (n - len(blobs),)
+                ).fetchall()
+            except sqlite3.OperationalError as e:
+                # archived since the list was read
+                if str(e).startswith('no such table'):
+                    continue
+                raise
+            blobs.extend(row[0] for row in rows)
+            if len(blobs) >= n:
+                break
+    if not blobs:
+        return np.empty((0, 0), dtype=np.float32)
+
+    with timing.span('features.decode'):
+        width = len(blobs[0])
+        blobs = [blob for blob in blobs if len(blob) == width]
+        # one copy into a contiguous buffer, then a zero-copy view over it
+        return np.frombuffer(b''.join(blobs), dtype=np.float32).reshape(len(blobs), -1)
+
+
+def acquire_lease(name, holder, seconds):
+    """Take or renew the lease called name for seconds. True if holder has it afterwards.
+
+    Lets one process out of all the workers run a background job. A lease its
+    holder stops renewing expires, and the next process to ask gets it.
+    """
     conn = get_connection()
-    rows = conn.execute(
-        'SELECT scaled_features FROM predictions WHERE scaled_features IS NOT NULL ORDER BY id DESC LIMIT ?',
-        (n,)
-    ).fetchall()
-    conn.close()
-    return [json.loads(row['scaled_features']) for row in rows]
+    now = time.time()
+    try:
+        cursor = conn.execute('''
+            INSERT INTO leases (name, holder, expires) VALUES (?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires = excluded.expires
+            WHERE leases.holder = excluded.holder OR leases.expires < ?
+        ''', (name, holder, now + seconds, now))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return cursor.rowcount > 0
+
+
+def release_lease(name, holder):
+    """Give a lease up early, so another process doesn't have to wait for it to expire."""
+    conn = get_connection()
+    try:
+        conn.execute('DELETE FROM leases WHERE name = ? AND holder = ?', (name, holder))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def log_drift_results(timestamp, model_version, results, keep_days=None):
+    """Store one scheduled drift check: (window_size, result, ks_statistics) per window.
+
+    result is the dict /drift serves, ks_statistics every feature's KS statistic.
+    With keep_days, rows older than that many days are deleted in the same
+    transaction.
+    """
+    conn = get_connection()
+    try:
+        conn.executemany('''
+            INSERT INTO drift_history (timestamp, model_version, window_size, samples_compared, drift_detected,
+                                       drift_score, features_drifted, result, ks_statistics)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (timestamp, model_version, window_size, result['samples_compared'], int(result['drift_detected']),
+             result['drift_score'], result['features_drifted'], json.dumps(result),
+             np.asarray(statistic, dtype=np.float32).tobytes())
+            for window_size, result, statistic in results
+        ])
+        if keep_days:
+            cutoff = (datetime.fromisoformat(timestamp) - timedelta(days=keep_days)).isoformat()
+            conn.execute('DELETE FROM drift_history WHERE timestamp < ?', (cutoff,))
+        conn.execute(EVENT_SQL, (os.getpid(), 'drift', None))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def get_latest_drift(window_size, model_version=None):
+    """The newest stored drift result for a window size and model version, or None."""
+    row = get_connection().execute('''
+        SELECT result FROM drift_history
+        WHERE window_size = ? AND model_version IS ?
+        ORDER BY timestamp DESC LIMIT 1
+    ''', (window_size, model_version)).fetchone()
+    return json.loads(row['result']) if row else None
+
+
+def get_drift_history(window_size, model_version=None, since=None, limit=1000, feature=None):
+    """Stored drift checks for one window size, oldest first, for charting.
+
+    With feature (an index), each point also has that feature's KS statistic.
+    """
+    where, params = 'window_size = ? AND model_version IS ?', [window_size, model_version]
+    if since:
+        where += ' AND timestamp >= ?'
+        params.append(since)
+    rows = get_connection().execute(f'''
+        SELECT timestamp, drift_score, features_drifted, drift_detected, samples_compared, ks_statistics
+        FROM drift_history WHERE {where}
+        ORDER BY timestamp DESC LIMIT ?
+    ''', params + [limit]).fetchall()
+    points = []
+    for row in reversed(rows):
+        point = {
+            'timestamp': row['timestamp'],
+            'drift_score': row['drift_score'],
+            'features_drifted': row['features_drifted'],
+            'drift_detected': bool(row['drift_detected']),
+            'samples_compared': row['samples_compared'],
+        }
+        if feature is not None:
+            statistics = np.frombuffer(row['ks_statistics'], dtype=np.float32)
+            point['ks_statistic'] = round(float(statistics[feature]), 4) if feature < len(statistics) else None
+        points.append(point)
+    return points
+
+
+def latest_event_id():
+    row = get_connection().execute('SELECT MAX(id) FROM events').fetchone()
+    return row[0] or 0
+
+
+def get_events(after_id, exclude_origin=None, limit=500):
+    """Events after after_id, oldest first, as (id, kind, data) tuples.
+
+    data is the prediction as get_predictions returns it for 'prediction',
+    {id, actual_label} for 'feedback', and empty for 'drift' and 'resync'.
+    Events written by exclude_origin (a pid) are skipped.
+    """
+    cols = ', '.join(f'p.{c}' for c in HISTORY_COLUMNS)
+    rows = get_connection().execute(f'''
+        SELECT e.id AS event_id, e.kind, {cols}
+        FROM events e LEFT JOIN predictions p ON p.id = e.prediction_id
+        WHERE e.id > ? AND e.origin IS NOT ?
+        ORDER BY e.id LIMIT ?
+    ''', (after_id, exclude_origin, limit)).fetchall()
+    events = []
+    for row in rows:
+        if row['kind'] == 'prediction':
+            data = {c: row[c] for c in HISTORY_COLUMNS}
+        elif row['kind'] == 'feedback':
+            data = {'id': row['id'], 'actual_label': row['actual_label']}
+        else:
+            data = {}
+        events.append((row['event_id'], row['kind'], data))
+    return events
+
+
+class PredictionWriter:
+    """Write-behind queue that groups prediction inserts into one transaction.
+
+    put() hands a row over and returns straight away. A background thread waits
+    for the first row, collects whatever else arrives within interval_ms (up to
+    max_batch rows) and commits them together, so requests never wait on a
+    commit or fsync.
+
+    The queue holds at most max_queue rows. When the disk falls that far behind,
+    put() waits up to put_timeout_ms for room (backpressure) and then drops the
+    row. Drops are counted in stats() and logged at most every 10 seconds.
+    """
+
+    def __init__(self, interval_ms=5.0, max_batch=500, max_queue=10000, put_timeout_ms=50.0):
+        self.interval = interval_ms / 1000.0
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.put_timeout = put_timeout_ms / 1000.0
+        self._queue = queue.Queue(max_queue)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failed = 0
+        self._dropped_unreported = 0
+        self._last_drop_log = 0.0
+
+    def put(self, row):
+        """Queue one row. Returns False if it had to be dropped."""
+        self._ensure_worker()
+        try:
+            if self.put_timeout > 0:
+                self._queue.put(row, timeout=self.put_timeout)
+            else:
+                self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            self._record_drop()
+            return False
+
+    def put_many(self, rows):
+        """Queue several rows. Returns how many were dropped."""
+        return sum(not self.put(row) for row in rows)
+
+    def flush(self, timeout=None):
+        """Block until every row queued before this call has been committed.
+
+        Returns False if that took longer than timeout, including when the queue
+        stayed too full to take the marker.
+        """
+        if self._thread is None or self._pid != os.getpid():
+            return True
+        done = threading.Event()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        # the marker waits for room like anything else, but only until the deadline
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def _record_drop(self):
+        with self._stats_lock:
+            self.dropped += 1
+            self._dropped_unreported += 1
+            now = time.monotonic()
+            if now - self._last_drop_log < 10:
+                return
+            count = self._dropped_unreported
+            self._dropped_unreported = 0
+            self._last_drop_log = now
+        logger.warning(f"Prediction log queue full, dropped {count} rows")
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'interval_ms': round(self.interval * 1000, 3),
+                'queued': self._queue.qsize(),
+                'max_queue': self.max_queue,
+                'written': self.written,
+                'batches': self.batches,
+                'dropped': self.dropped,
+                'failed': self.failed,
+            }
+
+    def _ensure_worker(self):
+        # threads don't survive a fork, so each worker process starts its own
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(self.max_queue)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='prediction-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(items) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            rows = [item for item in items if not isinstance(item, threading.Event)]
+            if rows:
+                self._write(rows)
+            for item in items:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def _write(self, rows):
+        try:
+            write_rows(rows)
+        except Exception as e:
+            logger.error(f"Failed to write {len(rows)} predictions: {e}")
+            with self._stats_lock:
+                self.failed += len(rows)
+            return
+        with self._stats_lock:
+            self.written += len(rows)
+            self.batches += 1
+
+
+_writer = None
+
+
+def enable_write_behind(interval_ms=5.0):
+    """Route log_prediction through a PredictionWriter, flushed again at exit."""
+    global _writer
+    if _writer is None:
+        _writer = PredictionWriter(interval_ms, max_queue=QUEUE_SIZE, put_timeout_ms=QUEUE_TIMEOUT_MS)
+        atexit.register(flush_writes)
+    return _writer
+
+
+def flush_writes(timeout=10):
+    """Commit anything still sitting in the write-behind queue."""
+    if _writer is not None:
+        _writer.flush(timeout)
+
+
+def writer_stats():
+    return _writer.stats() if _writer is not None else None
 
 
 # create table on import
 init_db()
+if WRITE_BEHIND_MS > 0:
+    enable_write_behind(WRITE_BEHIND_MS)
@@ -1,5 +1,160 @@
+import math
+import threading
+from functools import lru_cache
+
 import numpy as np
-from scipy import stats
+
+# ks_2samp's default method is exact while neither sample is bigger than this
+MAX_EXACT_N = 10000
+
+# asymptotic p-value under which summarize_ks doesn't bother with the exact one
+_REPORT_FLOOR = 1e-10
+
+
+def _kstwo():
+    # scipy.stats takes most of a second to import, so only pay for it on first use
+    from scipy import stats
+    return stats.kstwo
+
+
+def _exact_pvalue(d, n1, n2):
+    """ks_2samp's exact two-sided p-value for statistic d, or None where it falls back to asymp."""
+    # scipy's own routine, so the numbers match ks_2samp's default method exactly
+    from scipy.stats._stats_py import _attempt_exact_2kssamp
+    success, _, prob = _attempt_exact_2kssamp(n1, n2, math.gcd(n1, n2), float(d), 'two-sided')
+    return float(np.clip(prob, 0, 1)) if success else None
+
+
+def _exact_possible(n1, n2):
+    g = math.gcd(n1, n2)
+    return max(n1, n2) <= MAX_EXACT_N and n1 // g < np.iinfo(np.int32).max / (n2 // g)
+
+
+def ks_pvalues(statistic, n1, n2, floor=0.0):
+    """Two-sided p-values for KS statistics of an n1 and an n2 sample, as ks_2samp's default gives them.
+
+    That's the exact distribution while both samples have at most MAX_EXACT_N
+    rows, and the asymptotic one beyond (or wherever the exact sum overflows).
+
+    The exact sum gets slow for big statistics (a third of a second each at
+    10000 rows). With a floor, features whose asymptotic p-value is under it
+    keep that one instead, for callers that round the result anyway.
+    """
+    statistic = np.asarray(statistic, dtype=np.float64)
+    p_values = np.clip(_kstwo().sf(statistic, _effective_n(n1, n2)), 0, 1)
+    if _exact_possible(n1, n2):
+        for i, d in enumerate(statistic):
+            if p_values[i] < floor:
+                continue
+            exact = _exact_pvalue(d, n1, n2)
+            if exact is not None:
+                p_values[i] = exact
+    return p_values
+
+
+# cap on (n_features_in_block * samples) per pass, keeps temporaries around 32 MB
+_BLOCK_ELEMENTS = 4_000_000
+
+
+def _sort_keys(values):
+    """Map an (n_features, n_samples) float array to uint64 keys of the same shape.
+
+    The low 32 bits are the float32 bit pattern, flipped so unsigned order matches
+    float order. The high bits hold the feature index. With every feature's keys
+    sorted and laid end to end, a single searchsorted looks values up in all
+    features at once.
+    """
+    # adding 0 folds -0.0 into 0.0 so they compare equal like they do as floats
+    x = np.ascontiguousarray(values, dtype=np.float32) + np.float32(0)
+    bits = x.view(np.uint32)
+    flipped = np.where(bits & np.uint32(0x80000000), ~bits, bits | np.uint32(0x80000000))
+    feature_idx = np.arange(x.shape[0], dtype=np.uint64)[:, None] << np.uint64(32)
+    return (flipped.astype(np.uint64) | feature_idx).ravel()
+
+
+def _run_ends(sorted_keys):
+    """True where the next key differs, i.e. where the ECDF actually steps up."""
+    ends = np.empty(sorted_keys.shape, dtype=bool)
+    ends[:-1] = sorted_keys[:-1] != sorted_keys[1:]
+    ends[-1] = True
+    return ends
+
+
+class KSBaseline:
+    """Training features sorted once per feature, for batched two-sample KS tests.
+
+    Holds a float32 (n_features, n_samples) array with each row sorted, so each
+    feature's values are contiguous. train.py saves it next to the model and the
+    API memory-maps it, which lets every worker share one copy through the page
+    cache. Each ks_test call sorts the new window and runs two searchsorted
+    passes against the baseline per block of features, instead of one scipy call
+    per column.
+    """
+
+    def __init__(self, sorted_features):
+        self.sorted = sorted_features
+        self.n_features, self.n_samples = sorted_features.shape
+
+    @classmethod
+    def from_features(cls, train_features):
+        """Build from a raw (n_samples, n_features) training matrix."""
+        return cls(np.sort(np.asarray(train_features, dtype=np.float32).T, axis=1))
+
+    @classmethod
+    def load(cls, path):
+        """Memory-map a baseline written by save(). Nothing is read until it's used."""
+        return cls(np.load(path, mmap_mode='r'))
+
+    def save(self, path):
+        np.save(path, np.ascontiguousarray(self.sorted, dtype=np.float32))
+
+    def ks_test(self, new_features):
+        """KS statistic and p-value for every feature.
+
+        Statistics and p-values are the same as scipy.stats.ks_2samp's defaults
+        (on float32 data): exact p-values up to MAX_EXACT_N rows per sample,
+        asymptotic ones beyond. Returns two float64 arrays of length n_features.
+
+        The exact p-values cost up to tens of ms each, so detect_drift skips
+        this and only computes them for the features it reports.
+        """
+        statistic = self.ks_statistic(new_features)
+        return statistic, ks_pvalues(statistic, self.n_samples, new_features.shape[0])
+
+    def ks_statistic(self, new_features):
+        """Two-sample KS statistic for every feature against the baseline."""
+        m = new_features.shape[0]
+        n = self.n_samples
+        new_sorted = np.sort(np.asarray(new_features, dtype=np.float32).T, axis=1)
+
+        statistic = np.empty(self.n_features)
+        block = max(1, _BLOCK_ELEMENTS // (n + m))
+        for start in range(0, self.n_features, block):
+            stop = min(start + block, self.n_features)
+            statistic[start:stop] = self._block_statistic(new_sorted[start:stop], start, stop)
+        return statistic
+
+    def _block_statistic(self, new_sorted, start, stop):
+        n = self.n_samples
+        m = new_sorted.shape[1]
+        train_keys = _sort_keys(self.sorted[start:stop])
+        new_keys = _sort_keys(new_sorted)
+        features = np.arange(stop - start)[:, None]
+
+        # the ECDFs only step at sample points, so the max gap is at one of them.
+        # evaluate both ECDFs at the last copy of each new value...
+        train_cdf = (np.searchsorted(train_keys, new_keys, side='right').reshape(-1, m) - features * n) / n
+        new_cdf = np.arange(1, m + 1) / m
+        new_steps = _run_ends(new_keys).reshape(-1, m)
+        gap_new = np.where(new_steps, np.abs(new_cdf - train_cdf), 0).max(axis=1)
+
+        # ...and at the last copy of each training value
+        new_cdf = (np.searchsorted(new_keys, train_keys, side='right').reshape(-1, n) - features * m) / m
+        train_cdf = np.arange(1, n + 1) / n
+        train_steps = _run_ends(train_keys).reshape(-1, n)
+        gap_train = np.where(train_steps, np.abs(train_cdf - new_cdf), 0).max(axis=1)
+
+        return np.maximum(gap_new, gap_train)
 
 
 def detect_drift(new_features, train_features, threshold=0.05, drift_pct_threshold=0.2):
@@ -10,32 +165,243 @@ def detect_drift(new_features, train_features, threshold=0.05, drift_pct_thresho
 
     Args:
         new_features: numpy array of shape (n_samples, n_features) from recent predictions
-        train_features: numpy array of training data to compare against
+        train_features: KSBaseline, or a numpy array of training data to compare against
         threshold: p-value below which a feature is considered drifted
         drift_pct_threshold: fraction of features that need to drift to flag overall drift
 
     Returns dict with drift results.
     """
-    n_features = new_features.shape[1]
-    drifted_features = []
-
-    for i in range(n_features):
-        stat, p_value = stats.ks_2samp(train_features[:, i], new_features[:, i])
-        if p_value < threshold:
-            drifted_features.append({
-                'feature_index': i,
-                'ks_statistic': round(stat, 4),
-                'p_value': round(p_value, 6)
-            })
-
-    drift_score = len(drifted_features) / n_features
+    if isinstance(train_features, KSBaseline):
+        baseline = train_features
+    else:
+        baseline = KSBaseline.from_features(train_features)
+    statistic = baseline.ks_statistic(new_features)
+    return summarize_ks(statistic, baseline.n_samples, new_features.shape[0], threshold, drift_pct_threshold)
+
+
+def summarize_ks(statistic, n_train, n_new, threshold=0.05, drift_pct_threshold=0.2):
+    """detect_drift's result from per-feature KS statistics that were already computed."""
+    # reported p-values are rounded to 6 places. from 100 rows per sample up the
+    # exact one is within ~100x of the asymptotic one out in the tail, so under
+    # 1e-10 both round to 0 and the exact sum can be skipped
+    floor = _REPORT_FLOOR if min(n_train, n_new) >= 100 else 0.0
+    return _summarize(statistic, critical_value(threshold, n_train, n_new),
+                      lambda worst: ks_pvalues(worst, n_train, n_new, floor), drift_pct_threshold)
+
+
+def _effective_n(n1, n2):
+    # same formula ks_2samp uses in asymp mode
+    return round(n1 * n2 / (n1 + n2))
+
+
+@lru_cache(maxsize=1024)
+def asymp_critical_value(threshold, en):
+    """KS statistic above which the asymptotic p-value is below threshold."""
+    return float(_kstwo().isf(threshold, en))
+
+
+@lru_cache(maxsize=1024)
+def critical_value(threshold, n1, n2):
+    """KS statistic above which ks_pvalues is below threshold.
+
+    An n1 and an n2 sample only give statistics h / lcm(n1, n2), and the exact
+    p-value only goes down as h goes up, so this bisects for the first h under
+    the threshold and returns the point halfway below it. About a dozen exact
+    p-values, once per sample sizes.
+    """
+    if not _exact_possible(n1, n2):
+        return asymp_critical_value(threshold, _effective_n(n1, n2))
+    lcm = n1 * n2 // math.gcd(n1, n2)
+
+    def below(h):
+        return ks_pvalues([h / lcm], n1, n2)[0] < threshold
+
+    if not below(lcm):
+        return 1.0
+    # the asymptotic critical value is a few lattice points off at most, so
+    # gallop out from there for a bracket before bisecting
+    start = min(max(math.ceil(asymp_critical_value(threshold, _effective_n(n1, n2)) * lcm), 1), lcm)
+    step = 1
+    if below(start):
+        lo, hi = start - 1, start
+        while lo > 0 and below(lo):
+            hi, lo = lo, max(lo - step, 0)
+            step *= 2
+    else:
+        lo, hi = start, start + 1
+        while hi < lcm and not below(hi):
+            lo, hi = hi, min(hi + step, lcm)
+            step *= 2
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if below(mid):
+            hi = mid
+        else:
+            lo = mid
+    return (hi - 0.5) / lcm
+
+
+def _summarize(statistic, critical, p_values_of, drift_pct_threshold):
+    """Build the drift result dict from per-feature KS statistics.
+
+    The p-value only goes down as the statistic goes up, so comparing against
+    one critical value gives the same drifted set as computing every p-value,
+    and the worst offenders are the largest statistics. Only those get a p-value,
+    from p_values_of(their statistics).
+    """
+    n_features = len(statistic)
+    drifted = np.flatnonzero(statistic > critical)
+    # only return top 10 worst offenders, sorted by p-value
+    worst = drifted[np.argsort(-statistic[drifted], kind='stable')][:10]
+    p_values = p_values_of(statistic[worst])
+    drifted_features = [
+        {
+            'feature_index': int(i),
+            'ks_statistic': round(float(statistic[i]), 4),
+            'p_value': round(float(p), 6)
+        }
+        for i, p in zip(worst, p_values)
+    ]
+
+    drift_score = len(drifted) / n_features
     drift_detected = drift_score > drift_pct_threshold
 
     return {
         'drift_detected': drift_detected,
         'drift_score': round(drift_score, 4),
         'features_tested': n_features,
-        'features_drifted': len(drifted_features),
-        # only return top 10 worst offenders, sorted by p-value
-        'drifted_features': sorted(drifted_features, key=lambda x: x['p_value'])[:10]
+        'features_drifted': len(drifted),
+        'drifted_features': drifted_features
     }
+
+
+class StreamingDriftMonitor:
+    """Rolling-window drift state that gets updated one prediction at a time.
+
+    Each feature is cut into n_bins bins at the training quantiles. The monitor
+    keeps the bin of every vector in the window in a ring buffer, plus per-feature
+    bin counts, so adding a vector and dropping the oldest one is O(features).
+    The KS statistic is then read off the binned CDFs at the bin edges, which
+    makes result() cost the same no matter how big the window is. Being
+    evaluated only at the edges, it is a slight underestimate of the exact KS
+    statistic.
+
+    Every check_every updates the drift score is recomputed, and the alert
+    callbacks are called once when it first crosses drift_pct_threshold. They
+    fire again only after the score has dropped back under it.
+    """
+
+    def __init__(self, baseline, window=10000, n_bins=32, threshold=0.05,
+                 drift_pct_threshold=0.2, check_every=10, min_samples=10):
+        if n_bins > 256:
+            raise ValueError('n_bins must fit in a uint8')
+        if not isinstance(baseline, KSBaseline):
+            baseline = KSBaseline.from_features(baseline)
+        self.n_train = baseline.n_samples
+        self.n_features = baseline.n_features
+        self.window = window
+        self.n_bins = n_bins
+        self.threshold = threshold
+        self.drift_pct_threshold = drift_pct_threshold
+        self.check_every = check_every
+        self.min_samples = min_samples
+
+        # interior bin edges at the training quantiles, shape (n_features, n_bins - 1).
+        # the baseline is already sorted, so these are plain lookups (np.quantile's
+        # linear interpolation) that only touch a few pages of a memory-mapped file
+        position = np.linspace(0, 1, n_bins + 1)[1:-1] * (self.n_train - 1)
+        lo = np.floor(position).astype(int)
+        hi = np.minimum(lo + 1, self.n_train - 1)
+        frac = (position - lo).astype(np.float32)
+        lower = np.asarray(baseline.sorted[:, lo], dtype=np.float32)
+        upper = np.asarray(baseline.sorted[:, hi], dtype=np.float32)
+        self.edges = np.ascontiguousarray(lower + (upper - lower) * frac)
+        # training ECDF at each edge
+        self.train_cdf = np.stack([
+            np.searchsorted(baseline.sorted[j], self.edges[j], side='right')
+            for j in range(self.n_features)
+        ]) / self.n_train
+
+        self._features = np.arange(self.n_features)
+        self._bins = np.zeros((window, self.n_features), dtype=np.uint8)
+        self._counts = np.zeros((self.n_features, n_bins), dtype=np.int64)
+        self._pos = 0
+        self.size = 0
+        self.updates = 0
+        self._alerting = False
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def on_alert(self, callback):
+        """Register callback(info) to run when the drift score crosses the threshold."""
+        self._callbacks.append(callback)
+
+    def update(self, rows):
+        """Add one scaled vector, or an (n, n_features) array of them, oldest first."""
+        rows = np.asarray(rows, dtype=np.float32).reshape(-1, self.n_features)[-self.window:]
+        # number of edges below the value = which bin it lands in
+        bins = (rows[:, :, None] > self.edges).sum(axis=2).astype(np.uint8)
+
+        with self._lock:
+            for row_bins in bins:
+                if self.size == self.window:
+                    self._counts[self._features, self._bins[self._pos]] -= 1
+                else:
+                    self.size += 1
+                self._bins[self._pos] = row_bins
+                self._counts[self._features, row_bins] += 1
+                self._pos = (self._pos + 1) % self.window
+
+            due = self.updates // self.check_every != (self.updates + len(bins)) // self.check_every
+            self.updates += len(bins)
+            alert = self._check() if due else None
+
+        if alert:
+            for callback in self._callbacks:
+                callback(alert)
+
+    def _statistic(self):
+        window_cdf = np.cumsum(self._counts, axis=1)[:, :-1] / self.size
+        return np.abs(window_cdf - self.train_cdf).max(axis=1)
+
+    def _en(self):
+        return _effective_n(self.n_train, self.size)
+
+    def _check(self):
+        """Update the alert state. Returns alert info if the threshold was just crossed."""
+        if self.size < self.min_samples:
+            return None
+        # the binned statistic is approximate anyway, so this uses the asymptotic
+        # distribution. en changes on every check while the window fills, and each new
+        # one costs a slow kstwo.isf call on the request path. two significant digits
+        # keep the cache warm and move the critical value by well under a percent
+        en = self._en()
+        critical = asymp_critical_value(self.threshold, round(en, -max(0, len(str(en)) - 2)))
+        drifted = int((self._statistic() > critical).sum())
+        drift_score = drifted / self.n_features
+
+        detected = drift_score > self.drift_pct_threshold
+        crossed = detected and not self._alerting
+        self._alerting = detected
+        if not crossed:
+            return None
+        return {
+            'drift_score': round(drift_score, 4),
+            'features_drifted': drifted,
+            'samples_compared': self.size
+        }
+
+    def result(self):
+        """Drift result over the current window, same shape as detect_drift's."""
+        with self._lock:
+            if self.size < self.min_samples:
+                return None
+            statistic = self._statistic()
+            en = self._en()
+            size = self.size
+
+        result = _summarize(statistic, asymp_critical_value(self.threshold, en),
+                            lambda worst: np.clip(_kstwo().sf(worst, en), 0, 1), self.drift_pct_threshold)
+        result['samples_compared'] = size
+        result['window'] = self.window
+        return result
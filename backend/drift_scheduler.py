@@ -0,0 +1,138 @@
+"""Drift checks on a timer, so GET /drift serves a stored result instead of running a KS test per viewer.
+
+Every worker process runs a DriftScheduler thread, but only the one holding
+the 'drift' lease in predictions.db does the work. Each interval it reads the
+newest max(windows) feature vectors of the served model version once,
+KS-tests the newest n of them for every window size n, and stores the results
+in drift_history. The holder renews the lease on every run. When it dies the
+lease lapses after a few intervals and another worker carries on.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+
+import database
+import timing
+from drift import summarize_ks
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = 'drift'
+# missed runs after which another worker may take the lease over
+LEASE_INTERVALS = 3
+# fewer recent predictions than this and a window isn't tested, same as /drift
+MIN_SAMPLES = 10
+
+
+class DriftScheduler:
+    """Background drift checks for one worker process.
+
+    get_target returns (model_version, KSBaseline) for the model being served,
+    or None while there's nothing to compare against. on_results, if given, is
+    called with the results of every run that stored some. interval 0 disables
+    the thread, run_once can still be called directly.
+    """
+
+    def __init__(self, get_target, interval=60.0, windows=(100, 1000, 10000), keep_days=7, on_results=None):
+        self.get_target = get_target
+        self.on_results = on_results
+        self.interval = interval
+        self.windows = tuple(sorted(windows))
+        self.keep_days = keep_days
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.failed = 0
+        self.last_run = None
+        self.last_seconds = None
+
+    @property
+    def holder(self):
+        # who the lease belongs to, a forked worker is someone else than its master
+        return f'{socket.gethostname()}:{os.getpid()}'
+
+    def start(self):
+        """Start this process's thread if it isn't running yet."""
+        if self.interval <= 0:
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._stop = threading.Event()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='drift-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the thread and hand the lease on, if this process has it."""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=5)
+            database.release_lease(LEASE_NAME, self.holder)
+
+    def fresh(self, result):
+        """Whether a stored result is recent enough to serve in place of a live check."""
+        if self.interval <= 0 or result is None:
+            return False
+        age = (datetime.now() - datetime.fromisoformat(result['timestamp'])).total_seconds()
+        return age <= self.interval * LEASE_INTERVALS
+
+    def run_once(self):
+        """One check of every window. Returns the stored results, or None if another process holds the lease."""
+        if not database.acquire_lease(LEASE_NAME, self.holder, self.interval * LEASE_INTERVALS):
+            return None
+        target = self.get_target()
+        if target is None:
+            return []
+        version, baseline = target
+
+        with timing.span('drift_job.fetch'):
+            recent = database.get_recent_features(self.windows[-1], version)
+        timestamp = datetime.now().isoformat()
+        results = []
+        statistic = None
+        with timing.span('drift_job.ks_test'):
+            for n in self.windows:
+                sample = recent[:n]
+                if len(sample) < MIN_SAMPLES or sample.shape[1] != baseline.n_features:
+                    continue
+                # a bigger window than there are rows tests the same rows again
+                if statistic is None or len(sample) != results[-1][1]['samples_compared']:
+                    statistic = baseline.ks_statistic(sample)
+                result = summarize_ks(statistic, baseline.n_samples, len(sample))
+                result.update(samples_compared=len(sample), model_version=version, timestamp=timestamp)
+                results.append((n, result, statistic))
+        stored = [result for _, result, _ in results]
+        if results:
+            database.log_drift_results(timestamp, version, results, self.keep_days)
+            if self.on_results is not None:
+                self.on_results(stored)
+        return stored
+
+    def stats(self):
+        return {
+            'interval': self.interval,
+            'windows': list(self.windows),
+            'runs': self.runs,
+            'failed': self.failed,
+            'last_run': self.last_run,
+            'last_seconds': self.last_seconds,
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            try:
+                if self.run_once() is not None:
+                    self.runs += 1
+                    self.last_run = datetime.now().isoformat()
+                    self.last_seconds = round(time.perf_counter() - start, 3)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Scheduled drift check failed: {e}")
+            self._stop.wait(max(0.0, self.interval - (time.perf_counter() - start)))
@@ -0,0 +1,141 @@
+"""In-process fan-out of live predictions, feedback and drift checks for GET /events.
+
+predict() and feedback() publish what they just did to their worker's bus.
+Every connected client has its own bounded queue on it, so publishing never
+waits for a client. A client that falls behind has its backlog dropped and
+gets a 'resync' event telling it to reload.
+
+The other workers' events (and score.py imports, and the drift scheduler's
+checks) come in through the events table. database.py adds a row there in
+the same transaction as each write, and one poller thread per worker reads
+the rows other processes added, only while a client is connected.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+
+import database
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One client's queue of (kind, data) events."""
+
+    def __init__(self, maxsize):
+        self._queue = queue.Queue(maxsize)
+        self._overflowed = False
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self._overflowed = True
+
+    def get(self, timeout):
+        """Every event waiting, after blocking up to timeout for the first. [] if none came."""
+        try:
+            events = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if self._overflowed:
+            # what's queued now has gaps before it, the client reloads everything instead
+            self._overflowed = False
+            return [('resync', {})]
+        return events
+
+
+class EventBus:
+    """Fans events out to the clients connected to this worker.
+
+    At most max_clients subscribe at a time: each open stream holds a
+    server thread, and the rest have to stay free for requests.
+    """
+
+    def __init__(self, poll_interval=0.25, queue_size=1000, max_clients=16, poll_limit=500):
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.max_clients = max_clients
+        self.poll_limit = poll_limit
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._last_id = 0
+        self.published = 0
+        self.relayed = 0
+        self.rejected = 0
+
+    def subscribe(self):
+        """A new Subscription, or None when max_clients are already connected."""
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                self.rejected += 1
+                return None
+            subscription = Subscription(self.queue_size)
+            self._subscribers.append(subscription)
+            self._ensure_poller()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def publish(self, kind, data):
+        """Hand an event to every client. Returns straight away whatever the clients are doing."""
+        subscribers = self._subscribers
+        if not subscribers:
+            return
+        for subscription in list(subscribers):
+            subscription.put((kind, data))
+        self.published += 1
+
+    def stats(self):
+        return {
+            'clients': len(self._subscribers),
+            'max_clients': self.max_clients,
+            'published': self.published,
+            'relayed': self.relayed,
+            'rejected': self.rejected,
+        }
+
+    def _ensure_poller(self):
+        # called with the lock held. threads don't survive a fork, and the poller
+        # stops when the last client goes, so this starts one as needed
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._last_id = database.latest_event_id()
+        self._thread = threading.Thread(target=self._poll, name='event-poller', daemon=True)
+        self._thread.start()
+
+    def _poll(self):
+        pid = os.getpid()
+        while True:
+            with self._lock:
+                if not self._subscribers or self._pid != pid:
+                    self._thread = None
+                    return
+            try:
+                events = database.get_events(self._last_id, exclude_origin=pid, limit=self.poll_limit)
+            except Exception as e:
+                logger.error(f"Could not read the events feed: {e}")
+                events = []
+            if len(events) == self.poll_limit:
+                # a burst bigger than clients could use, skip it and have them reload
+                self._last_id = database.latest_event_id()
+                self.publish('resync', {})
+            else:
+                for event_id, kind, data in events:
+                    self.publish(kind, data)
+                    self._last_id = event_id
+                self.relayed += len(events)
+            time.sleep(self.poll_interval)
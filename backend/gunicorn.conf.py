@@ -0,0 +1,47 @@
+import os
+
+bind = '0.0.0.0:5050'
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+# threads let concurrent /predict calls in a worker share micro-batches
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# math library threads per worker: the cores split between the workers, so they
+# don't oversubscribe the CPU. set before the app (and numpy, torch) is imported
+cpu_threads = str(max(1, (os.cpu_count() or 1) // workers))
+for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'SEMIGUARD_TORCH_THREADS'):
+    os.environ.setdefault(var, cpu_threads)
+
+# an open /events stream holds one of a worker's threads for as long as it's
+# connected, so they may take half of them and requests keep the rest
+os.environ.setdefault('SEMIGUARD_EVENTS_MAX_CLIENTS', str(max(1, threads // 2)))
+
+# import the app (and load the model) once in the master, then fork the workers,
+# so they share its memory copy-on-write instead of each loading their own
+preload_app = True
+
+
+def when_ready(server):
+    # with preload_app the master has already imported app by now
+    import app
+    app.warm_up()
+    server.log.info("Model and drift baseline preloaded, forking workers")
+
+
+def post_fork(server, worker):
+    # the thread cap is per process, apply it again in the worker itself
+    import app
+    from inference import set_threads
+    set_threads(app.TORCH_THREADS)
+    # id blocks are per process, reserve the first one before a request needs it
+    import database
+    database.prefetch_ids()
+    # every worker runs the thread, the lease picks which one does the checks
+    app.drift_scheduler.start()
+
+
+def worker_exit(server, worker):
+    # commit the predictions still in this worker's write-behind queue before it goes
+    import app
+    import database
+    app.drift_scheduler.stop()
+    database.flush_writes()
@@ -0,0 +1,188 @@
+import sys
+
+import numpy as np
+
+import timing
+
+# how the torch engine runs DefectClassifier. 'script' is a frozen TorchScript
+# graph of the float32 network, 'int8' the same with the Linear weights quantized
+# to int8 (activations are quantized per batch as they come)
+TORCH_MODES = ('eager', 'script', 'int8')
+
+
+class ArrayScaler:
+    """StandardScaler.transform from plain mean/scale arrays.
+
+    Loading it from an .npz skips unpickling, which would import sklearn.
+    """
+
+    def __init__(self, mean, scale):
+        self.mean = mean
+        self.scale = scale
+
+    @classmethod
+    def from_sklearn(cls, scaler):
+        return cls(np.asarray(scaler.mean_, dtype=np.float64), np.asarray(scaler.scale_, dtype=np.float64))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data['mean'], data['scale'])
+
+    def save(self, path):
+        np.savez(path, mean=self.mean, scale=self.scale)
+
+    def transform(self, features):
+        return (np.asarray(features, dtype=np.float64) - self.mean) / self.scale
+
+
+class TorchClassifier:
+    """The trained DefectClassifier plus its scaler, as saved by train.py.
+
+    The scaler is an ArrayScaler when loaded from scaler.npz, or the pickled
+    sklearn StandardScaler from older scaler.pkl files.
+    """
+
+    name = 'torch'
+
+    def __init__(self, model, scaler, mode='eager'):
+        self.model = model
+        self.scaler = scaler
+        self.mode = mode
+
+    @classmethod
+    def load(cls, model_path, scaler_path, n_features, mode='eager'):
+        # torch only gets imported when this engine is actually used
+        import torch
+        from model import DefectClassifier
+
+        model = DefectClassifier(n_features)
+        model.load_state_dict(torch.load(model_path, weights_only=True))
+        model.eval()
+        model = optimize_model(model, mode, n_features)
+
+        if scaler_path.endswith('.npz'):
+            scaler = ArrayScaler.load(scaler_path)
+        else:
+            import joblib
+            scaler = joblib.load(scaler_path)
+        return cls(model, scaler, mode)
+
+    def predict_proba(self, features):
+        """Fail probability for each row of a raw (n, n_features) array."""
+        return self.score(features)[1]
+
+    def score(self, features):
+        """Scale an (n, n_features) array and run it through the model in one pass.
+
+        Returns the scaled array and the fail probability for each row.
+        """
+        import torch
+
+        with timing.span('model.scale'):
+            scaled = self.scaler.transform(features)
+        with timing.span('model.forward'), torch.no_grad():
+            output = self.model(torch.FloatTensor(scaled)).squeeze(1)
+            confidences = torch.sigmoid(output).numpy()
+        return scaled, confidences
+
+
+class NumpyClassifier:
+    """DefectClassifier's forward pass in plain numpy, with the scaler folded in.
+
+    The first layer's weights already include the StandardScaler, so it takes raw
+    sensor values. That layer is kept in float64: folding the mean into the bias
+    means large raw values cancel against it, and float32 loses too much there.
+    The rest of the network is float32.
+    """
+
+    name = 'numpy'
+    mode = None
+
+    def __init__(self, weights, biases, mean, scale):
+        self.weights = weights
+        self.biases = biases
+        self.mean = mean
+        self.scale = scale
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        n_layers = int(data['n_layers'])
+        return cls(
+            [data[f'w{i}'] for i in range(n_layers)],
+            [data[f'b{i}'] for i in range(n_layers)],
+            data['mean'],
+            data['scale']
+        )
+
+    def predict_proba(self, features):
+        """Fail probability for each row of a raw (n, n_features) array."""
+        h = np.asarray(features, dtype=np.float64) @ self.weights[0] + self.biases[0]
+        h = h.astype(np.float32)
+        for w, b in zip(self.weights[1:], self.biases[1:]):
+            np.maximum(h, 0, out=h)
+            h = h @ w + b
+        # tanh form of the sigmoid, doesn't overflow for big logits
+        return 0.5 * (1.0 + np.tanh(0.5 * h[:, 0].astype(np.float64)))
+
+    def score(self, features):
+        """Same contract as TorchClassifier.score: (scaled rows, fail probabilities)."""
+        features = np.asarray(features, dtype=np.float64)
+        with timing.span('model.scale'):
+            scaled = (features - self.mean) / self.scale
+        with timing.span('model.forward'):
+            return scaled, self.predict_proba(features)
+
+
+def optimize_model(model, mode, n_features):
+    """An eval-mode DefectClassifier prepared for CPU inference in one of TORCH_MODES.
+
+    Both optimized modes trace the network and freeze the trace, which drops the
+    dropout layers and the per-module Python calls. On its own, dynamic int8 is
+    slower than eager for small batches, frozen it's the fastest of the three.
+    """
+    import torch
+
+    if mode not in TORCH_MODES:
+        raise ValueError(f"torch mode must be one of {', '.join(TORCH_MODES)}, got {mode!r}")
+    if mode == 'eager':
+        return model
+    if mode == 'int8':
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, torch.zeros(1, n_features))
+    return torch.jit.freeze(traced.eval())
+
+
+def set_threads(n):
+    """Cap torch's intra-op threads for this process, if torch is in use. 0 leaves the default."""
+    # the numpy engine never imports torch, and this shouldn't either
+    if n > 0 and 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(n)
+
+
+def export_numpy(linear_layers, mean, scale, path):
+    """Fold the scaler into the first layer and save the network for NumpyClassifier.
+
+    linear_layers is a list of (weight, bias) numpy arrays in forward order, with
+    torch's (out_features, in_features) weight layout. mean and scale are the
+    fitted StandardScaler's mean_ and scale_.
+    """
+    mean = np.asarray(mean, dtype=np.float64)
+    scale = np.asarray(scale, dtype=np.float64)
+
+    arrays = {'n_layers': len(linear_layers), 'mean': mean, 'scale': scale}
+    for i, (weight, bias) in enumerate(linear_layers):
+        weight = np.asarray(weight, dtype=np.float64)
+        bias = np.asarray(bias, dtype=np.float64)
+        if i == 0:
+            # W @ ((x - mean) / scale) + b  ==  (W / scale) @ x + (b - W @ (mean / scale))
+            bias = bias - weight @ (mean / scale)
+            weight = weight / scale
+            arrays['w0'] = weight.T.copy()
+            arrays['b0'] = bias
+        else:
+            arrays[f'w{i}'] = weight.T.astype(np.float32)
+            arrays[f'b{i}'] = bias.astype(np.float32)
+    np.savez(path, **arrays)
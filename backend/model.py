@@ -3,15 +3,15 @@ import torch.nn as nn
 
 
 class DefectClassifier(nn.Module):
-    def __init__(self, n_features):
+    def __init__(self, n_features, dropout=0.3):
         super().__init__()
         self.network = nn.Sequential(
             nn.Linear(n_features, 128),
             nn.ReLU(),
-            nn.Dropout(0.3),
+            nn.Dropout(dropout),
             nn.Linear(128, 64),
             nn.ReLU(),
-            nn.Dropout(0.3),
+            nn.Dropout(dropout),
             nn.Linear(64, 1)
         )
 
@@ -1,9 +1,13 @@
+import numpy as np
 import pandas as pd
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 import joblib
+import json
 import os
 
+from inference import ArrayScaler
+
 
 def load_and_clean(filepath):
     """Load SECOM CSV, drop junk columns, impute missing values."""
@@ -27,6 +31,43 @@ def load_and_clean(filepath):
     return df
 
 
+def build_sample_pool(df, path=None):
+    """Unscaled feature rows of the cleaned dataset, for the API's /sample endpoint.
+
+    Any NaN left after the median fill (all-missing columns) becomes 0.
+    Saved as .npy if path is provided.
+    """
+    pool = df.drop(columns=['Pass/Fail']).fillna(0).to_numpy(dtype=np.float64)
+    if path:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.save(path, pool)
+        print(f"Sample pool saved to {path}")
+    return pool
+
+
+def cleaning_params(df):
+    """The columns load_and_clean kept, in order, and the medians their gaps were filled with.
+
+    Taken from the cleaned frame: filling gaps with a column's median leaves
+    its median where it was.
+    """
+    columns = [c for c in df.columns if c != 'Pass/Fail']
+    return columns, df[columns].median().to_numpy(dtype=np.float64)
+
+
+def save_columns(path, columns, fill_values):
+    with open(path, 'w') as f:
+        json.dump({'columns': [str(c) for c in columns], 'fill_values': [float(v) for v in fill_values]}, f)
+    print(f"Feature columns saved to {path}")
+
+
+def load_columns(path):
+    """(columns, fill_values) as written by save_columns."""
+    with open(path) as f:
+        data = json.load(f)
+    return data['columns'], np.asarray(data['fill_values'], dtype=np.float64)
+
+
 def prepare_features(df, scaler_path=None):
     """Split into X/y, convert labels to 0/1, scale features.
 
@@ -50,6 +91,142 @@ def prepare_features(df, scaler_path=None):
     return X, y, scaler
 
 
+# rows per chunk for the streaming pipeline. at SECOM's width a float32 chunk is ~24 MB
+CHUNK_ROWS = 10_000
+# rows kept in the reservoir sample used for medians and the /sample pool
+SAMPLE_ROWS = 10_000
+
+
+def _merge_moments(n_a, mean_a, m2_a, n_b, mean_b, m2_b):
+    """Combine per-column (count, mean, sum of squared deviations) of two blocks."""
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    frac = np.divide(n_b, n, out=np.zeros_like(mean_a), where=n > 0)
+    mean = mean_a + delta * frac
+    m2 = m2_a + m2_b + delta ** 2 * n_a * frac
+    return n, mean, m2
+
+
+def scan_csv(filepath, chunksize=CHUNK_ROWS, sample_size=SAMPLE_ROWS, seed=0):
+    """First streaming pass: per-column statistics without loading the whole file.
+
+    Reads the CSV chunkwise as float32 and keeps, per feature column, the
+    non-missing count, mean and sum of squared deviations (merged chunk by chunk
+    in float64), plus a uniform reservoir sample of sample_size rows. Medians
+    come from the reservoir, so they're exact for files with at most
+    sample_size rows and an approximation beyond that.
+
+    Applies the same rules as load_and_clean: columns more than half missing
+    are dropped, the rest get their median filled in. The returned mean and
+    scale are what a StandardScaler fitted on the filled data would have.
+    """
+    columns = pd.read_csv(filepath, nrows=0).columns
+    feature_cols = [c for c in columns if c not in ('Time', 'Pass/Fail')]
+    dtypes = {c: np.float32 for c in feature_cols}
+    dtypes['Pass/Fail'] = np.float32
+
+    d = len(feature_cols)
+    count = np.zeros(d)
+    mean = np.zeros(d)
+    m2 = np.zeros(d)
+    sample = np.empty((sample_size, d), dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    n_rows = 0
+
+    for chunk in pd.read_csv(filepath, usecols=feature_cols + ['Pass/Fail'], dtype=dtypes, chunksize=chunksize):
+        X = chunk[feature_cols].to_numpy(dtype=np.float32)
+        present = ~np.isnan(X)
+        chunk_count = present.sum(axis=0).astype(np.float64)
+        chunk_mean = np.divide(np.nansum(X, axis=0, dtype=np.float64), chunk_count,
+                               out=np.zeros(d), where=chunk_count > 0)
+        dev = X - chunk_mean
+        np.square(dev, out=dev)
+        chunk_m2 = np.nansum(dev, axis=0)
+        count, mean, m2 = _merge_moments(count, mean, m2, chunk_count, chunk_mean, chunk_m2)
+
+        # algorithm R, vectorized: row t replaces a random slot with probability k / (t + 1)
+        t = n_rows + np.arange(len(X))
+        slot = np.where(t < sample_size, t, rng.integers(0, t + 1))
+        keep = slot < sample_size
+        sample[slot[keep]] = X[keep]
+        n_rows += len(X)
+
+    sample = sample[:min(n_rows, sample_size)]
+    missing = 1 - count / n_rows if n_rows else np.ones(d)
+    keep = missing <= 0.5
+    median = np.empty(d)
+    with np.errstate(all='ignore'):
+        # a few columns at a time, nanmedian copies its input
+        for start in range(0, d, 64):
+            median[start:start + 64] = np.nanmedian(sample[:, start:start + 64].astype(np.float64), axis=0)
+
+    # the filled-in medians join the observed values: a second block of
+    # (n_rows - count) identical values, so it adds no spread of its own
+    _, mean_filled, m2_filled = _merge_moments(count, mean, m2, n_rows - count, median, np.zeros(d))
+    scale = np.sqrt(m2_filled / n_rows) if n_rows else np.ones(d)
+    # StandardScaler leaves constant columns unscaled
+    scale[~(scale > 10 * np.finfo(np.float64).eps)] = 1.0
+
+    print(f"Scanned {n_rows} rows in chunks of {chunksize}")
+    print(f"Dropped {int((~keep).sum())} columns with >50% missing")
+    print(f"Remaining features: {int(keep.sum())}")
+
+    return {
+        'n_rows': n_rows,
+        'columns': [c for c, k in zip(feature_cols, keep) if k],
+        'missing_fraction': missing[keep],
+        'median': median[keep],
+        'mean': mean_filled[keep],
+        'scale': scale[keep],
+        # unscaled rows with medians filled in, what build_sample_pool gives for the whole file
+        'sample': np.where(np.isnan(sample[:, keep]), median[keep], sample[:, keep]).astype(np.float64),
+    }
+
+
+def write_scaled(filepath, stats, out_path, chunksize=CHUNK_ROWS):
+    """Second streaming pass: fill, scale and write every row to a float32 .npy.
+
+    The output is written through a memory map one chunk at a time, and
+    returned the same way, so neither pass holds more than a chunk in memory.
+    Returns the (n_rows, n_features) memmap and the 0/1 labels.
+    """
+    columns = stats['columns']
+    dtypes = {c: np.float32 for c in columns}
+    dtypes['Pass/Fail'] = np.float32
+    fill = stats['median'].astype(np.float32)
+    mean = stats['mean']
+    scale = stats['scale']
+
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    X_out = np.lib.format.open_memmap(out_path, mode='w+', dtype=np.float32,
+                                      shape=(stats['n_rows'], len(columns)))
+    y = np.empty(stats['n_rows'], dtype=np.int8)
+    start = 0
+    for chunk in pd.read_csv(filepath, usecols=columns + ['Pass/Fail'], dtype=dtypes, chunksize=chunksize):
+        X = chunk[columns].to_numpy(dtype=np.float32)
+        X = np.where(np.isnan(X), fill, X)
+        stop = start + len(X)
+        X_out[start:stop] = (X - mean) / scale
+        # convert from -1/1 to 0/1 (0 = pass, 1 = fail)
+        y[start:stop] = chunk['Pass/Fail'].to_numpy() == 1
+        start = stop
+    X_out.flush()
+    print(f"Scaled features written to {out_path}")
+    return np.load(out_path, mmap_mode='r'), y
+
+
+def preprocess_streaming(filepath, out_path, chunksize=CHUNK_ROWS, sample_size=SAMPLE_ROWS):
+    """load_and_clean + prepare_features for files too big to read in one go.
+
+    Returns the scaled features (memory-mapped from out_path), the labels, the
+    fitted scaler as an ArrayScaler and scan_csv's stats, which hold the sample
+    pool for /sample and the columns and medians the rows were cleaned with.
+    """
+    stats = scan_csv(filepath, chunksize, sample_size)
+    X, y = write_scaled(filepath, stats, out_path, chunksize)
+    return X, y, ArrayScaler(stats['mean'], stats['scale']), stats
+
+
 def split_data(X, y, test_size=0.2):
     """Stratified split to keep class ratios the same in both sets."""
     X_train, X_test, y_train, y_test = train_test_split(
@@ -0,0 +1,147 @@
+import json
+import os
+import re
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from inference import TorchClassifier, NumpyClassifier
+from drift import KSBaseline
+
+# each train.py run writes into models/versions/<version>/, and models/ACTIVE
+# holds the name of the version being served
+MODELS_DIR = os.environ.get('SEMIGUARD_MODELS_DIR', '../models')
+
+# what train.py saves in a version directory (or straight in models/ before versions existed)
+MODEL_FILE = 'defect_model.pt'
+SCALER_FILE = 'scaler.npz'
+# models trained before scaler.npz existed only have the pickle
+LEGACY_SCALER_FILE = 'scaler.pkl'
+NUMPY_MODEL_FILE = 'model_numpy.npz'
+METADATA_FILE = 'metadata.json'
+BASELINE_FILE = 'train_baseline.npy'
+TRAIN_FEATURES_FILE = 'train_features.npy'
+SAMPLE_POOL_FILE = 'sample_pool.npy'
+# raw CSV columns the model takes and their fill values, read by score.py
+COLUMNS_FILE = 'columns.json'
+
+_VERSION_RE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]*$')
+
+
+def new_version():
+    """Name for a freshly trained model, sortable by training time."""
+    return datetime.now().strftime('%Y%m%d-%H%M%S')
+
+
+def valid_version(version):
+    # versions end up in paths, so nothing that could climb out of versions/
+    return isinstance(version, str) and bool(_VERSION_RE.match(version))
+
+
+def version_dir(version, models_dir=MODELS_DIR):
+    if not valid_version(version):
+        raise ValueError(f'invalid model version: {version!r}')
+    return os.path.join(models_dir, 'versions', version)
+
+
+def list_versions(models_dir=MODELS_DIR):
+    """Every version that has a metadata.json, oldest first."""
+    root = os.path.join(models_dir, 'versions')
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        name for name in os.listdir(root)
+        if valid_version(name) and os.path.exists(os.path.join(root, name, METADATA_FILE))
+    )
+
+
+def active_version(models_dir=MODELS_DIR):
+    """The version named in models/ACTIVE, or None for the old flat layout."""
+    try:
+        with open(os.path.join(models_dir, 'ACTIVE')) as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return version or None
+
+
+def set_active(version, models_dir=MODELS_DIR):
+    """Point models/ACTIVE at a version.
+
+    Written to a temp file and renamed over the old one, so a worker reading it
+    sees either the old name or the new one, never half a write.
+    """
+    if not os.path.exists(os.path.join(version_dir(version, models_dir), METADATA_FILE)):
+        raise FileNotFoundError(f'model version {version} not found')
+    path = os.path.join(models_dir, 'ACTIVE')
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        f.write(version + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class ModelBundle:
+    """Everything that belongs to one model version, swapped in and out as a unit.
+
+    Requests grab the current bundle once and use it throughout, so a reload
+    halfway through a request can't pair one version's engine with another's
+    metadata. The drift baseline and monitor are opened lazily by the API and
+    kept here, since they belong to the model that was trained on that data.
+    """
+
+    def __init__(self, engine, metadata, version=None, directory=None):
+        self.engine = engine
+        self.metadata = metadata
+        self.version = version
+        self.directory = directory
+        self.n_features = metadata['n_features']
+        self.ks_baseline = None
+        self.drift_monitor = None
+        self.drift_loaded = False
+        self.monitor_started = False
+        self.drift_lock = threading.Lock()
+
+    def path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def load_baseline(self):
+        if os.path.exists(self.path(BASELINE_FILE)):
+            return KSBaseline.load(self.path(BASELINE_FILE))
+        # models trained before the sorted baseline existed
+        return KSBaseline.from_features(np.load(self.path(TRAIN_FEATURES_FILE), mmap_mode='r'))
+
+
+def mode_accepted(metadata, mode):
+    """Whether train.py's parity check passed this torch mode for a version. eager always passes."""
+    return mode == 'eager' or metadata.get('inference_modes', {}).get(mode, {}).get('accepted', False)
+
+
+def load_bundle(models_dir=MODELS_DIR, version=None, engine='numpy', torch_mode='eager'):
+    """Load a model version, the active one by default.
+
+    Without an ACTIVE file this reads the flat models/ layout older train.py
+    runs wrote, and the bundle's version is None. engine 'numpy' uses the
+    exported model_numpy.npz when the version has one, otherwise torch. The
+    torch engine runs in torch_mode if the version passed its parity check
+    for it, and in eager mode otherwise.
+    """
+    if version is None:
+        version = active_version(models_dir)
+    directory = version_dir(version, models_dir) if version else models_dir
+
+    with open(os.path.join(directory, METADATA_FILE)) as f:
+        metadata = json.load(f)
+
+    numpy_path = os.path.join(directory, NUMPY_MODEL_FILE)
+    if engine == 'numpy' and os.path.exists(numpy_path):
+        model = NumpyClassifier.load(numpy_path)
+    else:
+        scaler_path = os.path.join(directory, SCALER_FILE)
+        if not os.path.exists(scaler_path):
+            scaler_path = os.path.join(directory, LEGACY_SCALER_FILE)
+        mode = torch_mode if mode_accepted(metadata, torch_mode) else 'eager'
+        model = TorchClassifier.load(os.path.join(directory, MODEL_FILE), scaler_path, metadata['n_features'], mode)
+    return ModelBundle(model, metadata, version, directory)
@@ -0,0 +1,253 @@
+"""Score a CSV export or .npy matrix offline with a trained model version.
+
+    python score.py lots.csv --out scored.csv
+    python score.py lots.csv --out scored.csv --workers 8 --import-db
+    python score.py rows.npy --out scored.csv --version 20261018-104252
+
+Rows get the same treatment as in train.py: load_and_clean's columns in the
+same order, gaps filled with the training medians (columns.json), then the
+same engine the API serves. A CSV is split into byte ranges at line breaks and
+every worker process reads, parses and scores its own ranges, so parsing scales
+with the workers too. Only a couple of chunks per worker are in flight at a
+time, so memory stays flat however big the input is.
+
+An .npy input holds raw values already in the model's column order.
+
+The output CSV has a line per input row: its position, the --id-column value if
+one was asked for, the input hash the API would log, and the prediction and
+confidence as /predict reports them. --import-db then logs the results to
+predictions.db, committing database.IMPORT_COMMIT_ROWS at a time.
+"""
+import argparse
+import csv
+import io
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import registry
+from cache import feature_key
+from preprocessing import load_and_clean, cleaning_params, load_columns
+
+# bytes of CSV (or rows of .npy) per task
+CHUNK_BYTES = 16 * 1024 * 1024
+NPY_CHUNK_ROWS = 4096
+# tasks queued per worker, enough to keep every worker busy
+IN_FLIGHT_PER_WORKER = 2
+# rows read from the output CSV at a time when importing
+IMPORT_CHUNK_ROWS = 50_000
+
+# set in each worker by _init_worker
+_worker = None
+
+
+def csv_ranges(path, chunk_bytes=CHUNK_BYTES):
+    """(start, end) byte ranges covering every line after the header, split at line breaks.
+
+    Assumes no quoted field spans lines, which holds for numeric exports.
+    """
+    with open(path, 'rb') as f:
+        f.readline()
+        start = f.tell()
+        size = os.fstat(f.fileno()).st_size
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()
+            end = f.tell()
+            yield start, end
+            start = end
+
+
+def npy_ranges(path, chunk_rows=NPY_CHUNK_ROWS):
+    n_rows = np.load(path, mmap_mode='r').shape[0]
+    for start in range(0, n_rows, chunk_rows):
+        yield start, min(start + chunk_rows, n_rows)
+
+
+def _init_worker(models_dir, version, engine, columns, fill_values, header, id_column, threads):
+    global _worker
+    bundle = registry.load_bundle(models_dir, version, engine)
+    if bundle.engine.name == 'torch':
+        import torch
+        torch.set_num_threads(threads)
+    _worker = {
+        'engine': bundle.engine,
+        'columns': columns,
+        'fill_values': fill_values,
+        'header': header,
+        'id_column': id_column,
+    }
+
+
+def _score_rows(X):
+    """Fill, score and label an (n, n_features) float64 array."""
+    fill = _worker['fill_values']
+    missing = np.isnan(X)
+    if missing.any():
+        X[missing] = np.broadcast_to(fill, X.shape)[missing]
+    proba = _worker['engine'].predict_proba(X)
+    fail = proba >= 0.5
+    # same labelling as the API's _label
+    confidence = np.round(np.where(fail, proba, 1 - proba), 4)
+    hashes = [feature_key(row).hex()[:12] for row in X]
+    return fail, confidence, hashes
+
+
+def _score_csv_range(task):
+    path, start, end = task
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    columns = _worker['columns']
+    id_column = _worker['id_column']
+    usecols = columns + [id_column] if id_column else columns
+    # round_trip parses every value to the same double json.loads gives the API,
+    # the default parser can be an ulp off and the input hashes would differ
+    df = pd.read_csv(io.BytesIO(data), header=None, names=_worker['header'], usecols=usecols,
+                     dtype={c: np.float64 for c in columns}, float_precision='round_trip')
+    ids = df[id_column].astype(str).tolist() if id_column else None
+    return _score_rows(df[columns].to_numpy(dtype=np.float64)) + (ids,)
+
+
+def _score_npy_range(task):
+    path, start, end = task
+    X = np.array(np.load(path, mmap_mode='r')[start:end], dtype=np.float64)
+    return _score_rows(X) + (None,)
+
+
+def _write_results(writer, result, first_row):
+    fail, confidence, hashes, ids = result
+    labels = np.where(fail, 'fail', 'pass')
+    rows = range(first_row, first_row + len(fail))
+    if ids is None:
+        writer.writerows(zip(rows, hashes, labels, confidence.tolist()))
+    else:
+        # ids are arbitrary input values, the csv module quotes any commas or quotes in them
+        writer.writerows(zip(rows, ids, hashes, labels, confidence.tolist()))
+    return first_row + len(fail), int(fail.sum())
+
+
+def resolve_columns(bundle, columns_from=None):
+    """The raw columns and fill values bundle's model was trained with."""
+    if columns_from:
+        columns, fill_values = cleaning_params(load_and_clean(columns_from))
+    elif bundle.directory and os.path.exists(bundle.path(registry.COLUMNS_FILE)):
+        columns, fill_values = load_columns(bundle.path(registry.COLUMNS_FILE))
+    else:
+        raise SystemExit(
+            f"Model version {bundle.version or '(unversioned)'} has no {registry.COLUMNS_FILE}, it was "
+            f"trained before score.py existed. Pass its training CSV as --columns-from to recover them."
+        )
+    if len(columns) != bundle.n_features:
+        raise SystemExit(f"{len(columns)} columns but the model takes {bundle.n_features} features")
+    return [str(c) for c in columns], fill_values
+
+
+def score_file(path, out_path, models_dir=registry.MODELS_DIR, version=None, engine='numpy', workers=1,
+               threads=1, id_column=None, columns_from=None, chunk_bytes=CHUNK_BYTES):
+    """Score every row of path into out_path. Returns a summary dict."""
+    bundle = registry.load_bundle(models_dir, version, engine)
+    columns, fill_values = resolve_columns(bundle, columns_from)
+
+    if path.endswith('.npy'):
+        if id_column:
+            raise SystemExit('--id-column only applies to CSV input')
+        shape = np.load(path, mmap_mode='r').shape
+        if len(shape) != 2 or shape[1] != bundle.n_features:
+            raise SystemExit(f'{path} has shape {shape}, expected (rows, {bundle.n_features})')
+        header = None
+        tasks = ((path, start, end) for start, end in npy_ranges(path))
+        score_fn = _score_npy_range
+    else:
+        header = [str(c) for c in pd.read_csv(path, nrows=0).columns]
+        missing = [c for c in columns + ([id_column] if id_column else []) if c not in header]
+        if missing:
+            raise SystemExit(f"{path} is missing {len(missing)} columns the model needs, e.g. {missing[:5]}")
+        tasks = ((path, start, end) for start, end in csv_ranges(path, chunk_bytes))
+        score_fn = _score_csv_range
+
+    initargs = (models_dir, bundle.version, engine, columns, fill_values, header, id_column, threads)
+    start = time.perf_counter()
+    n_rows = n_fail = 0
+    with open(out_path, 'w', newline='') as out:
+        writer = csv.writer(out, lineterminator='\n')
+        writer.writerow(['row'] + ([id_column] if id_column else []) + ['input_hash', 'prediction', 'confidence'])
+        if workers <= 1:
+            _init_worker(*initargs)
+            for task in tasks:
+                n_rows, fails = _write_results(writer, score_fn(task), n_rows)
+                n_fail += fails
+        else:
+            # spawned workers read the thread limits from the environment when they import numpy
+            for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+                os.environ.setdefault(var, str(threads))
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_worker, initargs=initargs) as pool:
+                # results are written in input order, with a bounded number of tasks queued
+                pending = deque()
+                for task in tasks:
+                    pending.append(pool.submit(score_fn, task))
+                    if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                        n_rows, fails = _write_results(writer, pending.popleft().result(), n_rows)
+                        n_fail += fails
+                while pending:
+                    n_rows, fails = _write_results(writer, pending.popleft().result(), n_rows)
+                    n_fail += fails
+
+    seconds = time.perf_counter() - start
+    return {
+        'rows': n_rows,
+        'fail': n_fail,
+        'seconds': round(seconds, 2),
+        'rows_per_sec': round(n_rows / seconds, 1) if seconds else None,
+        'model_version': bundle.version,
+    }
+
+
+def import_results(out_path, n_rows, model_version):
+    """Log score_file's n_rows output rows to predictions.db. Returns the id range."""
+    import database
+
+    def chunks():
+        for df in pd.read_csv(out_path, usecols=['input_hash', 'prediction', 'confidence'],
+                              dtype={'input_hash': str}, chunksize=IMPORT_CHUNK_ROWS):
+            yield list(df.itertuples(index=False, name=None))
+
+    return database.import_predictions(chunks(), n_rows, model_version)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Score a CSV or .npy file offline with a trained model.')
+    parser.add_argument('input', help='CSV export (same columns as the training data) or .npy of raw rows')
+    parser.add_argument('--out', required=True, help='output CSV')
+    parser.add_argument('--version', help='model version to use (default: the ACTIVE one)')
+    parser.add_argument('--models-dir', default=registry.MODELS_DIR)
+    parser.add_argument('--engine', choices=['numpy', 'torch'], default='numpy')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='worker processes (default: one per CPU, 1 scores in this process)')
+    parser.add_argument('--threads', type=int, default=1, help='math library threads per worker')
+    parser.add_argument('--chunk-mb', type=float, default=CHUNK_BYTES / 2 ** 20,
+                        help='MB of CSV per task (default 16)')
+    parser.add_argument('--id-column', help="input column copied to the output to identify rows, e.g. 'Time'")
+    parser.add_argument('--columns-from',
+                        help='training CSV to recover the column selection from, for models without columns.json')
+    parser.add_argument('--import-db', action='store_true',
+                        help='log the results to predictions.db afterwards')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    summary = score_file(args.input, args.out, args.models_dir, args.version, args.engine, args.workers,
+                         args.threads, args.id_column, args.columns_from, int(args.chunk_mb * 2 ** 20))
+    print(f"Scored {summary['rows']} rows ({summary['fail']} fail) with model version "
+          f"{summary['model_version']} in {summary['seconds']}s, {summary['rows_per_sec']} rows/s")
+    print(f"Results written to {args.out}")
+    if args.import_db:
+        start, end = import_results(args.out, summary['rows'], summary['model_version'])
+        print(f"Imported {end - start} predictions into the database (ids {start}-{end - 1})")
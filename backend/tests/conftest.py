@@ -0,0 +1,26 @@
+import sys
+import os
+import atexit
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# database.py creates its tables on import, keep that away from the real
+# backend/predictions.db too
+_import_dir = tempfile.mkdtemp(prefix='semiguard-tests-')
+atexit.register(shutil.rmtree, _import_dir, ignore_errors=True)
+os.environ.setdefault('SEMIGUARD_DB_PATH', os.path.join(_import_dir, 'predictions.db'))
+
+import pytest
+import database
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    """A fresh predictions.db in tmp_path, the database module pointed at it."""
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'predictions.db'))
+    # commit on the calling thread, tests that want the queue set up their own writer
+    monkeypatch.setattr(database, '_writer', None)
+    database.init_db()
+    return database
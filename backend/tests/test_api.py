@@ -1,12 +1,29 @@
 import sys
 import os
 import json
+import threading
+import time
 
 # make sure we can import from backend/
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 import pytest
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+import app as api
+import database
 from app import app
+from model import DefectClassifier
+from inference import TorchClassifier, export_numpy
+from registry import ModelBundle
+import registry
+
+N_FEATURES = 8
+
+
+# every request here may log, keep it all in a throwaway database
+pytestmark = pytest.mark.usefixtures('db')
 
 
 @pytest.fixture
@@ -16,6 +33,15 @@ def client():
         yield client
 
 
+@pytest.fixture
+def loaded_model(monkeypatch):
+    """Swap in a small untrained model so scoring paths can run."""
+    rng = np.random.default_rng(0)
+    scaler = StandardScaler().fit(rng.normal(size=(50, N_FEATURES)))
+    engine = TorchClassifier(DefectClassifier(N_FEATURES).eval(), scaler)
+    monkeypatch.setattr(api, 'bundle', ModelBundle(engine, {'n_features': N_FEATURES}, version='test'))
+
+
 def test_health_returns_200(client):
     resp = client.get('/health')
     assert resp.status_code == 200
@@ -63,6 +89,13 @@ def test_metrics_returns_json(client):
     assert 'fail_rate' in data
 
 
+def test_metrics_window(client):
+    resp = client.get('/metrics?window=15')
+    assert resp.status_code == 200
+    assert resp.get_json()['window']['minutes'] == 15
+    assert client.get('/metrics?window=0').status_code == 400
+
+
 def test_feedback_missing_fields(client):
     resp = client.post('/feedback',
         data=json.dumps({'id': 1}),
@@ -75,3 +108,428 @@ def test_feedback_invalid_label(client):
         data=json.dumps({'id': 1, 'actual_label': 'maybe'}),
         content_type='application/json')
     assert resp.status_code == 400
+
+
+def test_feedback_rejects_non_integer_ids(client):
+    for bad_id in ('abc', '5', None, True, 1.5):
+        resp = client.post('/feedback',
+            data=json.dumps({'id': bad_id, 'actual_label': 'fail'}),
+            content_type='application/json')
+        assert resp.status_code == 400, bad_id
+
+
+def test_predict_batch_scores_rows_in_order(client, loaded_model):
+    rows = [[float(i + j) for j in range(N_FEATURES)] for i in range(5)]
+    resp = client.post('/predict/batch',
+        data=json.dumps({'rows': rows}),
+        content_type='application/json')
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data['scored'] == 5
+    assert [r['index'] for r in data['results']] == list(range(5))
+
+    # each row should match what the single-row endpoint says
+    for row, result in zip(rows, data['results']):
+        single = client.post('/predict',
+            data=json.dumps({'features': row}),
+            content_type='application/json').get_json()
+        assert result['prediction'] == single['prediction']
+        assert result['confidence'] == pytest.approx(single['confidence'])
+
+
+def test_predict_batch_rejects_bad_rows_individually(client, loaded_model):
+    good = [0.5] * N_FEATURES
+    rows = [good, [1, 2, 3], good[:-1] + [None], good, ['x'] * N_FEATURES]
+    resp = client.post('/predict/batch',
+        data=json.dumps({'rows': rows}),
+        content_type='application/json')
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data['scored'] == 2
+    assert data['rejected'] == 3
+    assert 'prediction' in data['results'][0]
+    assert 'error' in data['results'][1]
+    assert 'error' in data['results'][2]
+    assert 'prediction' in data['results'][3]
+    assert 'error' in data['results'][4]
+    assert len(database.get_recent_predictions(10)) == 2
+
+
+def test_predict_batch_missing_rows(client):
+    resp = client.post('/predict/batch',
+        data=json.dumps({'features': [1, 2, 3]}),
+        content_type='application/json')
+    assert resp.status_code in (400, 503)
+
+
+def test_sample_from_cached_pool(client, monkeypatch):
+    pool = np.arange(40, dtype=np.float64).reshape(10, 4)
+    monkeypatch.setattr(api, '_sample_pool', pool)
+
+    data = client.get('/sample').get_json()
+    assert data['n_features'] == 4
+    assert data['features'] in pool.tolist()
+
+    data = client.get('/sample?n=25').get_json()
+    assert data['count'] == 25
+    assert len(data['samples']) == 25
+    assert all(row in pool.tolist() for row in data['samples'])
+
+
+def test_sample_rng_differs_between_forked_workers():
+    api._sample_rng()
+    draws = []
+    for _ in range(2):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.write(write_fd, json.dumps(api._sample_rng().integers(0, 10 ** 9, size=4).tolist()).encode())
+            os._exit(0)
+        os.close(write_fd)
+        os.waitpid(pid, 0)
+        with os.fdopen(read_fd) as f:
+            draws.append(json.loads(f.read()))
+    assert draws[0] != draws[1]
+
+
+def test_sample_rejects_bad_n(client):
+    assert client.get('/sample?n=0').status_code == 400
+    assert client.get(f'/sample?n={api.MAX_SAMPLE_ROWS + 1}').status_code == 400
+
+
+def test_repeat_predictions_hit_the_cache(client, loaded_model):
+    api.prediction_cache.clear()
+    before = api.prediction_cache.stats()
+    row = [0.25] * N_FEATURES
+    first = client.post('/predict', data=json.dumps({'features': row}), content_type='application/json')
+    second = client.post('/predict', data=json.dumps({'features': row}), content_type='application/json')
+    assert first.get_json()['confidence'] == second.get_json()['confidence']
+
+    stats = client.get('/health').get_json()['cache']
+    assert stats['hits'] == before['hits'] + 1
+    assert stats['misses'] == before['misses'] + 1
+    # both requests still get logged
+    assert len(database.get_recent_predictions(10)) == 2
+
+
+def write_version(models_dir, version, n_features, seed=0):
+    """A tiny numpy-engine model version laid out the way train.py writes one."""
+    rng = np.random.default_rng(seed)
+    out = models_dir / 'versions' / version
+    out.mkdir(parents=True)
+    sizes = [n_features, 16, 1]
+    layers = [(rng.normal(size=(o, i)), rng.normal(size=o)) for i, o in zip(sizes, sizes[1:])]
+    export_numpy(layers, np.zeros(n_features), np.ones(n_features), out / 'model_numpy.npz')
+    (out / 'metadata.json').write_text(json.dumps({'n_features': n_features, 'version': version}))
+
+
+@pytest.fixture
+def model_registry(monkeypatch, tmp_path):
+    models_dir = tmp_path / 'models'
+    write_version(models_dir, 'v1', N_FEATURES)
+    write_version(models_dir, 'v2', 6, seed=1)
+    registry.set_active('v1', str(models_dir))
+
+    monkeypatch.setattr(api, 'MODELS_DIR', str(models_dir))
+    monkeypatch.setattr(api, 'ENGINE', 'numpy')
+    monkeypatch.setattr(api, 'bundle', None)
+    monkeypatch.setattr(api, '_failed_version', None)
+    assert api.load_model()
+    return models_dir
+
+
+def test_workers_follow_active_version(client, model_registry, monkeypatch):
+    resp = client.post('/predict', data=json.dumps({'features': [0.5] * N_FEATURES}),
+        content_type='application/json')
+    assert resp.get_json()['model_version'] == 'v1'
+
+    registry.set_active('v2', str(model_registry))
+    # force the next request to look at ACTIVE again
+    monkeypatch.setattr(api, '_last_reload_check', 0.0)
+    health = client.get('/health').get_json()
+    assert health['model_version'] == 'v2'
+    assert health['n_features'] == 6
+
+    resp = client.post('/predict', data=json.dumps({'features': [0.5] * 6}),
+        content_type='application/json')
+    assert resp.get_json()['model_version'] == 'v2'
+    versions = [row['model_version'] for row in database.get_recent_predictions(10)]
+    assert versions == ['v2', 'v1']
+
+
+def test_activate_model_endpoint(client, model_registry, monkeypatch):
+    body = json.dumps({'version': 'v2'})
+    assert client.post('/models/active', data=body, content_type='application/json').status_code == 403
+
+    monkeypatch.setattr(api, 'ADMIN_TOKEN', 'secret')
+    resp = client.post('/models/active', data=body, content_type='application/json',
+        headers={'X-Admin-Token': 'wrong'})
+    assert resp.status_code == 401
+    resp = client.post('/models/active', data=json.dumps({'version': 'v9'}), content_type='application/json',
+        headers={'X-Admin-Token': 'secret'})
+    assert resp.status_code == 404
+
+    resp = client.post('/models/active', data=body, content_type='application/json',
+        headers={'X-Admin-Token': 'secret'})
+    assert resp.status_code == 200
+    assert resp.get_json()['model_version'] == 'v2'
+    assert registry.active_version(str(model_registry)) == 'v2'
+
+    listing = client.get('/models').get_json()
+    assert listing['active'] == listing['loaded'] == 'v2'
+    assert [v['version'] for v in listing['versions']] == ['v1', 'v2']
+
+
+def test_predict_returns_id_usable_for_feedback(client, loaded_model, monkeypatch):
+    monkeypatch.setattr(database, '_writer', database.PredictionWriter(interval_ms=50))
+    resp = client.post('/predict', data=json.dumps({'features': [0.1] * N_FEATURES}),
+        content_type='application/json')
+    prediction_id = resp.get_json()['id']
+
+    # still queued at this point, feedback waits for it
+    resp = client.post('/feedback', data=json.dumps({'id': prediction_id, 'actual_label': 'pass'}),
+        content_type='application/json')
+    assert resp.status_code == 200
+    assert database.get_recent_predictions(1)[0]['id'] == prediction_id
+    assert client.get('/health').get_json()['logging']['written'] == 1
+
+
+def test_stats_reports_predict_stages(client, loaded_model):
+    import timing
+    timing.reset()
+    # a cache hit would skip the model stages
+    api.prediction_cache.clear()
+    client.post('/predict', data=json.dumps({'features': [0.1] * N_FEATURES}),
+        content_type='application/json')
+
+    resp = client.get('/stats')
+    assert resp.status_code == 200
+    assert resp.mimetype == 'text/plain'
+    text = resp.get_data(as_text=True)
+    for stage in ('predict.parse', 'predict.validate', 'predict.hash', 'predict.score',
+                  'predict.log', 'model.scale', 'model.forward', 'db.write'):
+        assert f'semiguard_stage_seconds_count{{stage="{stage}"' in text
+    assert 'semiguard_request_seconds_count{endpoint="predict"' in text
+
+
+def test_predictions_history_pages_and_validates(client, loaded_model):
+    for i in range(5):
+        database.log_prediction(f'h{i}', 'pass', 0.9, [0.1])
+
+    rows = client.get('/predictions?n=2').get_json()
+    assert [row['id'] for row in rows] == [5, 4]
+    assert 'scaled_features' not in rows[0]
+    rows = client.get(f'/predictions?n=2&before_id={rows[-1]["id"]}').get_json()
+    assert [row['id'] for row in rows] == [3, 2]
+
+    assert client.get('/predictions?n=100000').status_code == 400
+    assert client.get('/predictions?prediction=maybe').status_code == 400
+    assert client.get('/predictions?since=yesterday').status_code == 400
+
+
+def test_history_filters_convert_offsets_to_local_time(client, loaded_model):
+    from datetime import datetime, timedelta, timezone
+    noon = datetime(2026, 10, 18, 12, 0)
+    for _ in range(3):
+        database.log_prediction('h', 'pass', 0.9)
+    conn = database.get_connection()
+    for prediction_id, hours in ((1, -1), (2, 0), (3, 1)):
+        conn.execute('UPDATE predictions SET timestamp = ? WHERE id = ?',
+                     ((noon + timedelta(hours=hours)).isoformat(), prediction_id))
+    conn.commit()
+
+    # the same instants, written with an offset the server isn't in
+    offset = timezone(timedelta(hours=5, minutes=30))
+    rows = client.get('/predictions', query_string={
+        'since': noon.astimezone().astimezone(offset).isoformat(),
+        'until': (noon + timedelta(hours=1)).astimezone().astimezone(offset).isoformat(),
+    }).get_json()
+    assert [row['id'] for row in rows] == [2]
+    rows = client.get('/predictions', query_string={'since': '2026-10-18 12:00'}).get_json()
+    assert [row['id'] for row in rows] == [3, 2]
+
+
+def test_predictions_export_streams_everything(client, loaded_model):
+    database.log_predictions([(f'h{i}', 'fail', 0.7, None) for i in range(1500)])
+    database.log_prediction('last', 'pass', 0.9, None)
+
+    resp = client.get('/predictions/export?prediction=fail')
+    assert resp.status_code == 200
+    rows = json.loads(resp.get_data(as_text=True))
+    assert len(rows) == 1500
+    assert rows[0]['id'] == 1500 and rows[-1]['id'] == 1
+    assert json.loads(client.get('/predictions/export?limit=3').get_data(as_text=True))[0]['input_hash'] == 'last'
+
+
+def test_binary_body_scores_like_json(client, loaded_model):
+    import wire
+    rows = np.random.default_rng(3).normal(size=(4, N_FEATURES))
+
+    single = client.post('/predict', data=wire.encode(rows[:1]), content_type=wire.CONTENT_TYPE)
+    assert single.status_code == 200
+    as_json = client.post('/predict', data=json.dumps({'features': rows[0].tolist()}),
+                          content_type='application/json')
+    assert single.get_json()['confidence'] == as_json.get_json()['confidence']
+    # same input hash, so the json request was a cache hit
+    hashes = {p['input_hash'] for p in database.get_recent_predictions(2)}
+    assert len(hashes) == 1
+
+    rows[2, 1] = np.nan
+    resp = client.post('/predict/batch', data=wire.encode(rows), content_type=wire.CONTENT_TYPE)
+    data = resp.get_json()
+    assert (data['scored'], data['rejected']) == (3, 1)
+    assert 'NaN' in data['results'][2]['error']
+
+
+def test_non_finite_and_malformed_bodies_are_rejected(client, loaded_model):
+    import wire
+    row = [0.5] * N_FEATURES
+    resp = client.post('/predict', data=json.dumps({'features': row[:-1] + [None]}),
+                       content_type='application/json')
+    assert resp.status_code == 400
+    assert 'null' in resp.get_json()['error']
+
+    for body in (wire.encode(np.ones((2, N_FEATURES))), wire.encode(np.ones(3)), b'junk'):
+        resp = client.post('/predict', data=body, content_type=wire.CONTENT_TYPE)
+        assert resp.status_code == 400
+    resp = client.post('/predict', data=wire.encode([np.inf] + row[1:]), content_type=wire.CONTENT_TYPE)
+    assert resp.status_code == 400
+
+
+def test_drift_serves_the_scheduled_result(client, loaded_model, monkeypatch):
+    from drift import KSBaseline
+    rng = np.random.default_rng(4)
+    b = api.bundle
+    b.ks_baseline = KSBaseline.from_features(rng.normal(size=(300, N_FEATURES)))
+    b.drift_loaded = True
+    for row in rng.normal(size=(120, N_FEATURES)):
+        database.log_prediction('h', 'pass', 0.9, row, 'test')
+    monkeypatch.setattr(api.drift_scheduler, 'interval', 60)
+
+    # nothing stored yet, so this one runs the test itself
+    assert client.get('/drift').get_json()['cached'] is False
+    api.drift_scheduler.run_once()
+    cached = client.get('/drift?n=100').get_json()
+    assert cached['cached'] is True
+    assert cached['samples_compared'] == 100
+    live = client.get('/drift?n=100&fresh=1').get_json()
+    assert live['cached'] is False
+    assert live['drift_score'] == cached['drift_score']
+
+    history = client.get('/drift/history?window=1000&feature=2').get_json()
+    assert history['model_version'] == 'test'
+    assert len(history['points']) == 1
+    assert history['points'][0]['samples_compared'] == 120
+    assert 'ks_statistic' in history['points'][0]
+    assert client.get('/drift/history?window=7').status_code == 400
+    assert client.get('/drift/history?since=yesterday').status_code == 400
+
+
+def test_events_stream_pushes_predictions_and_feedback(client, loaded_model, monkeypatch):
+    from events import EventBus
+    monkeypatch.setattr(api, 'event_bus', EventBus(poll_interval=0.01, max_clients=1))
+    resp = client.get('/events', buffered=False)
+    assert resp.status_code == 200
+    assert resp.mimetype == 'text/event-stream'
+    assert client.get('/events').status_code == 503
+    stream = iter(resp.response)
+    assert next(stream).startswith(b'retry:')
+
+    prediction = client.post('/predict',
+        data=json.dumps({'features': [0.1] * N_FEATURES}),
+        content_type='application/json').get_json()
+    chunk = next(stream).decode()
+    events = [block.split('\n') for block in chunk.strip().split('\n\n')]
+    assert [e[0] for e in events] == ['event: prediction', 'event: metrics']
+    pushed = json.loads(events[0][1][len('data: '):])
+    assert pushed['id'] == prediction['id']
+    assert pushed['prediction'] == prediction['prediction']
+    delta = json.loads(events[1][1][len('data: '):])
+    assert delta['total'] == 1
+    assert delta[f"{prediction['prediction']}_count"] == 1
+
+    client.post('/feedback',
+        data=json.dumps({'id': prediction['id'], 'actual_label': 'fail'}),
+        content_type='application/json')
+    kind, data = next(stream).decode().strip().split('\n')
+    assert kind == 'event: feedback'
+    assert json.loads(data[len('data: '):]) == {'id': prediction['id'], 'actual_label': 'fail'}
+
+    resp.close()
+    assert api.event_bus.stats()['clients'] == 0
+
+
+def test_monitor_is_seeded_off_the_request_thread(client, loaded_model, monkeypatch):
+    from drift import KSBaseline
+    rng = np.random.default_rng(6)
+    b = api.bundle
+    release = threading.Event()
+
+    def slow_baseline():
+        release.wait(5)
+        return KSBaseline.from_features(rng.normal(size=(300, N_FEATURES)))
+    monkeypatch.setattr(b, 'load_baseline', slow_baseline)
+    monkeypatch.setattr(api, 'DRIFT_WINDOW', 50)
+    for row in rng.normal(size=(20, N_FEATURES)):
+        database.log_prediction('h', 'pass', 0.9, row, 'test')
+    database.flush_writes()
+
+    # answered while the baseline is still loading
+    resp = client.post('/predict',
+        data=json.dumps({'features': [0.1] * N_FEATURES}),
+        content_type='application/json')
+    assert resp.status_code == 200
+    assert b.drift_monitor is None and not b.drift_loaded
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while b.drift_monitor is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert b.drift_monitor.size >= 20
+
+
+def test_only_drift_checks_open_the_baseline(client, loaded_model, monkeypatch):
+    from drift import KSBaseline
+    rng = np.random.default_rng(8)
+    b = api.bundle
+    monkeypatch.setattr(b, 'load_baseline', lambda: KSBaseline.from_features(rng.normal(size=(300, N_FEATURES))))
+    monkeypatch.setattr(api, 'DRIFT_WINDOW', 0)
+
+    for _ in range(15):
+        assert client.post('/predict',
+            data=json.dumps({'features': rng.normal(size=N_FEATURES).tolist()}),
+            content_type='application/json').status_code == 200
+    client.post('/predict/batch',
+        data=json.dumps({'rows': rng.normal(size=(2, N_FEATURES)).tolist()}),
+        content_type='application/json')
+    assert not b.drift_loaded and not b.monitor_started
+
+    database.flush_writes()
+    assert client.get('/drift?n=10&fresh=1').status_code == 200
+    assert b.drift_loaded
+
+
+def test_dropped_predictions_get_no_id(client, loaded_model, monkeypatch):
+    from events import EventBus
+    monkeypatch.setattr(api, 'event_bus', EventBus(poll_interval=0.01))
+    subscription = api.event_bus.subscribe()
+    # a queue that's full and never drained
+    writer = database.PredictionWriter(max_queue=1, put_timeout_ms=0)
+    writer._ensure_worker = lambda: None
+    writer._queue.put('row')
+    monkeypatch.setattr(database, '_writer', writer)
+
+    data = client.post('/predict',
+        data=json.dumps({'features': [0.1] * N_FEATURES}),
+        content_type='application/json').get_json()
+    assert data['logged'] is False
+    assert 'id' not in data
+    assert data['prediction'] in ('pass', 'fail')
+
+    batch = client.post('/predict/batch',
+        data=json.dumps({'rows': [[0.2] * N_FEATURES] * 2}),
+        content_type='application/json').get_json()
+    assert batch['scored'] == 2
+    assert all(r['logged'] is False and 'id' not in r for r in batch['results'])
+    assert subscription.get(0) == []
+    api.event_bus.unsubscribe(subscription)
@@ -0,0 +1,79 @@
+import sys
+import os
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import archive
+
+TODAY = date(2026, 10, 18)
+
+
+def _log(db, rows):
+    """rows of (id, days before TODAY, version, features)."""
+    conn = db.get_connection()
+    noon = datetime.combine(TODAY, datetime.min.time()) + timedelta(hours=12)
+    db.insert_rows(conn, [
+        (prediction_id, (noon - timedelta(days=days_ago)).isoformat(), 'h', 'pass', 0.9,
+         db.encode_features(features), version)
+        for prediction_id, days_ago, version, features in rows
+    ])
+    conn.commit()
+
+
+def test_old_days_move_to_archive_and_history_stays(db, tmp_path):
+    out = str(tmp_path / 'archive')
+    _log(db, [
+        (1, 10, 'v1', [1.0, 2.0]),
+        (2, 10, 'v1', [3.0, 4.0]),
+        (3, 10, 'v2', [5.0, 6.0, 7.0]),
+        (4, 9, 'v2', [8.0, 9.0, 10.0]),
+        (5, 1, 'v2', [11.0, 12.0, 13.0]),
+    ])
+
+    done = archive.archive_old_features(retention_days=7, out_dir=out, today=TODAY)
+    assert done == {TODAY - timedelta(days=10): 3, TODAY - timedelta(days=9): 1}
+
+    # only the recent row keeps its features, every row is still in the history
+    np.testing.assert_array_equal(db.get_recent_features(10), [[11.0, 12.0, 13.0]])
+    assert len(db.get_predictions(10)) == 5
+    assert db.get_metrics()['total_predictions'] == 5
+
+    ids, features = archive.load_features(TODAY - timedelta(days=10), 'v1', out_dir=out)
+    np.testing.assert_array_equal(ids, [1, 2])
+    np.testing.assert_array_equal(features, [[1.0, 2.0], [3.0, 4.0]])
+    assert features.dtype == np.float32
+    assert archive.list_days(out) == [TODAY - timedelta(days=10), TODAY - timedelta(days=9)]
+
+    # the archived days' tables are gone, nothing left to do on a second run
+    assert db.feature_partitions() == [db.features_table(TODAY - timedelta(days=1))]
+    assert db.get_connection().execute('PRAGMA freelist_count').fetchone()[0] == 0
+    assert archive.archive_old_features(retention_days=7, out_dir=out, today=TODAY) == {}
+
+
+def test_rerun_adds_blocks_and_readers_skip_duplicates(db, tmp_path):
+    out = str(tmp_path / 'archive')
+    day = TODAY - timedelta(days=10)
+    _log(db, [(1, 10, 'v1', [1.0])])
+    archive.archive_day(day, out)
+    # a row for the same day logged late, plus a block written twice
+    _log(db, [(2, 10, 'v1', [2.0])])
+    archive.archive_day(day, out)
+    archive._write_manifest(os.path.join(out, day.isoformat()), {
+        'blocks': archive._read_manifest(os.path.join(out, day.isoformat()))['blocks'] * 2
+    })
+
+    ids, features = archive.load_features(day, out_dir=out)
+    np.testing.assert_array_equal(ids, [1, 2])
+    np.testing.assert_array_equal(features[:, 0], [1.0, 2.0])
+
+
+def test_prune_archive(db, tmp_path):
+    out = str(tmp_path / 'archive')
+    _log(db, [(1, 40, 'v1', [1.0]), (2, 10, 'v1', [2.0])])
+    archive.archive_old_features(retention_days=7, out_dir=out, today=TODAY)
+
+    assert archive.prune_archive(0, out, today=TODAY) == []
+    assert archive.prune_archive(30, out, today=TODAY) == [TODAY - timedelta(days=40)]
+    assert archive.list_days(out) == [TODAY - timedelta(days=10)]
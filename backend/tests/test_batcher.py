@@ -0,0 +1,81 @@
+import sys
+import os
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pytest
+from batcher import MicroBatcher
+
+
+def fake_score(features):
+    # "scaled" is just the input, confidence is the row sum
+    return features * 1.0, features.sum(axis=1)
+
+
+def test_concurrent_rows_share_a_batch():
+    batcher = MicroBatcher(fake_score, max_batch_size=8, max_wait_ms=50)
+    results = [None] * 8
+    start = threading.Barrier(8)
+
+    def worker(i):
+        start.wait()
+        results[i] = batcher.submit(np.full((1, 4), float(i)))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # every caller gets its own row back
+    for i, (scaled, confidence) in enumerate(results):
+        assert np.all(scaled == i)
+        assert confidence == pytest.approx(4.0 * i)
+
+    stats = batcher.stats()
+    assert stats['rows'] == 8
+    assert stats['batches'] < 8
+
+
+def test_batch_size_one_scores_inline():
+    batcher = MicroBatcher(fake_score, max_batch_size=1)
+    scaled, confidence = batcher.submit(np.ones((1, 3)))
+    assert confidence == pytest.approx(3.0)
+    assert batcher._thread is None
+    assert batcher.stats()['full_batches'] == 1
+
+
+def test_errors_reach_every_caller_in_the_batch():
+    def broken(features):
+        raise ValueError('boom')
+
+    batcher = MicroBatcher(broken, max_batch_size=4, max_wait_ms=1)
+    with pytest.raises(ValueError):
+        batcher.submit(np.ones((1, 3)))
+
+
+def test_rows_for_different_models_are_scored_apart():
+    calls = []
+
+    def score(features, offset):
+        calls.append((offset, len(features)))
+        return features * 1.0, features.sum(axis=1) + offset
+
+    batcher = MicroBatcher(score, max_batch_size=8, max_wait_ms=50)
+    results = [None] * 6
+    start = threading.Barrier(6)
+
+    def worker(i):
+        start.wait()
+        results[i] = batcher.submit(np.zeros((1, 4)), 100 if i % 2 else 0)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert [r[1] for r in results] == [0, 100, 0, 100, 0, 100]
+    assert sum(n for _, n in calls) == 6
@@ -0,0 +1,39 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from cache import PredictionCache, feature_key
+
+
+def test_lru_eviction_and_counters():
+    cache = PredictionCache(maxsize=2, ttl=60)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)  # evicts b, a was used more recently
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    stats = cache.stats()
+    assert stats['hits'] == 3
+    assert stats['misses'] == 1
+    assert stats['size'] == 2
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('cache.time.monotonic', lambda: now[0])
+    cache = PredictionCache(maxsize=10, ttl=5)
+    cache.put('a', 1)
+    now[0] += 6
+    assert cache.get('a') is None
+    assert cache.stats()['size'] == 0
+
+
+def test_feature_key_is_exact():
+    row = np.array([[1.0, 2.0, 3.0]])
+    assert feature_key(row) == feature_key(np.array([[1, 2, 3]], dtype=np.float64))
+    assert feature_key(row) != feature_key(np.array([[1.0, 2.0, 3.0000001]]))
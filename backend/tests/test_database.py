@@ -0,0 +1,290 @@
+import sys
+import os
+import threading
+import time
+import sqlite3
+import json
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pytest
+import database
+
+
+def test_connection_is_reused_and_in_wal_mode(db):
+    conn = db.get_connection()
+    assert db.get_connection() is conn
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+
+def test_each_thread_gets_its_own_connection(db):
+    main_conn = db.get_connection()
+    other = []
+    t = threading.Thread(target=lambda: other.append(db.get_connection()))
+    t.start()
+    t.join()
+    assert other[0] is not main_conn
+
+
+def test_write_behind_groups_inserts_until_flush(db, monkeypatch):
+    writer = db.PredictionWriter(interval_ms=20)
+    monkeypatch.setattr(db, '_writer', writer)
+
+    for i in range(25):
+        db.log_prediction(f'hash{i}', 'pass', 0.9, [0.1, 0.2])
+    assert writer.flush(timeout=5)
+
+    rows = db.get_recent_predictions(100)
+    assert len(rows) == 25
+    assert rows[0]['input_hash'] == 'hash24'
+
+
+def test_features_round_trip_as_float32_matrix(db):
+    db.log_prediction('a', 'pass', 0.9, [0.5, -1.25, 2.0])
+    db.log_prediction('b', 'fail', 0.7, np.array([1.0, 2.0, 3.0]))
+
+    features = db.get_recent_features(10)
+    assert features.dtype == np.float32
+    assert features.shape == (2, 3)
+    # newest first
+    np.testing.assert_array_equal(features[0], [1.0, 2.0, 3.0])
+    np.testing.assert_array_equal(features[1], [0.5, -1.25, 2.0])
+
+
+def test_get_recent_features_empty(db):
+    assert len(db.get_recent_features(10)) == 0
+
+
+def test_migrates_json_features_to_blobs(monkeypatch, tmp_path):
+    path = tmp_path / 'old.db'
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE predictions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            input_hash TEXT,
+            prediction TEXT NOT NULL,
+            confidence REAL NOT NULL,
+            actual_label TEXT,
+            scaled_features TEXT
+        )
+    ''')
+    conn.execute(
+        "INSERT INTO predictions (timestamp, prediction, confidence, scaled_features) VALUES ('t', 'pass', 0.9, ?)",
+        (json.dumps([0.25, 0.5, 0.75]),)
+    )
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(database, 'DB_PATH', str(path))
+    monkeypatch.setattr(database, '_writer', None)
+    database.init_db()
+
+    conn = database.get_connection()
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == database.SCHEMA_VERSION
+    # converted to a blob, then moved out into a features partition
+    assert conn.execute('SELECT scaled_features FROM predictions').fetchone()[0] is None
+    assert len(database.feature_partitions()) == 1
+    np.testing.assert_array_equal(database.get_recent_features(1)[0], [0.25, 0.5, 0.75])
+    # existing rows get counted into the new totals
+    assert database.get_metrics()['total_predictions'] == 1
+
+
+def test_metrics_come_from_rollups(db):
+    db.log_predictions([('a', 'pass', 0.9, None), ('b', 'fail', 0.7, None), ('c', 'pass', 0.8, None)])
+    conn = db.get_connection()
+    # one from two hours ago, outside the default window
+    old = (datetime.now() - timedelta(hours=2)).isoformat()
+    conn.execute(
+        "INSERT INTO predictions (timestamp, prediction, confidence) VALUES (?, 'fail', 0.6)", (old,)
+    )
+    conn.commit()
+
+    metrics = db.get_metrics()
+    assert metrics['total_predictions'] == 4
+    assert metrics['pass_count'] == 2
+    assert metrics['fail_count'] == 2
+    assert metrics['avg_confidence'] == pytest.approx(0.75)
+    assert metrics['predictions_last_hour'] == 3
+    assert db.get_metrics(window_minutes=180)['window']['fail_count'] == 2
+
+    conn.execute("DELETE FROM predictions WHERE input_hash = 'b'")
+    conn.commit()
+    metrics = db.get_metrics()
+    assert metrics['total_predictions'] == 3
+    assert metrics['window']['fail_count'] == 0
+
+
+def test_recent_features_by_model_version(db):
+    db.log_prediction('a', 'pass', 0.9, [1.0, 2.0], model_version='v1')
+    db.log_predictions([('b', 'fail', 0.8, [3.0, 4.0], 'v2'), ('c', 'pass', 0.7, [5.0, 6.0], 'v2')])
+    assert db.get_recent_predictions(1)[0]['model_version'] == 'v2'
+    np.testing.assert_array_equal(db.get_recent_features(10, 'v1'), [[1.0, 2.0]])
+    assert len(db.get_recent_features(10, 'v2')) == 2
+    assert len(db.get_recent_features(10)) == 3
+
+
+def test_full_queue_drops_and_counts(db):
+    writer = db.PredictionWriter(max_queue=2, put_timeout_ms=0)
+    # no worker thread yet, so nothing drains the queue
+    writer._ensure_worker = lambda: None
+    assert writer.put_many([('row',)] * 5) == 3
+    assert writer.stats()['dropped'] == 3
+
+
+def test_ids_are_reserved_before_the_row_is_written(db, monkeypatch):
+    writer = db.PredictionWriter(interval_ms=20)
+    monkeypatch.setattr(db, '_writer', writer)
+
+    first = db.log_prediction('a', 'pass', 0.9, [0.1])
+    ids = db.log_predictions([('b', 'fail', 0.8, [0.2]), ('c', 'pass', 0.7, [0.3])])
+    assert ids == [first + 1, first + 2]
+    # feedback flushes the queue, so the row is there to update
+    assert db.update_actual_label(ids[0], 'fail')
+    assert db.get_recent_predictions(10)[1]['actual_label'] == 'fail'
+    assert not db.update_actual_label(10 ** 9, 'fail', wait=0.1)
+
+
+def test_feedback_gives_up_on_a_stalled_full_queue(db, monkeypatch):
+    writer = db.PredictionWriter(interval_ms=1, max_queue=2, put_timeout_ms=0)
+    release = threading.Event()
+    writer._write = lambda rows: release.wait()
+    monkeypatch.setattr(db, '_writer', writer)
+
+    # the writer thread takes the first row and hangs on it, the next two fill the queue
+    prediction_id = db.log_prediction('a', 'pass', 0.9)
+    deadline = time.monotonic() + 2
+    while writer.stats()['queued'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    db.log_prediction('b', 'pass', 0.9)
+    db.log_prediction('c', 'pass', 0.9)
+    assert writer.stats()['queued'] == 2
+
+    start = time.monotonic()
+    assert not writer.flush(timeout=0.1)
+    assert not db.update_actual_label(prediction_id, 'fail', wait=0.2)
+    assert time.monotonic() - start < 1
+    release.set()
+
+
+def test_id_blocks_are_reserved_off_the_calling_thread(db, monkeypatch):
+    reserved_on = []
+    reserve_ids = db.reserve_ids
+
+    def recording_reserve(n):
+        reserved_on.append(threading.current_thread())
+        return reserve_ids(n)
+
+    monkeypatch.setattr(db, 'reserve_ids', recording_reserve)
+    ids = db.IdAllocator(block_size=10)
+    ids.prefetch()
+    handed_out = [ids.next_id() for _ in range(35)]
+    assert len(set(handed_out)) == 35
+    assert handed_out == sorted(handed_out)
+    assert len(reserved_on) >= 4
+    assert threading.current_thread() not in reserved_on
+
+
+def test_failed_write_is_rolled_back(db):
+    conn = db.get_connection()
+    first = db._prediction_row('2026-10-01T10:00:00', 'a', 'pass', 0.9, [0.1])
+    # the second row reuses the id, so the batch fails after its first insert
+    with pytest.raises(sqlite3.IntegrityError):
+        db.write_rows([first, first[:2] + ('b',) + first[3:]])
+    assert not conn.in_transaction
+
+    db.log_prediction('c', 'pass', 0.9, [0.2])
+    assert [row['input_hash'] for row in db.get_recent_predictions(10)] == ['c']
+
+
+def test_id_blocks_continue_after_existing_rows(db, monkeypatch):
+    conn = db.get_connection()
+    conn.execute("INSERT INTO predictions (id, timestamp, prediction, confidence) VALUES (500, 't', 'pass', 0.9)")
+    conn.execute('DROP TABLE id_blocks')
+    conn.commit()
+    db._add_id_blocks(conn)
+    conn.commit()
+    monkeypatch.setattr(db, '_ids', db.IdAllocator(block_size=10))
+    assert db.log_prediction('a', 'pass', 0.9) == 501
+
+
+def test_history_pages_by_id_and_filters(db):
+    for i in range(10):
+        db.log_prediction(f'h{i}', 'fail' if i % 3 == 0 else 'pass', 0.8, [0.1])
+    db.update_actual_label(4, 'fail')
+
+    page = db.get_predictions(4)
+    assert [row['id'] for row in page] == [10, 9, 8, 7]
+    assert 'scaled_features' not in page[0]
+    assert [row['id'] for row in db.get_predictions(4, before_id=page[-1]['id'])] == [6, 5, 4, 3]
+
+    assert [row['id'] for row in db.get_predictions(10, prediction='fail')] == [10, 7, 4, 1]
+    assert [row['id'] for row in db.get_predictions(10, actual_label='fail')] == [4]
+    assert len(db.get_predictions(10, actual_label='none')) == 9
+
+    rows = list(db.iter_predictions(page_size=3, prediction='pass'))
+    assert [row['id'] for row in rows] == [9, 8, 6, 5, 3, 2]
+    assert len(list(db.iter_predictions(page_size=3, limit=4))) == 4
+
+
+def test_history_filters_use_indexes(db):
+    conn = db.get_connection()
+    for column, value in (('prediction', 'fail'), ('actual_label', 'pass')):
+        sql, params = db._history_query(50, before_id=100, **{column: value})
+        plan = ' '.join(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params))
+        assert f'idx_predictions_{column}' in plan
+
+
+def test_features_are_partitioned_by_day(db):
+    conn = db.get_connection()
+    db.insert_rows(conn, [
+        (1, '2026-10-16T23:59:00', 'a', 'pass', 0.9, db.encode_features([1.0]), 'v1'),
+        (2, '2026-10-17T00:01:00', 'b', 'pass', 0.9, db.encode_features([2.0]), 'v1'),
+        (3, '2026-10-17T08:00:00', 'c', 'fail', 0.8, db.encode_features([3.0]), 'v1'),
+        (4, '2026-10-17T09:00:00', 'd', 'pass', 0.9, None, 'v1'),
+    ])
+    conn.commit()
+
+    assert db.feature_partitions() == ['features_20261017', 'features_20261016']
+    # newest partition first, then as far back as it takes
+    np.testing.assert_array_equal(db.get_recent_features(2)[:, 0], [3.0, 2.0])
+    np.testing.assert_array_equal(db.get_recent_features(10, 'v1')[:, 0], [3.0, 2.0, 1.0])
+    assert db.get_metrics()['total_predictions'] == 4
+
+
+def test_lease_goes_to_one_holder_until_it_expires(db, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(db.time, 'time', lambda: now[0])
+    assert db.acquire_lease('drift', 'a', 30)
+    assert not db.acquire_lease('drift', 'b', 30)
+    # renewing pushes the expiry out
+    now[0] += 20
+    assert db.acquire_lease('drift', 'a', 30)
+    now[0] += 20
+    assert not db.acquire_lease('drift', 'b', 30)
+    now[0] += 20
+    assert db.acquire_lease('drift', 'b', 30)
+    db.release_lease('drift', 'b')
+    assert db.acquire_lease('drift', 'a', 30)
+
+
+def test_drift_history_round_trip_and_pruning(db):
+    def result(score):
+        return {'drift_detected': score > 0.2, 'drift_score': score, 'features_drifted': int(score * 10),
+                'features_tested': 10, 'drifted_features': [], 'samples_compared': 100}
+
+    old = datetime(2026, 1, 1)
+    db.log_drift_results(old.isoformat(), 'v1', [(100, result(0.1), np.full(10, 0.1))])
+    later = old + timedelta(days=10)
+    db.log_drift_results(later.isoformat(), 'v1', [(100, result(0.3), np.arange(10) / 10),
+                                                   (1000, result(0.0), np.zeros(10))], keep_days=7)
+
+    assert db.get_latest_drift(100, 'v1')['drift_score'] == 0.3
+    assert db.get_latest_drift(100, 'v2') is None
+    # the first check was more than keep_days older and is gone
+    points = db.get_drift_history(100, 'v1', feature=4)
+    assert [p['drift_score'] for p in points] == [0.3]
+    assert points[0]['ks_statistic'] == 0.4 and points[0]['drift_detected'] is True
+    assert db.get_drift_history(1000, 'v1', since=(later + timedelta(seconds=1)).isoformat()) == []
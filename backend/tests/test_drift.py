@@ -0,0 +1,133 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pytest
+from scipy import stats
+from drift import KSBaseline, StreamingDriftMonitor, detect_drift
+
+
+@pytest.fixture
+def samples():
+    rng = np.random.default_rng(42)
+    train = rng.normal(size=(400, 30)).astype(np.float32)
+    new = (rng.normal(size=(120, 30)) * 1.3 + 0.2).astype(np.float32)
+    # lots of ties, like median-imputed columns in SECOM
+    train[:, :10] = np.round(train[:, :10])
+    new[:, :10] = np.round(new[:, :10])
+    new[:3, 0] = -0.0
+    return train, new
+
+
+def test_ks_matches_scipy(samples):
+    train, new = samples
+    statistic, p_values = KSBaseline.from_features(train).ks_test(new)
+
+    for i in range(train.shape[1]):
+        # the default method, exact at these sizes
+        ref = stats.ks_2samp(train[:, i], new[:, i])
+        assert statistic[i] == pytest.approx(ref.statistic, abs=1e-12)
+        assert p_values[i] == pytest.approx(ref.pvalue, rel=1e-9, abs=1e-12)
+
+
+def test_ks_matches_scipy_across_blocks(samples, monkeypatch):
+    # force several feature blocks so the block offsets get exercised
+    monkeypatch.setattr('drift._BLOCK_ELEMENTS', 1500)
+    train, new = samples
+    statistic, _ = KSBaseline.from_features(train).ks_test(new)
+    expected = [stats.ks_2samp(train[:, i], new[:, i]).statistic for i in range(train.shape[1])]
+    np.testing.assert_allclose(statistic, expected, atol=1e-12)
+
+
+def test_detect_drift_flags_shifted_features(samples):
+    train, _ = samples
+    rng = np.random.default_rng(7)
+    new = rng.normal(size=(200, 30)).astype(np.float32)
+    new[:, 10:20] += 2.0
+
+    result = detect_drift(new[:, 10:], KSBaseline.from_features(train[:, 10:]))
+    flagged = {f['feature_index'] for f in result['drifted_features']}
+    assert flagged == set(range(10))
+    assert result['features_drifted'] == 10
+    assert result['drift_detected']
+
+    # a raw training array still works
+    assert detect_drift(new[:, 10:], train[:, 10:]) == result
+
+
+def test_drifted_set_matches_default_ks_2samp():
+    # SECOM-sized training set against /drift's default 100 rows. with this seed
+    # features 93 and 99 land between the exact and the asymptotic critical
+    # value, and only the exact p-values (ks_2samp's default here) keep them out
+    rng = np.random.default_rng(19)
+    train = rng.normal(size=(1253, 100)).astype(np.float32)
+    new = (rng.normal(size=(100, 100)) + 0.2).astype(np.float32)
+
+    result = detect_drift(new, KSBaseline.from_features(train))
+    p_values = [stats.ks_2samp(train[:, i], new[:, i]).pvalue for i in range(100)]
+    asymp = [stats.ks_2samp(train[:, i], new[:, i], method='asymp').pvalue for i in range(100)]
+    assert asymp[93] < 0.05 and asymp[99] < 0.05
+    assert result['features_drifted'] == sum(p < 0.05 for p in p_values)
+    for feature in result['drifted_features']:
+        assert feature['p_value'] == round(p_values[feature['feature_index']], 6)
+
+
+def test_monitor_window_evicts_oldest():
+    rng = np.random.default_rng(0)
+    monitor = StreamingDriftMonitor(rng.normal(size=(300, 5)), window=50, n_bins=8)
+    monitor.update(rng.normal(size=(30, 5)))
+    for row in rng.normal(size=(40, 5)):
+        monitor.update(row)
+
+    assert monitor.size == 50
+    assert (monitor._counts.sum(axis=1) == 50).all()
+
+
+def test_monitor_tracks_exact_ks(samples):
+    train, _ = samples
+    rng = np.random.default_rng(3)
+    new = rng.normal(size=(500, 30)).astype(np.float32)
+    new[:, 20:] += 1.0
+
+    monitor = StreamingDriftMonitor(train[:, 10:], window=500, n_bins=64)
+    monitor.update(new[:, 10:])
+    result = monitor.result()
+    exact = detect_drift(new[:, 10:], train[:, 10:])
+
+    assert result['samples_compared'] == 500
+    assert result['features_drifted'] == exact['features_drifted'] == 10
+    assert result['drift_detected']
+
+
+def test_monitor_alerts_once_when_threshold_crossed(samples):
+    train, _ = samples
+    rng = np.random.default_rng(5)
+    alerts = []
+    monitor = StreamingDriftMonitor(train[:, 10:], window=100, check_every=5)
+    monitor.on_alert(alerts.append)
+
+    monitor.update(rng.normal(size=(100, 20)))
+    assert alerts == []
+
+    shifted = rng.normal(size=(100, 20)) + 2.0
+    for row in shifted:
+        monitor.update(row)
+    assert len(alerts) == 1
+    assert alerts[0]['drift_score'] > 0.2
+
+
+def test_baseline_round_trips_through_mmap(samples, tmp_path):
+    train, new = samples
+    path = tmp_path / 'train_baseline.npy'
+    KSBaseline.from_features(train).save(path)
+
+    baseline = KSBaseline.load(path)
+    assert isinstance(baseline.sorted, np.memmap)
+    assert baseline.sorted.flags['C_CONTIGUOUS']
+    assert baseline.sorted.shape == (train.shape[1], train.shape[0])
+
+    statistic, _ = baseline.ks_test(new)
+    expected, _ = KSBaseline.from_features(train).ks_test(new)
+    np.testing.assert_array_equal(statistic, expected)
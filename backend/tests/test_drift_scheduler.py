@@ -0,0 +1,60 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pytest
+import database
+from drift import KSBaseline, detect_drift
+from drift_scheduler import DriftScheduler, LEASE_NAME
+
+N_FEATURES = 6
+
+
+@pytest.fixture
+def db(db):
+    """conftest's db with 150 shifted predictions logged."""
+    rng = np.random.default_rng(0)
+    for row in rng.normal(size=(150, N_FEATURES)) + 0.5:
+        database.log_prediction('h', 'pass', 0.9, row, 'v1')
+    return database
+
+
+@pytest.fixture
+def baseline():
+    return KSBaseline.from_features(np.random.default_rng(1).normal(size=(500, N_FEATURES)))
+
+
+def test_checks_every_window_and_stores_them(db, baseline):
+    calls = []
+    scheduler = DriftScheduler(lambda: ('v1', baseline), interval=60, windows=(1000, 50, 100),
+                               on_results=calls.append)
+    results = scheduler.run_once()
+    assert [r['samples_compared'] for r in results] == [50, 100, 150]
+    assert calls == [results]
+
+    # the same numbers a live /drift over the newest 100 rows gives
+    live = detect_drift(db.get_recent_features(100, 'v1'), baseline)
+    stored = db.get_latest_drift(100, 'v1')
+    assert stored['drift_score'] == live['drift_score']
+    assert stored['drifted_features'] == live['drifted_features']
+    assert scheduler.fresh(stored)
+    assert len(db.get_drift_history(1000, 'v1', feature=0)) == 1
+
+
+def test_only_the_lease_holder_runs(db, baseline):
+    calls = []
+    scheduler = DriftScheduler(lambda: calls.append(1) or ('v1', baseline), interval=60, windows=(100,))
+    assert db.acquire_lease(LEASE_NAME, 'another-worker', 180)
+    assert scheduler.run_once() is None
+    assert calls == []
+    assert db.get_latest_drift(100, 'v1') is None
+
+
+def test_disabled_scheduler_never_counts_as_fresh(db, baseline):
+    scheduler = DriftScheduler(lambda: ('v1', baseline), interval=0, windows=(100,))
+    scheduler.start()
+    assert scheduler._thread is None
+    scheduler.run_once()
+    assert not scheduler.fresh(db.get_latest_drift(100, 'v1'))
@@ -0,0 +1,58 @@
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from events import EventBus
+
+
+def test_publish_reaches_every_subscriber(db):
+    bus = EventBus(poll_interval=0.01)
+    first, second = bus.subscribe(), bus.subscribe()
+    bus.publish('feedback', {'id': 1, 'actual_label': 'fail'})
+    assert first.get(1) == [('feedback', {'id': 1, 'actual_label': 'fail'})]
+    assert second.get(1) == [('feedback', {'id': 1, 'actual_label': 'fail'})]
+
+    bus.unsubscribe(first)
+    bus.publish('drift', {})
+    assert first.get(0) == []
+    assert second.get(1) == [('drift', {})]
+    bus.unsubscribe(second)
+
+
+def test_client_cap_and_overflow(db):
+    bus = EventBus(poll_interval=0.01, queue_size=3, max_clients=1)
+    slow = bus.subscribe()
+    assert bus.subscribe() is None
+    assert bus.stats()['rejected'] == 1
+
+    # a client that fell behind gets told to reload instead of a gappy backlog
+    for i in range(5):
+        bus.publish('feedback', {'id': i, 'actual_label': 'pass'})
+    assert slow.get(0) == [('resync', {})]
+    bus.publish('drift', {})
+    assert slow.get(1) == [('drift', {})]
+    bus.unsubscribe(slow)
+
+
+def test_relays_other_processes_events(db):
+    bus = EventBus(poll_interval=0.01)
+    subscription = bus.subscribe()
+    # this process's own writes were published in-process already, only other
+    # origins come through the feed
+    own_id = db.log_prediction('mine', 'pass', 0.9, None, 'v1')
+    other_id = db.log_prediction('theirs', 'fail', 0.8, None, 'v1')
+    conn = db.get_connection()
+    conn.execute('UPDATE events SET origin = ? WHERE prediction_id = ?', (os.getpid() + 1, other_id))
+    conn.commit()
+
+    deadline = time.monotonic() + 2
+    events = []
+    while not events and time.monotonic() < deadline:
+        events = subscription.get(0.1)
+    assert [kind for kind, _ in events] == ['prediction']
+    assert events[0][1]['id'] == other_id
+    assert events[0][1]['input_hash'] == 'theirs'
+    assert own_id != other_id
+    bus.unsubscribe(subscription)
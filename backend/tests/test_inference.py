@@ -0,0 +1,53 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pytest
+import torch.nn as nn
+from sklearn.preprocessing import StandardScaler
+
+from model import DefectClassifier
+from inference import TorchClassifier, NumpyClassifier, export_numpy, optimize_model
+
+
+def test_numpy_engine_matches_torch(tmp_path):
+    rng = np.random.default_rng(0)
+    n_features = 40
+    # raw sensor values with big offsets and very different spreads, like SECOM
+    offsets = rng.uniform(-3000, 3000, n_features)
+    spreads = rng.uniform(0.01, 50, n_features)
+    X = rng.normal(size=(300, n_features)) * spreads + offsets
+
+    model = DefectClassifier(n_features).eval()
+    scaler = StandardScaler().fit(X)
+    layers = [
+        (layer.weight.detach().numpy(), layer.bias.detach().numpy())
+        for layer in model.network if isinstance(layer, nn.Linear)
+    ]
+    path = tmp_path / 'model_numpy.npz'
+    export_numpy(layers, scaler.mean_, scaler.scale_, path)
+
+    torch_scaled, torch_conf = TorchClassifier(model, scaler).score(X)
+    numpy_scaled, numpy_conf = NumpyClassifier.load(path).score(X)
+
+    np.testing.assert_allclose(numpy_scaled, torch_scaled, atol=1e-9)
+    np.testing.assert_allclose(numpy_conf, torch_conf, atol=1e-5)
+
+
+def test_optimized_modes_stay_close_to_eager():
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(200, 30))
+    scaler = StandardScaler().fit(X)
+    model = DefectClassifier(30).eval()
+    _, eager = TorchClassifier(model, scaler).score(X)
+
+    _, script = TorchClassifier(optimize_model(model, 'script', 30), scaler, 'script').score(X)
+    np.testing.assert_allclose(script, eager, atol=1e-6)
+    # int8 weights, so only roughly the same
+    _, int8 = TorchClassifier(optimize_model(model, 'int8', 30), scaler, 'int8').score(X[:1])
+    np.testing.assert_allclose(int8, eager[:1], atol=0.05)
+
+    with pytest.raises(ValueError, match='torch mode'):
+        optimize_model(model, 'fp16', 30)
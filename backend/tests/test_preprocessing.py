@@ -0,0 +1,61 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+import pytest
+from preprocessing import load_and_clean, prepare_features, build_sample_pool, scan_csv, preprocess_streaming, cleaning_params
+
+
+def write_csv(path, n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    X = (rng.normal(size=(n_rows, 6)) * [1, 10, 100, 0.1, 5, 1] + [0, 50, -20, 1, 0, 3]).astype(np.float32)
+    X[rng.random(X.shape) < 0.1] = np.nan
+    X[:, 4][rng.random(n_rows) < 0.8] = np.nan   # gets dropped
+    X[:, 5] = 3                                  # constant
+    df = pd.DataFrame(X, columns=[f'f{i}' for i in range(6)])
+    df.insert(0, 'Time', '2008-07-19 11:55:00')
+    df['Pass/Fail'] = np.where(rng.random(n_rows) < 0.1, 1, -1)
+    df.to_csv(path, index=False)
+
+
+def test_streaming_matches_in_memory(tmp_path):
+    path = tmp_path / 'secom.csv'
+    write_csv(path, 500)
+    df = load_and_clean(path)
+    X, y, scaler = prepare_features(df)
+
+    # chunks that don't divide the row count
+    X_stream, y_stream, stream_scaler, stats = preprocess_streaming(path, str(tmp_path / 'scaled.npy'), chunksize=70)
+    assert isinstance(X_stream, np.memmap)
+    np.testing.assert_allclose(X_stream, X, atol=1e-4)
+    np.testing.assert_array_equal(y_stream, y)
+    np.testing.assert_allclose(stream_scaler.mean, scaler.mean_, rtol=1e-6)
+    np.testing.assert_allclose(stream_scaler.scale, scaler.scale_, rtol=1e-5)
+    # the reservoir holds every row of a file this small
+    np.testing.assert_allclose(stats['sample'], build_sample_pool(df), rtol=1e-6)
+    assert stats['columns'] == list(df.columns.drop('Pass/Fail'))
+
+
+def test_sample_stays_bounded_for_big_files(tmp_path):
+    path = tmp_path / 'secom.csv'
+    write_csv(path, 3000, seed=1)
+    stats = scan_csv(path, chunksize=500, sample_size=400)
+    assert stats['sample'].shape == (400, 5)
+    exact = load_and_clean(path).drop(columns=['Pass/Fail']).to_numpy()
+    full_median = pd.read_csv(path).drop(columns=['Time', 'Pass/Fail', 'f4']).median().to_numpy()
+    # approximate medians from 400 of 3000 rows, within a fraction of a standard deviation
+    assert np.all(np.abs(stats['median'] - full_median) <= 0.2 * exact.std(axis=0) + 1e-6)
+    assert stats['missing_fraction'][0] == pytest.approx(0.1, abs=0.03)
+
+
+def test_cleaning_params_are_the_training_fill_values(tmp_path):
+    path = tmp_path / 'secom.csv'
+    write_csv(path, 301)
+    columns, fill_values = cleaning_params(load_and_clean(path))
+    raw = pd.read_csv(path)
+    assert columns == ['f0', 'f1', 'f2', 'f3', 'f5']
+    # the medians load_and_clean filled in, recovered from its output
+    np.testing.assert_allclose(fill_values, raw[columns].median().to_numpy())
@@ -0,0 +1,55 @@
+import sys
+import os
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+import registry
+
+
+def make_version(models_dir, version):
+    path = models_dir / 'versions' / version
+    path.mkdir(parents=True)
+    (path / 'metadata.json').write_text(json.dumps({'n_features': 4}))
+
+
+def test_active_version_round_trip(tmp_path):
+    assert registry.active_version(str(tmp_path)) is None
+    make_version(tmp_path, '20240101-000000')
+    make_version(tmp_path, '20240102-000000')
+    registry.set_active('20240102-000000', str(tmp_path))
+    assert registry.active_version(str(tmp_path)) == '20240102-000000'
+    assert registry.list_versions(str(tmp_path)) == ['20240101-000000', '20240102-000000']
+    # no temp files left behind by the rename
+    assert sorted(os.listdir(tmp_path)) == ['ACTIVE', 'versions']
+
+
+def test_set_active_needs_a_trained_version(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        registry.set_active('missing', str(tmp_path))
+
+
+@pytest.mark.parametrize('version', ['../x', 'a/b', '', '.hidden', None])
+def test_rejects_unsafe_version_names(version, tmp_path):
+    with pytest.raises(ValueError):
+        registry.version_dir(version, str(tmp_path))
+
+
+def test_torch_mode_needs_a_passed_parity_check(tmp_path):
+    import torch
+    from model import DefectClassifier
+    from inference import ArrayScaler
+    import numpy as np
+
+    make_version(tmp_path, 'v1')
+    path = tmp_path / 'versions' / 'v1'
+    torch.save(DefectClassifier(4).state_dict(), path / registry.MODEL_FILE)
+    ArrayScaler(np.zeros(4), np.ones(4)).save(str(path / registry.SCALER_FILE))
+
+    # no inference_modes in the metadata, so an older version runs eager
+    assert registry.load_bundle(str(tmp_path), 'v1', 'torch', 'int8').engine.mode == 'eager'
+    modes = {'eager': {}, 'int8': {'accepted': True}, 'script': {'accepted': False}}
+    (path / 'metadata.json').write_text(json.dumps({'n_features': 4, 'inference_modes': modes}))
+    assert registry.load_bundle(str(tmp_path), 'v1', 'torch', 'int8').engine.mode == 'int8'
+    assert registry.load_bundle(str(tmp_path), 'v1', 'torch', 'script').engine.mode == 'eager'
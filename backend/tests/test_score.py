@@ -0,0 +1,116 @@
+import sys
+import os
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+import pytest
+import database
+import registry
+import score
+from cache import feature_key
+from inference import NumpyClassifier, export_numpy
+from preprocessing import save_columns
+
+COLUMNS = ['s0', 's2', 's3']
+FILL = np.array([1.0, -2.0, 0.5])
+
+
+@pytest.fixture
+def models_dir(tmp_path):
+    """A numpy-engine version that takes sensors s0, s2 and s3 of a four-sensor export."""
+    rng = np.random.default_rng(0)
+    models_dir = tmp_path / 'models'
+    out = models_dir / 'versions' / 'v1'
+    out.mkdir(parents=True)
+    sizes = [3, 8, 1]
+    layers = [(rng.normal(size=(o, i)), rng.normal(size=o)) for i, o in zip(sizes, sizes[1:])]
+    export_numpy(layers, np.zeros(3), np.ones(3), out / 'model_numpy.npz')
+    (out / 'metadata.json').write_text(json.dumps({'n_features': 3, 'version': 'v1'}))
+    save_columns(out / registry.COLUMNS_FILE, COLUMNS, FILL)
+    registry.set_active('v1', str(models_dir))
+    return str(models_dir)
+
+
+def write_export(path, n_rows, seed=1):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_rows, 4))
+    X[rng.random(X.shape) < 0.2] = np.nan
+    df = pd.DataFrame(X, columns=['s0', 's1', 's2', 's3'])
+    df.insert(0, 'Time', [f'lot-{i}' for i in range(n_rows)])
+    df['Pass/Fail'] = -1
+    df.to_csv(path, index=False)
+    return df
+
+
+def expected(df, models_dir):
+    X = df[COLUMNS].to_numpy()
+    X = np.where(np.isnan(X), FILL, X)
+    proba = NumpyClassifier.load(os.path.join(models_dir, 'versions', 'v1', 'model_numpy.npz')).predict_proba(X)
+    return X, proba
+
+
+def test_csv_rows_match_the_model_in_order(tmp_path, models_dir):
+    df = write_export(tmp_path / 'lots.csv', 500)
+    out = tmp_path / 'scored.csv'
+    # small chunks, so the byte ranges split mid-file many times
+    summary = score.score_file(str(tmp_path / 'lots.csv'), str(out), models_dir, id_column='Time', chunk_bytes=2000)
+    assert summary['rows'] == 500
+    assert summary['model_version'] == 'v1'
+
+    result = pd.read_csv(out, dtype={'input_hash': str})
+    X, proba = expected(df, models_dir)
+    assert result['row'].tolist() == list(range(500))
+    assert result['Time'].tolist() == df['Time'].tolist()
+    assert result['prediction'].tolist() == ['fail' if p >= 0.5 else 'pass' for p in proba]
+    np.testing.assert_allclose(result['confidence'], np.round(np.where(proba >= 0.5, proba, 1 - proba), 4))
+    assert result['input_hash'][3] == feature_key(X[3]).hex()[:12]
+
+
+def test_id_values_are_quoted(tmp_path, models_dir):
+    df = write_export(tmp_path / 'lots.csv', 20)
+    df['Time'] = [f'lot {i}, "rework"' for i in range(20)]
+    df.to_csv(tmp_path / 'lots.csv', index=False)
+    score.score_file(str(tmp_path / 'lots.csv'), str(tmp_path / 'scored.csv'), models_dir, id_column='Time')
+
+    result = pd.read_csv(tmp_path / 'scored.csv', dtype={'input_hash': str})
+    assert result.columns.tolist() == ['row', 'Time', 'input_hash', 'prediction', 'confidence']
+    assert result['Time'].tolist() == df['Time'].tolist()
+    assert result['row'].tolist() == list(range(20))
+
+
+def test_process_pool_gives_the_same_output(tmp_path, models_dir):
+    write_export(tmp_path / 'lots.csv', 300)
+    score.score_file(str(tmp_path / 'lots.csv'), str(tmp_path / 'one.csv'), models_dir, chunk_bytes=1500)
+    score.score_file(str(tmp_path / 'lots.csv'), str(tmp_path / 'two.csv'), models_dir, workers=2, chunk_bytes=1500)
+    assert (tmp_path / 'one.csv').read_text() == (tmp_path / 'two.csv').read_text()
+
+
+def test_npy_input_and_db_import(tmp_path, monkeypatch, models_dir, db):
+    df = write_export(tmp_path / 'lots.csv', 50)
+    np.save(tmp_path / 'rows.npy', df[COLUMNS].to_numpy())
+    score.score_file(str(tmp_path / 'rows.npy'), str(tmp_path / 'scored.csv'), models_dir)
+    score.score_file(str(tmp_path / 'lots.csv'), str(tmp_path / 'from_csv.csv'), models_dir)
+    assert (tmp_path / 'scored.csv').read_text() == (tmp_path / 'from_csv.csv').read_text()
+
+    database.log_prediction('api', 'pass', 0.9)
+    # several transactions, with the api logging in between
+    monkeypatch.setattr(database, 'IMPORT_COMMIT_ROWS', 20)
+    start, end = score.import_results(str(tmp_path / 'scored.csv'), 50, 'v1')
+    # after the block the api process reserved
+    assert end - start == 50 and start > 1
+    assert database.get_metrics()['total_predictions'] == 51
+    assert database.get_predictions(1)[0]['model_version'] == 'v1'
+    assert [p['id'] for p in database.get_predictions(50)] == list(range(end - 1, start - 1, -1))
+    assert [kind for _, kind, _ in database.get_events(0)].count('resync') == 1
+
+    with pytest.raises(ValueError, match='more than the 49 rows'):
+        score.import_results(str(tmp_path / 'scored.csv'), 49, 'v1')
+
+
+def test_missing_columns_are_reported(tmp_path, models_dir):
+    pd.DataFrame({'s0': [1.0], 's2': [2.0]}).to_csv(tmp_path / 'short.csv', index=False)
+    with pytest.raises(SystemExit, match='missing 1 columns'):
+        score.score_file(str(tmp_path / 'short.csv'), str(tmp_path / 'out.csv'), models_dir)
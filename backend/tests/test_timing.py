@@ -0,0 +1,56 @@
+import sys
+import os
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import timing
+
+
+def test_histograms_merge_across_threads():
+    timing.reset()
+
+    def record():
+        for _ in range(100):
+            timing.observe('test.stage', 0.002)
+
+    threads = [threading.Thread(target=record) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    counts, total = timing.snapshot()[('semiguard_stage_seconds', 'test.stage')]
+    assert sum(counts) == 400
+    assert abs(total - 0.8) < 1e-9
+    # 0.002 lands in the 2.5ms bucket
+    assert counts[timing.BUCKETS.index(0.0025)] == 400
+
+
+def test_prometheus_buckets_are_cumulative():
+    timing.reset()
+    timing.observe('test.stage', 0.00001)
+    timing.observe('test.stage', 0.003)
+    timing.observe('test.stage', 60)
+    text = timing.render_prometheus([('test_gauge', 'gauge', 'a gauge', 7)])
+
+    assert '# TYPE semiguard_stage_seconds histogram' in text
+    assert f'stage="test.stage",worker="{os.getpid()}",le="2.5e-05"}} 1' in text
+    assert 'le="0.005"} 2' in text
+    assert 'le="10"} 2' in text
+    assert 'le="+Inf"} 3' in text
+    assert f'semiguard_stage_seconds_count{{stage="test.stage",worker="{os.getpid()}"}} 3' in text
+    assert f'test_gauge{{worker="{os.getpid()}"}} 7' in text
+
+
+def test_stopwatch_records_laps():
+    timing.reset()
+    stopwatch = timing.Stopwatch()
+    stopwatch.lap('test.a')
+    with timing.span('test.b'):
+        pass
+    stopwatch.lap('test.c')
+
+    assert [stage for stage, _ in stopwatch.laps] == ['test.a', 'test.c']
+    merged = timing.snapshot()
+    assert {name for _, name in merged} == {'test.a', 'test.b', 'test.c'}
@@ -0,0 +1,111 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import json
+
+import numpy as np
+import pytest
+import torch
+from drift import KSBaseline
+from train import MemmapRows, check_inference_modes, fit, iterate_batches, save_training_arrays, to_tensors
+
+CONFIG = {'lr': 0.001, 'batch_size': 32, 'dropout': 0.3}
+
+
+def make_split(rng, n, n_features=10):
+    X = rng.normal(size=(n, n_features))
+    y = (rng.random(n) < 0.2).astype(int)
+    y[:2] = 1
+    return to_tensors(X, y)
+
+
+def test_batches_cover_every_row_once():
+    X, y = to_tensors(np.arange(100, dtype=float).reshape(50, 2), np.arange(50))
+    batches = list(iterate_batches(X, y, 16, torch.Generator().manual_seed(0)))
+    assert [len(b[0]) for b in batches] == [16, 16, 16, 2]
+    seen = torch.cat([b[1] for b in batches])
+    assert sorted(seen.tolist()) == list(range(50))
+    # rows and labels stay paired through the shuffle
+    for X_batch, y_batch in batches:
+        assert torch.equal(X_batch[:, 0], y_batch * 2)
+
+
+def test_fit_stops_on_plateau_and_keeps_best_epoch():
+    rng = np.random.default_rng(0)
+    # labels are noise, so validation recall stops improving quickly
+    model, summary = fit(*make_split(rng, 200), *make_split(rng, 60), CONFIG, max_epochs=100, patience=3, verbose=False)
+    assert summary['epochs_run'] < 100
+    assert summary['epochs_run'] - summary['best_epoch'] == 3
+    assert not model.training
+
+
+def test_fit_without_patience_runs_every_epoch():
+    rng = np.random.default_rng(1)
+    _, summary = fit(*make_split(rng, 100), *make_split(rng, 30), CONFIG, max_epochs=4, patience=0, verbose=False)
+    assert summary['epochs_run'] == 4
+
+
+def test_fit_with_no_epochs_keeps_the_initial_weights():
+    rng = np.random.default_rng(2)
+    model, summary = fit(*make_split(rng, 100), *make_split(rng, 30), CONFIG, max_epochs=0, verbose=False)
+    assert summary['epochs_run'] == 0
+    assert summary['best_epoch'] == 0
+    assert not model.training
+
+
+def test_inference_modes_are_checked_against_eager():
+    rng = np.random.default_rng(2)
+    model, _ = fit(*make_split(rng, 200), *make_split(rng, 60), CONFIG, max_epochs=3, patience=0, verbose=False)
+    X_test, y_test = make_split(rng, 100)
+
+    checks = check_inference_modes(model, X_test, y_test)
+    assert list(checks) == ['eager', 'script', 'int8']
+    assert checks['eager']['labels_changed'] == 0
+    assert checks['script']['max_proba_diff'] < 1e-5
+    assert checks['script']['accepted']
+    # a tolerance nothing can meet rejects every optimized mode
+    strict = check_inference_modes(model, X_test, y_test, tolerance=-1)
+    assert not strict['script']['accepted'] and not strict['int8']['accepted']
+
+
+def test_memmap_rows_train_like_tensors(tmp_path):
+    rng = np.random.default_rng(3)
+    X = rng.normal(size=(300, 10)).astype(np.float32)
+    y = (rng.random(300) < 0.2).astype(np.int8)
+    np.save(tmp_path / 'scaled.npy', X)
+    fit_rows, val_rows = rng.permutation(300)[:200], np.arange(200, 300)
+
+    fit_split = MemmapRows(str(tmp_path / 'scaled.npy'), y, fit_rows)
+    val_split = MemmapRows(str(tmp_path / 'scaled.npy'), y, val_rows)
+    assert fit_split.shape == (200, 10)
+    # the same shuffle, with only each batch's rows read off the file
+    generator = torch.Generator().manual_seed(0)
+    batch_X, batch_y = next(iterate_batches(fit_split, fit_split.labels, 32, generator))
+    rows = fit_rows[torch.randperm(200, generator=torch.Generator().manual_seed(0))[:32].numpy()]
+    np.testing.assert_array_equal(batch_X.numpy(), X[rows])
+    np.testing.assert_array_equal(batch_y.numpy(), y[rows])
+
+    _, from_disk = fit(fit_split, fit_split.labels, val_split, val_split.labels, CONFIG, max_epochs=3, verbose=False)
+    _, in_memory = fit(*to_tensors(X[fit_rows], y[fit_rows]), *to_tensors(X[val_rows], y[val_rows]), CONFIG,
+                       max_epochs=3, verbose=False)
+    assert from_disk['val_loss'] == pytest.approx(in_memory['val_loss'], rel=1e-5)
+    assert from_disk['best_epoch'] == in_memory['best_epoch']
+
+
+def test_training_arrays_are_written_in_chunks(tmp_path):
+    rng = np.random.default_rng(4)
+    X = rng.normal(size=(250, 6))
+    rows = rng.permutation(250)[:180]
+    save_training_arrays(X, rows, str(tmp_path), chunksize=50)
+
+    X_train = X[rows]
+    features = np.load(tmp_path / 'train_features.npy')
+    assert features.flags['F_CONTIGUOUS']
+    np.testing.assert_array_equal(features, X_train.astype(np.float32))
+    baseline = KSBaseline.load(tmp_path / 'train_baseline.npy')
+    np.testing.assert_array_equal(baseline.sorted, KSBaseline.from_features(X_train).sorted)
+    stats = json.loads((tmp_path / 'baseline_stats.json').read_text())
+    np.testing.assert_allclose(stats['means'], X_train.mean(axis=0), atol=1e-12)
+    np.testing.assert_allclose(stats['stds'], X_train.std(axis=0), rtol=1e-9)
@@ -0,0 +1,51 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pytest
+from flask import Flask
+
+import wire
+
+
+def test_round_trip_keeps_values_and_shape():
+    X = np.random.default_rng(0).normal(size=(3, 5))
+    np.testing.assert_array_equal(wire.decode(wire.encode(X)), X)
+
+    # float32 bodies come back as the same values in float64
+    X32 = X.astype(np.float32)
+    decoded = wire.decode(wire.encode(X32))
+    assert decoded.dtype == np.float64
+    np.testing.assert_array_equal(decoded, X32.astype(np.float64))
+
+    # a single row is sent as a 1 x n matrix
+    assert wire.decode(wire.encode([1.0, 2.0])).shape == (1, 2)
+
+
+@pytest.mark.parametrize('body, message', [
+    (b'SG', 'shorter'),
+    (b'XX' + wire.encode([1.0])[2:], 'not a version'),
+    (wire.HEADER.pack(wire.MAGIC, wire.VERSION, 2, 1, 1) + b'\0\0', 'itemsize'),
+    (wire.encode(np.ones((2, 3)))[:-8], 'body has'),
+])
+def test_malformed_bodies_are_rejected(body, message):
+    with pytest.raises(wire.WireError, match=message):
+        wire.decode(body)
+
+
+def test_finite_rows():
+    X = np.array([[1.0, 2.0], [np.nan, 1.0], [np.inf, 0.0], [3.0, 4.0]])
+    assert wire.finite_rows(X).tolist() == [True, False, False, True]
+
+
+def test_json_provider_matches_the_standard_one():
+    app = Flask(__name__)
+    app.json = wire.FastJSONProvider(app)
+    obj = {'b': [1, 2.5, None], 'a': 'x', 'n': np.float32(0.5)}
+    with app.app_context():
+        assert app.json.loads(app.json.dumps(obj)) == {'a': 'x', 'b': [1, 2.5, None], 'n': 0.5}
+        resp = app.json.response(obj)
+        assert resp.mimetype == 'application/json'
+        assert resp.get_data().endswith(b'\n')
@@ -0,0 +1,160 @@
+"""Latency histograms for the request hot paths, exported in Prometheus text format.
+
+Every thread records into histograms only it writes to, so timing a stage
+takes no lock. GET /stats sums them across threads when it's scraped. The
+numbers are per worker process.
+"""
+import bisect
+import os
+import threading
+import time
+
+# bucket upper bounds in seconds, 25us to 10s
+BUCKETS = (
+    0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# metric family -> (label name, help text)
+FAMILIES = {
+    'semiguard_stage_seconds': ('stage', 'Time spent in each stage of handling a request'),
+    'semiguard_request_seconds': ('endpoint', 'Time from the start to the end of a request'),
+}
+
+_local = threading.local()
+# one dict per thread that has recorded anything, kept after the thread exits
+# so the counters never go backwards
+_thread_histograms = []
+_register_lock = threading.Lock()
+
+
+class _Histogram:
+    __slots__ = ('counts', 'total')
+
+    def __init__(self):
+        # one slot per bucket plus +Inf, not cumulative until exported
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+
+
+def _histograms():
+    try:
+        return _local.histograms
+    except AttributeError:
+        histograms = _local.histograms = {}
+        with _register_lock:
+            _thread_histograms.append(histograms)
+        return histograms
+
+
+def observe(name, seconds, family='semiguard_stage_seconds'):
+    """Record one duration for a stage (or, with family, an endpoint)."""
+    histograms = _histograms()
+    hist = histograms.get((family, name))
+    if hist is None:
+        hist = histograms[(family, name)] = _Histogram()
+    hist.observe(seconds)
+
+
+class span:
+    """Time a block: `with timing.span('model.forward'): ...`"""
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Stopwatch:
+    """Times the consecutive stages of one request.
+
+    lap(stage) records the time since the previous lap (or since the stopwatch
+    was created) and keeps it in laps, so a sampled log line can show where
+    that particular request spent its time.
+    """
+
+    __slots__ = ('start', '_last', 'laps')
+
+    def __init__(self):
+        self.start = self._last = time.perf_counter()
+        self.laps = []
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        seconds = now - self._last
+        self._last = now
+        observe(stage, seconds)
+        self.laps.append((stage, seconds))
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+
+def snapshot():
+    """Every histogram summed across threads: {(family, name): (counts, total)}."""
+    with _register_lock:
+        per_thread = list(_thread_histograms)
+    merged = {}
+    for histograms in per_thread:
+        # copied in one step, the owning thread may add a stage meanwhile
+        for key, hist in dict(histograms).items():
+            counts, total = merged.get(key, ([0] * (len(BUCKETS) + 1), 0.0))
+            merged[key] = ([a + b for a, b in zip(counts, hist.counts)], total + hist.total)
+    return merged
+
+
+def _bound(le):
+    return f'{le:g}'
+
+
+def render_prometheus(extra=None):
+    """Prometheus text exposition of every histogram, labelled with this worker's pid.
+
+    extra is a list of (name, type, help, value) samples appended as is, for
+    gauges and counters that live elsewhere.
+    """
+    worker = os.getpid()
+    merged = snapshot()
+    lines = []
+    for family, (label, help_text) in FAMILIES.items():
+        keys = sorted(key for key in merged if key[0] == family)
+        if not keys:
+            continue
+        lines.append(f'# HELP {family} {help_text}')
+        lines.append(f'# TYPE {family} histogram')
+        for key in keys:
+            counts, total = merged[key]
+            labels = f'{label}="{key[1]}",worker="{worker}"'
+            cumulative = 0
+            for le, count in zip(BUCKETS, counts):
+                cumulative += count
+                lines.append(f'{family}_bucket{{{labels},le="{_bound(le)}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{family}_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f'{family}_sum{{{labels}}} {total:.9g}')
+            lines.append(f'{family}_count{{{labels}}} {cumulative}')
+    for name, kind, help_text, value in extra or []:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.append(f'{name}{{worker="{worker}"}} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """Forget everything recorded so far (tests)."""
+    with _register_lock:
+        for histograms in _thread_histograms:
+            histograms.clear()
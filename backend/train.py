@@ -1,114 +1,420 @@
 import torch
 import torch.nn as nn
-from torch.utils.data import DataLoader, TensorDataset
 import numpy as np
+import argparse
+import itertools
 import json
+import multiprocessing
 import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 from sklearn.metrics import classification_report, confusion_matrix
+from torch.utils.data import DataLoader, Dataset
 
-from preprocessing import load_and_clean, prepare_features, split_data
+from preprocessing import (load_and_clean, prepare_features, split_data, build_sample_pool, preprocess_streaming,
+                           cleaning_params, save_columns, CHUNK_ROWS)
 from model import DefectClassifier
+from inference import export_numpy, optimize_model, ArrayScaler, TORCH_MODES
+from registry import new_version, version_dir, set_active, COLUMNS_FILE
 
+DATA_PATH = '../data/uci-secom.csv'
 
-def make_loaders(X_train, y_train, X_test, y_test, batch_size=64):
-    train_ds = TensorDataset(
-        torch.FloatTensor(X_train),
-        torch.FloatTensor(y_train)
-    )
-    test_ds = TensorDataset(
-        torch.FloatTensor(X_test),
-        torch.FloatTensor(y_test)
-    )
-    train_loader = DataLoader(train_ds, batch_size=batch_size, shuffle=True)
-    test_loader = DataLoader(test_ds, batch_size=batch_size)
-    return train_loader, test_loader
+DEFAULT_CONFIG = {'lr': 0.001, 'batch_size': 64, 'dropout': 0.3}
 
+# how far below eager an optimized torch mode's test fail recall may drop and
+# still be served. SECOM's test split has ~20 fails, so this allows no misses
+MODE_TOLERANCE = 0.02
 
-def train():
-    # load and prep data
-    df = load_and_clean('../data/uci-secom.csv')
-    X, y, scaler = prepare_features(df, scaler_path='../models/scaler.pkl')
-    X_train, X_test, y_train, y_test = split_data(X, y)
+# configurations tried by --search, every combination of these
+SEARCH_GRID = {
+    'lr': [0.001, 0.0003],
+    'batch_size': [32, 64, 128],
+    'dropout': [0.2, 0.3],
+}
+
+
+# rows per forward pass when validating or testing a MemmapRows split
+EVAL_BATCH_ROWS = 4096
+
+
+def to_tensors(X, y):
+    """The whole split as two float32 tensors, built once and sliced per batch."""
+    return torch.as_tensor(np.asarray(X, dtype=np.float32)), torch.as_tensor(np.asarray(y, dtype=np.float32))
+
+
+class MemmapRows(Dataset):
+    """Some rows of a scaled .npy on disk, picked by index and read a batch at a time.
+
+    What --stream trains on instead of to_tensors(), so a split is only an
+    index array. Items are whole batches: a list of positions in, the features
+    and labels of those rows out. Pickles as the path, so --search workers map
+    the file themselves.
+    """
+
+    def __init__(self, path, y, indices):
+        self.path = path
+        self.indices = np.asarray(indices)
+        self.labels = torch.as_tensor(np.asarray(y)[self.indices], dtype=torch.float32)
+        self._X = None
+
+    @property
+    def X(self):
+        if self._X is None:
+            self._X = np.load(self.path, mmap_mode='r')
+        return self._X
+
+    @property
+    def shape(self):
+        return len(self.indices), self.X.shape[1]
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, positions):
+        positions = np.asarray(positions)
+        return torch.as_tensor(self.X[self.indices[positions]]), self.labels[positions]
+
+    def __getstate__(self):
+        return dict(self.__dict__, _X=None)
+
+
+def iterate_batches(X, y, batch_size, generator):
+    """Shuffle with one gather per epoch, then hand out contiguous slices (views, no copies).
+
+    A MemmapRows split gets the same shuffle, but only reads each batch's rows.
+    """
+    perm = torch.randperm(len(X), generator=generator)
+    if isinstance(X, MemmapRows):
+        # a throwaway generator for the loader's worker seed, drawing it from the
+        # global RNG would shift the dropout masks
+        yield from DataLoader(X, sampler=perm.split(batch_size), batch_size=None, generator=torch.Generator())
+        return
+    X, y = X[perm], y[perm]
+    for start in range(0, len(X), batch_size):
+        yield X[start:start + batch_size], y[start:start + batch_size]
 
-    n_features = X_train.shape[1]
-    train_loader, test_loader = make_loaders(X_train, y_train, X_test, y_test)
+
+def forward(model, X):
+    """model's logits for every row of a tensor or MemmapRows split, in order."""
+    with torch.no_grad():
+        if not isinstance(X, MemmapRows):
+            return model(X).squeeze(1)
+        batches = DataLoader(X, sampler=torch.arange(len(X)).split(EVAL_BATCH_ROWS), batch_size=None,
+                             generator=torch.Generator())
+        return torch.cat([model(X_batch).squeeze(1) for X_batch, _ in batches])
+
+
+def fail_recall(labels, preds):
+    n_fail = (labels == 1).sum()
+    return float(((preds == 1) & (labels == 1)).sum() / n_fail) if n_fail else 0.0
+
+
+def validate(model, X_val, y_val, criterion):
+    """Validation loss and fail recall, in one forward pass over the whole split."""
+    model.eval()
+    output = forward(model, X_val)
+    loss = criterion(output, y_val).item()
+    preds = (output >= 0).int().numpy()
+    return loss, fail_recall(y_val.int().numpy(), preds)
+
+
+def fit(X_train, y_train, X_val, y_val, config, max_epochs=50, patience=10, seed=0, verbose=True):
+    """Train one configuration, stopping once validation fail recall stops improving.
+
+    X_* and y_* are tensors from to_tensors(), or a MemmapRows split for X_*
+    and its labels for y_*. An epoch counts as better when
+    its fail recall is higher, or equal with a lower validation loss. After
+    patience epochs without one, training stops and the best epoch's weights
+    are restored. patience 0 always runs max_epochs.
+
+    Returns the model and a summary dict for the metadata.
+    """
+    torch.manual_seed(seed)
+    generator = torch.Generator().manual_seed(seed)
 
     # weight the loss to handle class imbalance
     # pos_weight = num_negative / num_positive
-    n_pos = sum(y_train == 1)
-    n_neg = sum(y_train == 0)
+    n_pos = y_train.sum().item()
+    n_neg = len(y_train) - n_pos
     pos_weight = torch.tensor([n_neg / n_pos])
-    print(f"\npos_weight: {pos_weight.item():.2f} (compensating for {n_neg}:{n_pos} imbalance)")
 
-    model = DefectClassifier(n_features)
+    model = DefectClassifier(X_train.shape[1], dropout=config['dropout'])
     criterion = nn.BCEWithLogitsLoss(pos_weight=pos_weight)
-    optimizer = torch.optim.Adam(model.parameters(), lr=0.001)
+    optimizer = torch.optim.Adam(model.parameters(), lr=config['lr'])
 
-    # training loop
-    epochs = 50
-    for epoch in range(epochs):
+    best = None
+    # the untrained weights, kept if no epoch runs
+    best_state = {k: v.clone() for k, v in model.state_dict().items()}
+    stale = 0
+    epochs_run = 0
+    for epoch in range(max_epochs):
+        epochs_run = epoch + 1
         model.train()
         epoch_loss = 0
-        for X_batch, y_batch in train_loader:
+        n_batches = 0
+        for X_batch, y_batch in iterate_batches(X_train, y_train, config['batch_size'], generator):
             optimizer.zero_grad()
-            output = model(X_batch).squeeze()
+            output = model(X_batch).squeeze(1)
             loss = criterion(output, y_batch)
             loss.backward()
             optimizer.step()
             epoch_loss += loss.item()
+            n_batches += 1
+
+        val_loss, val_recall = validate(model, X_val, y_val, criterion)
+        if best is None or val_recall > best['val_fail_recall'] or (
+                val_recall == best['val_fail_recall'] and val_loss < best['val_loss']):
+            best = {'best_epoch': epoch + 1, 'val_fail_recall': val_recall, 'val_loss': val_loss}
+            best_state = {k: v.clone() for k, v in model.state_dict().items()}
+            stale = 0
+        else:
+            stale += 1
+
+        if verbose and (epoch + 1) % 5 == 0:
+            print(f"Epoch {epoch+1}/{max_epochs} - loss: {epoch_loss / n_batches:.4f} "
+                  f"- val loss: {val_loss:.4f} - val fail recall: {val_recall:.3f}")
+        if patience and stale >= patience:
+            if verbose:
+                print(f"Stopping early after epoch {epoch+1}, best was epoch {best['best_epoch']}")
+            break
+
+    model.load_state_dict(best_state)
+    model.eval()
+    if best is None:
+        val_loss, val_recall = validate(model, X_val, y_val, criterion)
+        best = {'best_epoch': 0, 'val_fail_recall': val_recall, 'val_loss': val_loss}
+    summary = dict(best, epochs_run=epochs_run, pos_weight=pos_weight.item(), **config)
+    return model, summary
+
+
+# set in each search worker by _init_search_worker, so the data is sent once per process
+_search_data = None
+
+
+def _init_search_worker(data, threads):
+    global _search_data
+    _search_data = [a if isinstance(a, MemmapRows) else torch.as_tensor(a) for a in data]
+    torch.set_num_threads(threads)
 
-        if (epoch + 1) % 5 == 0:
-            avg_loss = epoch_loss / len(train_loader)
-            print(f"Epoch {epoch+1}/{epochs} - loss: {avg_loss:.4f}")
+
+def _fit_config(args):
+    config, max_epochs, patience = args
+    start = time.perf_counter()
+    model, summary = fit(*_search_data, config, max_epochs, patience, verbose=False)
+    summary['seconds'] = round(time.perf_counter() - start, 2)
+    return summary, model.state_dict()
+
+
+def search(X_train, y_train, X_val, y_val, max_epochs, patience, workers, threads):
+    """Train every SEARCH_GRID configuration across a process pool and keep the best.
+
+    Best means the highest validation fail recall, then the lowest validation
+    loss. Returns the best model and the list of all summaries, best first.
+    """
+    configs = [dict(zip(SEARCH_GRID, values)) for values in itertools.product(*SEARCH_GRID.values())]
+    data = [t if isinstance(t, MemmapRows) else t.numpy() for t in (X_train, y_train, X_val, y_val)]
+    print(f"\nSearching {len(configs)} configurations on {workers} processes x {threads} threads")
+
+    # spawn instead of fork: forking a process that has already used torch's thread pool can hang
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_search_worker, initargs=(data, threads)) as pool:
+        results = list(pool.map(_fit_config, [(c, max_epochs, patience) for c in configs]))
+
+    results.sort(key=lambda r: (-r[0]['val_fail_recall'], r[0]['val_loss']))
+    for summary, _ in results:
+        print(f"  lr={summary['lr']} batch_size={summary['batch_size']} dropout={summary['dropout']}: "
+              f"val fail recall {summary['val_fail_recall']:.3f}, val loss {summary['val_loss']:.4f}, "
+              f"{summary['epochs_run']} epochs, {summary['seconds']}s")
+
+    best_summary, best_state = results[0]
+    model = DefectClassifier(X_train.shape[1], dropout=best_summary['dropout'])
+    model.load_state_dict(best_state)
+    model.eval()
+    return model, [summary for summary, _ in results]
+
+
+def check_inference_modes(model, X_test, y_test, tolerance=MODE_TOLERANCE):
+    """Test-split fail recall of the model in each inference.TORCH_MODES mode.
+
+    An optimized mode is accepted, and the API will serve the version in it,
+    when its fail recall is within tolerance of eager's. Also records how far
+    its probabilities stray from eager's and how many labels differ.
+    """
+    labels = y_test.int().numpy()
+    results = {}
+    for mode in TORCH_MODES:
+        optimized = optimize_model(model, mode, X_test.shape[1])
+        start = time.perf_counter()
+        proba = torch.sigmoid(forward(optimized, X_test)).numpy()
+        seconds = time.perf_counter() - start
+        preds = (proba >= 0.5).astype(int)
+        if mode == 'eager':
+            eager_proba, eager_preds = proba, preds
+        entry = {
+            'test_fail_recall': round(fail_recall(labels, preds), 4),
+            'max_proba_diff': round(float(np.abs(proba - eager_proba).max()), 6),
+            'labels_changed': int((preds != eager_preds).sum()),
+            'forward_ms': round(seconds * 1000, 2),
+        }
+        if mode != 'eager':
+            entry['accepted'] = entry['test_fail_recall'] >= results['eager']['test_fail_recall'] - tolerance
+        results[mode] = entry
+    return results
+
+
+def save_training_arrays(X, rows, out_dir, chunksize=CHUNK_ROWS):
+    """Write the training split's drift files from X[rows], chunksize rows at a time.
+
+    baseline_stats.json has per-feature means and stds, train_features.npy the
+    raw rows column-major, and train_baseline.npy the KSBaseline, sorted one
+    feature at a time from that column-major copy. X can be a memmap: no more
+    than a chunk of rows or one feature's column is in memory at once.
+    """
+    n_features = X.shape[1]
+    features_path = os.path.join(out_dir, 'train_features.npy')
+    # column-major so each feature is contiguous on disk
+    features = np.lib.format.open_memmap(features_path, mode='w+', dtype=np.float32,
+                                         shape=(len(rows), n_features), fortran_order=True)
+    total = np.zeros(n_features)
+    total_sq = np.zeros(n_features)
+    for start in range(0, len(rows), chunksize):
+        chunk = np.asarray(X[rows[start:start + chunksize]], dtype=np.float64)
+        features[start:start + len(chunk)] = chunk
+        total += chunk.sum(axis=0)
+        total_sq += (chunk ** 2).sum(axis=0)
+    features.flush()
+    print(f"Training features saved to {features_path}")
+
+    mean = total / len(rows)
+    baseline_stats = {
+        'means': mean.tolist(),
+        'stds': np.sqrt(np.maximum(total_sq / len(rows) - mean ** 2, 0)).tolist()
+    }
+    with open(os.path.join(out_dir, 'baseline_stats.json'), 'w') as f:
+        json.dump(baseline_stats, f)
+    print(f"Baseline stats saved to {out_dir}/baseline_stats.json")
+
+    # per-feature sorted copy for KS-tests, the API memory-maps this one
+    baseline_path = os.path.join(out_dir, 'train_baseline.npy')
+    baseline = np.lib.format.open_memmap(baseline_path, mode='w+', dtype=np.float32, shape=(n_features, len(rows)))
+    for i in range(n_features):
+        baseline[i] = np.sort(features[:, i])
+    baseline.flush()
+    print(f"Drift baseline saved to {baseline_path}")
+
+
+def train(version, args, scratch_dir=None):
+    """Train a new version into models/versions/<version>.
+
+    --stream writes its scaled copy of the CSV to scratch_dir, which has to
+    stay around until the returned test split has been evaluated.
+    """
+    # every run gets its own directory under models/versions/, nothing is overwritten
+    out_dir = version_dir(version)
+    os.makedirs(out_dir)
+
+    # load and prep data
+    if args.stream:
+        # two chunked passes over the CSV, the scaled matrix lands in a memory-mapped .npy
+        scaled_path = os.path.join(scratch_dir, 'scaled.npy')
+        X, y, scaler, stats = preprocess_streaming(args.data, scaled_path, args.chunksize)
+        np.save(os.path.join(out_dir, 'sample_pool.npy'), stats['sample'])
+        columns, fill_values = stats['columns'], stats['median']
+    else:
+        df = load_and_clean(args.data)
+        build_sample_pool(df, path=os.path.join(out_dir, 'sample_pool.npy'))
+        columns, fill_values = cleaning_params(df)
+        X, y, scaler = prepare_features(df, scaler_path=os.path.join(out_dir, 'scaler.pkl'))
+        scaler = ArrayScaler.from_sklearn(scaler)
+    # what score.py needs to turn a raw export into model inputs the same way
+    save_columns(os.path.join(out_dir, COLUMNS_FILE), columns, fill_values)
+    # split row indices, so a memory-mapped X isn't copied into the splits
+    train_rows, test_rows, y_train, y_test = split_data(np.arange(len(y)), y)
+    # hold part of the training split back for early stopping
+    fit_rows, val_rows, y_fit, y_val = split_data(train_rows, y_train, test_size=args.val_size)
+
+    n_features = X.shape[1]
+    if args.stream:
+        fit_split, val_split, test_split = (MemmapRows(scaled_path, y, rows) for rows in (fit_rows, val_rows, test_rows))
+        tensors = (fit_split, fit_split.labels, val_split, val_split.labels)
+        test_data = (test_split, test_split.labels)
+    else:
+        tensors = to_tensors(X[fit_rows], y_fit) + to_tensors(X[val_rows], y_val)
+        test_data = to_tensors(X[test_rows], y_test)
+
+    start = time.perf_counter()
+    if args.search:
+        model, results = search(*tensors, args.epochs, args.patience, args.workers,
+                                args.threads or max(1, (os.cpu_count() or 1) // args.workers))
+        summary = results[0]
+    else:
+        if args.threads:
+            torch.set_num_threads(args.threads)
+        config = {'lr': args.lr, 'batch_size': args.batch_size, 'dropout': args.dropout}
+        print(f"\nTraining on {torch.get_num_threads()} threads")
+        model, summary = fit(*tensors, config, args.epochs, args.patience)
+        results = None
+    print(f"Training took {time.perf_counter() - start:.1f}s, "
+          f"val fail recall {summary['val_fail_recall']:.3f} at epoch {summary['best_epoch']}")
 
     # save everything
-    os.makedirs('../models', exist_ok=True)
-    torch.save(model.state_dict(), '../models/defect_model.pt')
-    print("\nModel saved to models/defect_model.pt")
+    torch.save(model.state_dict(), os.path.join(out_dir, 'defect_model.pt'))
+    print(f"\nModel saved to {out_dir}/defect_model.pt")
+
+    # plain-numpy copy with the scaler folded into the first layer, so the API can serve without torch
+    layers = [
+        (layer.weight.detach().numpy(), layer.bias.detach().numpy())
+        for layer in model.network if isinstance(layer, nn.Linear)
+    ]
+    export_numpy(layers, scaler.mean, scaler.scale, os.path.join(out_dir, 'model_numpy.npz'))
+    print(f"NumPy model saved to {out_dir}/model_numpy.npz")
+
+    # scaler as plain arrays, so the torch engine doesn't need to unpickle sklearn either
+    scaler.save(os.path.join(out_dir, 'scaler.npz'))
+    print(f"Scaler arrays saved to {out_dir}/scaler.npz")
 
     metadata = {
+        'version': version,
+        'trained_at': datetime.now().isoformat(),
         'n_features': n_features,
-        'epochs': epochs,
-        'learning_rate': 0.001,
-        'pos_weight': pos_weight.item(),
-        'train_samples': len(y_train),
+        'epochs': summary['epochs_run'],
+        'best_epoch': summary['best_epoch'],
+        'learning_rate': summary['lr'],
+        'batch_size': summary['batch_size'],
+        'dropout': summary['dropout'],
+        'pos_weight': summary['pos_weight'],
+        'val_fail_recall': summary['val_fail_recall'],
+        'train_samples': len(y_fit),
+        'val_samples': len(y_val),
         'test_samples': len(y_test)
     }
-    with open('../models/metadata.json', 'w') as f:
-        json.dump(metadata, f, indent=2)
-    print("Metadata saved to models/metadata.json")
+    if results:
+        metadata['search'] = results
 
-    # save per-feature means and stds from training data for drift detection
-    baseline_stats = {
-        'means': X_train.mean(axis=0).tolist(),
-        'stds': X_train.std(axis=0).tolist()
-    }
-    with open('../models/baseline_stats.json', 'w') as f:
-        json.dump(baseline_stats, f)
-    print("Baseline stats saved to models/baseline_stats.json")
+    metadata['inference_modes'] = check_inference_modes(model, *test_data, args.mode_tolerance)
+    print("\nInference modes on the test split:")
+    for mode, check in metadata['inference_modes'].items():
+        verdict = '' if mode == 'eager' else ('  accepted' if check['accepted'] else '  rejected')
+        print(f"  {mode:<7} fail recall {check['test_fail_recall']:.3f}, "
+              f"{check['labels_changed']} labels changed, max prob diff {check['max_proba_diff']:.4f}{verdict}")
+    with open(os.path.join(out_dir, 'metadata.json'), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    print(f"Metadata saved to {out_dir}/metadata.json")
 
-    # also save raw training features for KS-test comparisons
-    np.save('../models/train_features.npy', X_train)
-    print("Training features saved to models/train_features.npy")
+    # what drift detection compares live predictions against
+    save_training_arrays(X, train_rows, out_dir, args.chunksize)
 
-    return model, test_loader, y_test
+    return model, test_data
 
 
-def evaluate(model, test_loader):
+def evaluate(model, test_data, out_dir):
     """Run predictions on test set and print metrics."""
+    X_test, y_test = test_data
     model.eval()
-    all_preds = []
-    all_labels = []
-
-    with torch.no_grad():
-        for X_batch, y_batch in test_loader:
-            output = model(X_batch).squeeze()
-            preds = (torch.sigmoid(output) >= 0.5).int()
-            all_preds.extend(preds.numpy())
-            all_labels.extend(y_batch.int().numpy())
-
-    all_preds = np.array(all_preds)
-    all_labels = np.array(all_labels)
+    all_preds = (torch.sigmoid(forward(model, X_test)) >= 0.5).int().numpy()
+    all_labels = y_test.int().numpy()
 
     print("\n=== Evaluation Results ===\n")
     report = classification_report(
@@ -125,15 +431,54 @@ def evaluate(model, test_loader):
     print(f"\nFail recall (most important): {fail_recall:.3f}")
 
     # save report to file
-    with open('../models/eval_report.txt', 'w') as f:
+    with open(os.path.join(out_dir, 'eval_report.txt'), 'w') as f:
         f.write("SECOM Defect Classifier - Evaluation Report\n")
         f.write("=" * 45 + "\n\n")
         f.write(report)
         f.write(f"\nConfusion matrix:\n{cm}\n")
         f.write(f"\nFail recall: {fail_recall:.3f}\n")
-    print("Report saved to models/eval_report.txt")
+    print(f"Report saved to {out_dir}/eval_report.txt")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Train the SECOM defect classifier.')
+    parser.add_argument('--data', default=DATA_PATH, help=f'training CSV (default {DATA_PATH})')
+    parser.add_argument('--stream', action='store_true',
+                        help='preprocess the CSV in chunks instead of loading it whole, for big exports')
+    parser.add_argument('--chunksize', type=int, default=CHUNK_ROWS, help='rows per chunk with --stream')
+    parser.add_argument('--scratch-dir', default=None,
+                        help="where --stream keeps its scaled copy of the CSV while training (default: the "
+                             "system temp dir). It's deleted afterwards")
+    parser.add_argument('--epochs', type=int, default=50, help='max epochs (default 50)')
+    parser.add_argument('--patience', type=int, default=10,
+                        help='stop after this many epochs without a better validation fail recall, 0 never stops early')
+    parser.add_argument('--val-size', type=float, default=0.15,
+                        help='fraction of the training split held out for early stopping')
+    parser.add_argument('--lr', type=float, default=DEFAULT_CONFIG['lr'])
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_CONFIG['batch_size'])
+    parser.add_argument('--dropout', type=float, default=DEFAULT_CONFIG['dropout'])
+    parser.add_argument('--threads', type=int, default=0,
+                        help='torch intra-op threads (per process with --search), 0 picks automatically')
+    parser.add_argument('--search', action='store_true',
+                        help='train every SEARCH_GRID configuration in parallel and keep the best')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                        help='processes for --search')
+    parser.add_argument('--mode-tolerance', type=float, default=MODE_TOLERANCE,
+                        help='largest drop in test fail recall for which the int8/script modes are accepted')
+    parser.add_argument('--no-activate', action='store_true',
+                        help="save the new version without pointing models/ACTIVE at it")
+    return parser.parse_args(argv)
 
 
 if __name__ == '__main__':
-    model, test_loader, y_test = train()
-    evaluate(model, test_loader)
+    args = parse_args()
+    version = new_version()
+    with tempfile.TemporaryDirectory(prefix='semiguard-train-', dir=args.scratch_dir) as scratch_dir:
+        model, test_data = train(version, args, scratch_dir)
+        evaluate(model, test_data, version_dir(version))
+    if args.no_activate:
+        print(f"\nModel version {version} saved, not activated")
+    else:
+        # only now point ACTIVE at it, running API workers switch over on their next check
+        set_active(version)
+        print(f"\nModel version {version} is now active")
@@ -17,6 +17,9 @@ export class Dashboard implements OnInit, OnDestroy {
   loading = true;
   error = '';
   private refreshInterval: any;
+  private events?: EventSource;
+  // the last 50 predictions, oldest first
+  private recent: any[] = [];
 
   // confidence line chart
   confidenceChartData: ChartConfiguration<'line'>['data'] = {
@@ -48,18 +51,32 @@ export class Dashboard implements OnInit, OnDestroy {
   constructor(private api: ApiService) {}
 
   ngOnInit() {
-    this.fetchMetrics();
-    this.fetchPredictions();
-    this.refreshInterval = setInterval(() => {
-      this.fetchMetrics();
-      this.fetchPredictions();
-    }, 30000);
+    this.refresh();
+    // new predictions are pushed, the full reload only catches what the
+    // 'metrics' deltas can't (the last hour count, rounding)
+    this.refreshInterval = setInterval(() => this.refresh(), 300000);
+
+    this.events = this.api.events();
+    // also after a reconnect, whatever happened in between was missed
+    this.events.onopen = () => this.refresh();
+    this.events.addEventListener('resync', () => this.refresh());
+    this.events.addEventListener('prediction', (e: MessageEvent) => {
+      this.recent = [...this.recent, JSON.parse(e.data)].slice(-50);
+      this.updateConfidenceChart();
+    });
+    this.events.addEventListener('metrics', (e: MessageEvent) => this.applyDelta(JSON.parse(e.data)));
   }
 
   ngOnDestroy() {
     if (this.refreshInterval) {
       clearInterval(this.refreshInterval);
     }
+    this.events?.close();
+  }
+
+  refresh() {
+    this.fetchMetrics();
+    this.fetchPredictions();
   }
 
   fetchMetrics() {
@@ -68,14 +85,7 @@ export class Dashboard implements OnInit, OnDestroy {
         this.metrics = data;
         this.loading = false;
         this.error = '';
-
-        this.barChartData = {
-          labels: ['Pass', 'Fail'],
-          datasets: [{
-            data: [data.pass_count, data.fail_count],
-            backgroundColor: ['#4caf50', '#ef5350']
-          }]
-        };
+        this.updateBarChart();
       },
       error: () => {
         this.error = 'Could not reach the API';
@@ -88,33 +98,71 @@ export class Dashboard implements OnInit, OnDestroy {
     this.api.getPredictions(50).subscribe({
       next: (rows) => {
         // reverse so oldest is first (they come in desc order)
-        const sorted = [...rows].reverse();
-        const labels = sorted.map((_, i) => `#${i + 1}`);
-        const passConf = sorted.map(r => r.prediction === 'pass' ? 1 - r.confidence : null);
-        const failConf = sorted.map(r => r.prediction === 'fail' ? 1 - r.confidence : null);
-
-        this.confidenceChartData = {
-          labels,
-          datasets: [
-            {
-              label: 'Pass',
-              data: passConf,
-              borderColor: '#4caf50',
-              backgroundColor: 'rgba(76, 175, 80, 0.1)',
-              pointRadius: 4,
-              spanGaps: false
-            },
-            {
-              label: 'Fail',
-              data: failConf,
-              borderColor: '#ef5350',
-              backgroundColor: 'rgba(239, 83, 80, 0.1)',
-              pointRadius: 4,
-              spanGaps: false
-            }
-          ]
-        };
+        this.recent = [...rows].reverse();
+        this.updateConfidenceChart();
       }
     });
   }
+
+  // counts from a batch of pushed predictions, added onto the last /metrics
+  applyDelta(delta: any) {
+    const m = this.metrics;
+    if (!m) {
+      return;
+    }
+    const confidenceSum = m.avg_confidence * m.total_predictions + delta.confidence_sum;
+    const total = m.total_predictions + delta.total;
+    const passCount = m.pass_count + delta.pass_count;
+    const failCount = m.fail_count + delta.fail_count;
+    this.metrics = {
+      ...m,
+      total_predictions: total,
+      pass_count: passCount,
+      fail_count: failCount,
+      pass_rate: passCount / total,
+      fail_rate: failCount / total,
+      avg_confidence: confidenceSum / total,
+      predictions_last_hour: m.predictions_last_hour + delta.total
+    };
+    this.updateBarChart();
+  }
+
+  private updateBarChart() {
+    this.barChartData = {
+      labels: ['Pass', 'Fail'],
+      datasets: [{
+        data: [this.metrics.pass_count, this.metrics.fail_count],
+        backgroundColor: ['#4caf50', '#ef5350']
+      }]
+    };
+  }
+
+  private updateConfidenceChart() {
+    const sorted = this.recent;
+    const labels = sorted.map((_, i) => `#${i + 1}`);
+    const passConf = sorted.map(r => r.prediction === 'pass' ? 1 - r.confidence : null);
+    const failConf = sorted.map(r => r.prediction === 'fail' ? 1 - r.confidence : null);
+
+    this.confidenceChartData = {
+      labels,
+      datasets: [
+        {
+          label: 'Pass',
+          data: passConf,
+          borderColor: '#4caf50',
+          backgroundColor: 'rgba(76, 175, 80, 0.1)',
+          pointRadius: 4,
+          spanGaps: false
+        },
+        {
+          label: 'Fail',
+          data: failConf,
+          borderColor: '#ef5350',
+          backgroundColor: 'rgba(239, 83, 80, 0.1)',
+          pointRadius: 4,
+          spanGaps: false
+        }
+      ]
+    };
+  }
 }
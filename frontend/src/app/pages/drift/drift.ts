@@ -1,21 +1,53 @@
-import { Component, OnInit } from '@angular/core';
+import { Component, OnInit, OnDestroy } from '@angular/core';
+import { BaseChartDirective } from 'ng2-charts';
+import { ChartConfiguration } from 'chart.js';
+import { Chart, registerables } from 'chart.js';
 import { ApiService } from '../../services/api';
 
+Chart.register(...registerables);
+
 @Component({
   selector: 'app-drift',
-  imports: [],
+  imports: [BaseChartDirective],
   templateUrl: './drift.html',
   styleUrl: './drift.css',
 })
-export class Drift implements OnInit {
+export class Drift implements OnInit, OnDestroy {
   driftData: any = null;
   loading = true;
   error = '';
 
+  // drift score over time, from the backend's scheduled checks
+  historyChartData: ChartConfiguration<'line'>['data'] = {
+    labels: [],
+    datasets: []
+  };
+  historyChartOptions: ChartConfiguration<'line'>['options'] = {
+    responsive: true,
+    plugins: { legend: { display: false } },
+    scales: {
+      y: { min: 0, max: 100, title: { display: true, text: '% of features drifted' } },
+      x: { title: { display: true, text: 'Time' } }
+    }
+  };
+  hasHistory = false;
+  private events?: EventSource;
+
   constructor(private api: ApiService) {}
 
   ngOnInit() {
     this.fetchDrift();
+    this.fetchHistory();
+    // a scheduled check just stored new results
+    this.events = this.api.events();
+    this.events.addEventListener('drift', () => {
+      this.fetchDrift();
+      this.fetchHistory();
+    });
+  }
+
+  ngOnDestroy() {
+    this.events?.close();
   }
 
   fetchDrift() {
@@ -33,6 +65,25 @@ export class Drift implements OnInit {
     });
   }
 
+  fetchHistory() {
+    this.api.getDriftHistory().subscribe({
+      next: (data) => {
+        const points: any[] = data.points;
+        this.hasHistory = points.length > 0;
+        this.historyChartData = {
+          labels: points.map(p => new Date(p.timestamp).toLocaleTimeString()),
+          datasets: [{
+            data: points.map(p => p.drift_score * 100),
+            borderColor: '#5c6bc0',
+            backgroundColor: 'rgba(92, 107, 192, 0.1)',
+            pointRadius: 0,
+            fill: true
+          }]
+        };
+      }
+    });
+  }
+
   get driftPct(): string {
     return ((this.driftData?.drift_score || 0) * 100).toFixed(1);
   }
@@ -12,7 +12,10 @@ import { ApiService } from '../../services/api';
 export class History implements OnInit {
   predictions: any[] = [];
   loading = true;
+  loadingMore = false;
+  hasMore = false;
   error = '';
+  pageSize = 100;
 
   constructor(private api: ApiService) {}
 
@@ -22,9 +25,10 @@ export class History implements OnInit {
 
   fetchPredictions() {
     this.loading = true;
-    this.api.getPredictions(100).subscribe({
+    this.api.getPredictions(this.pageSize).subscribe({
       next: (rows) => {
         this.predictions = rows;
+        this.hasMore = rows.length === this.pageSize;
         this.loading = false;
       },
       error: () => {
@@ -34,6 +38,24 @@ export class History implements OnInit {
     });
   }
 
+  loadOlder() {
+    const last = this.predictions[this.predictions.length - 1];
+    if (!last) return;
+
+    this.loadingMore = true;
+    this.api.getPredictions(this.pageSize, last.id).subscribe({
+      next: (rows) => {
+        this.predictions = this.predictions.concat(rows);
+        this.hasMore = rows.length === this.pageSize;
+        this.loadingMore = false;
+      },
+      error: () => {
+        this.error = 'Could not load older predictions';
+        this.loadingMore = false;
+      }
+    });
+  }
+
   onFeedbackChange(prediction: any, value: string) {
     if (value === 'unknown') return;
 
@@ -18,8 +18,10 @@ export class ApiService {
     return this.http.post<any>(`${this.baseUrl}/predict`, { features });
   }
 
-  getPredictions(n: number = 50) {
-    return this.http.get<any[]>(`${this.baseUrl}/predictions?n=${n}`);
+  // pass the last id of the previous page as beforeId to get the next one
+  getPredictions(n: number = 50, beforeId?: number) {
+    const cursor = beforeId !== undefined ? `&before_id=${beforeId}` : '';
+    return this.http.get<any[]>(`${this.baseUrl}/predictions?n=${n}${cursor}`);
   }
 
   getMetrics() {
@@ -34,6 +36,17 @@ export class ApiService {
     return this.http.get<any>(`${this.baseUrl}/drift`);
   }
 
+  // drift checks the backend ran on its own schedule, oldest first
+  getDriftHistory(window: number = 100, limit: number = 500) {
+    return this.http.get<any>(`${this.baseUrl}/drift/history?window=${window}&limit=${limit}`);
+  }
+
+  // server-sent stream of new predictions, feedback and drift checks, see GET /events.
+  // the browser reconnects on its own when it drops
+  events() {
+    return new EventSource(`${this.baseUrl}/events`);
+  }
+
   submitFeedback(predictionId: number, actualLabel: string) {
     return this.http.post<any>(`${this.baseUrl}/feedback`, {
       prediction_id: predictionId,